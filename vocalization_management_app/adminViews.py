@@ -3,11 +3,12 @@ from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.utils.timezone import now
 import logging
-from .models import CustomUser, OriginalAudioFile, Database, ProcessingLog, DetectedNoiseAudioFile, Spectrogram, AdminProfile
+from .models import CustomUser, OriginalAudioFile, Database, ProcessingLog, DetectedNoiseAudioFile, Spectrogram, AdminProfile, UploadBatch
 from .forms import UserRegistrationForm, AudioUploadForm
-from .audio_processing import update_audio_metadata, process_pending_audio_files, get_processing_status, handle_duplicate_file
+from .audio_processing import process_pending_audio_files, get_processing_status, handle_duplicate_file, queue_uploaded_file
 from .tasks import process_pending_audio_files
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 import json
 
 # Configure logging
@@ -113,6 +114,9 @@ def upload_audio(request):
             files = request.FILES.getlist('audio_files')
             upload_stats['total'] = len(files)
             
+            # Files uploaded together are reported as one batch (see api_upload_batch_progress)
+            batch = UploadBatch.objects.create(created_by=request.user)
+            
             # Process local file uploads if any files were selected
             if files:
                 # Get or create admin profile
@@ -130,8 +134,8 @@ def upload_audio(request):
                         continue
                     
                     try:
-                        # Handle duplicate file detection and replacement
-                        original_audio, is_duplicate, replaced_file_id = handle_duplicate_file(
+                        # Handle duplicate file detection (by content)
+                        original_audio, is_duplicate, existing_file_id = handle_duplicate_file(
                             new_file=audio_file,
                             animal_type=animal_type,
                             zoo=zoo,
@@ -146,17 +150,15 @@ def upload_audio(request):
                                 level='INFO',
                                 message=f'Audio file "{ audio_file.name}" uploaded successfully.'
                             )
+                            
+                            # Metadata is read by the background workers, so the request
+                            # returns once the file is stored
+                            queue_uploaded_file(original_audio, batch)
+                            upload_stats['processed'] += 1
                         else:
-                            # Track duplicate count
+                            # Track duplicate count (the identical file is already stored and processed)
                             upload_stats['duplicates'] += 1
-                            # Add a message about the duplicate replacement
-                            logging.info(f"Duplicate file detected and replaced: {audio_file.name} (ID: {replaced_file_id})")
-                        
-                        # Update metadata
-                        file_path = original_audio.audio_file.path
-                        update_audio_metadata(file_path, original_audio)
-                        
-                        upload_stats['processed'] += 1
+                            logging.info(f"Duplicate file detected, reusing existing results: {audio_file.name} (ID: {existing_file_id})")
                         
                     except Exception as e:
                         logging.error(f"Error uploading file {audio_file.name}: {str(e)}")
@@ -177,7 +179,8 @@ def upload_audio(request):
                             folder_id=folder_id,
                             animal_type=animal_type,
                             zoo=zoo,
-                            uploaded_by=request.user
+                            uploaded_by=request.user,
+                            batch=batch
                         )
                         
                         # Update overall statistics with Google Drive results
@@ -197,24 +200,32 @@ def upload_audio(request):
             elif google_drive_url:
                 messages.error(request, "The provided URL does not appear to be a valid Google Drive folder URL.")
             
+            # Record the uploads that did not get a Database entry in the batch
+            batch.duplicate_count = upload_stats['duplicates'] + upload_stats['drive_duplicates']
+            batch.failed_count = upload_stats['failed'] + upload_stats['drive_failed']
+            batch.save(update_fields=['duplicate_count', 'failed_count'])
+            
             # Create success message with upload statistics
             total_processed = upload_stats['processed'] + upload_stats['drive_processed']
+            total_duplicates = upload_stats['duplicates'] + upload_stats['drive_duplicates']
             
-            if total_processed > 0:
-                success_message = f"Successfully uploaded {total_processed} audio file(s). "
+            if total_processed + total_duplicates > 0:
+                success_message = f"Successfully uploaded {total_processed + total_duplicates} audio file(s). "
                 
                 # Add details about local file uploads
-                if upload_stats['processed'] > 0:
-                    success_message += f"{upload_stats['processed']} file(s) from local upload. "
+                local_uploaded = upload_stats['processed'] + upload_stats['duplicates']
+                if local_uploaded > 0:
+                    success_message += f"{local_uploaded} file(s) from local upload. "
                 
                 # Add details about Google Drive uploads
-                if upload_stats['drive_processed'] > 0:
-                    success_message += f"{upload_stats['drive_processed']} file(s) from Google Drive. "
+                drive_uploaded = upload_stats['drive_processed'] + upload_stats['drive_duplicates']
+                if drive_uploaded > 0:
+                    success_message += f"{drive_uploaded} file(s) from Google Drive. "
                 
                 # Add details about duplicates
-                total_duplicates = upload_stats['duplicates'] + upload_stats['drive_duplicates']
                 if total_duplicates > 0:
-                    success_message += f"{total_duplicates} duplicate file(s) were detected and replaced. "
+                    success_message += (f"{total_duplicates} duplicate file(s) matched recordings already stored "
+                                        f"and reuse their results. ")
                 
                 # Add details about invalid formats
                 if upload_stats.get('invalid_format', 0) > 0:
@@ -227,8 +238,8 @@ def upload_audio(request):
                 
                 messages.success(request, success_message)
                 
-                # Trigger processing if there are valid files
-                process_pending_audio_files()
+                # The upload page shows the batch's ingestion progress
+                request.session['upload_batch_id'] = str(batch.batch_id)
             else:
                 if google_drive_url and not is_valid_drive_url(google_drive_url):
                     messages.error(request, "The provided Google Drive URL is invalid. Please check the URL and try again.")
@@ -245,9 +256,13 @@ def upload_audio(request):
     else:
         form = AudioUploadForm()
     
+    # Progress of the batch uploaded last, shown once after the upload
+    batch_id = request.session.pop('upload_batch_id', None)
+    
     context = {
         'form': form,
-        'audio_files': audio_files
+        'audio_files': audio_files,
+        'upload_batch_progress_url': reverse('api_upload_batch_progress', args=[batch_id]) if batch_id else None
     }
     
     return render(request, 'admin_template/upload_audio.html', context)
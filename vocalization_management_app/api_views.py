@@ -1,4 +1,8 @@
-from django.http import JsonResponse
+import os
+from django.http import JsonResponse, FileResponse, HttpResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.core.exceptions import ValidationError
+from django.utils.cache import patch_cache_control
 from django.views.decorators.http import require_POST
 from django.contrib.auth.decorators import login_required
 from .tasks import start_background_processor, stop_background_processor, get_processor_status
@@ -362,3 +366,400 @@ def get_timeplot_data(request):
             'success': False,
             'message': f'Error generating timeplot data: {str(e)}'
         }, status=500)
+
+@login_required
+def get_spectrogram_tile_manifest(request, file_id, spectrogram_type):
+    """
+    API endpoint to get the manifest of a file's spectrogram tile pyramid
+    (zoom levels, tile counts and time/frequency scales), with the URL pattern of its tiles
+    """
+    from django.urls import reverse
+    from .spectrogram_cache import spectrogram_pyramid_manifest
+    from .spectrogram_tiles import PYRAMID_TYPES
+    
+    if spectrogram_type not in PYRAMID_TYPES:
+        return JsonResponse({'success': False, 'message': 'Unknown spectrogram type'}, status=404)
+    
+    try:
+        audio_file = OriginalAudioFile.objects.get(pk=file_id)
+    except OriginalAudioFile.DoesNotExist:
+        return JsonResponse({'success': False, 'message': 'Audio file not found'}, status=404)
+    
+    manifest = spectrogram_pyramid_manifest(audio_file, spectrogram_type)
+    if manifest is None:
+        return JsonResponse({'success': False, 'message': 'No spectrogram tiles for this file'}, status=404)
+    
+    tile_url = reverse('api_spectrogram_tile', args=[file_id, spectrogram_type, 0, 0, 0])
+    manifest['tile_url'] = tile_url[:-len('0/0/0/')] + '{z}/{x}/{y}/'
+    response = JsonResponse({'success': True, 'data': manifest})
+    patch_cache_control(response, no_cache=True)
+    return response
+
+@login_required
+def get_spectrogram_tile(request, file_id, spectrogram_type, zoom, x, y):
+    """
+    API endpoint to serve one tile of a file's spectrogram tile pyramid
+    """
+    from .audio_processing import spectrogram_tile_directory
+    from .spectrogram_cache import spectrogram_pyramid_manifest
+    from .spectrogram_tiles import tile_path, PYRAMID_TYPES
+    
+    if spectrogram_type not in PYRAMID_TYPES:
+        raise Http404("Unknown spectrogram type")
+    
+    audio_file = get_object_or_404(OriginalAudioFile, pk=file_id)
+    manifest = spectrogram_pyramid_manifest(audio_file, spectrogram_type)
+    if manifest is None or zoom > manifest['max_zoom']:
+        raise Http404("No such spectrogram tile")
+    
+    path = tile_path(spectrogram_tile_directory(audio_file, spectrogram_type), zoom, x, y, manifest['image_format'])
+    if not os.path.exists(path):
+        raise Http404("No such spectrogram tile")
+    
+    response = FileResponse(open(path, 'rb'), content_type=f"image/{manifest['image_format']}")
+    # Tile URLs carry the pyramid version (?v=), so a rebuilt pyramid is fetched anew
+    patch_cache_control(response, private=True, max_age=86400)
+    return response
+
+@login_required
+def get_spectrogram_image(request, file_id, spectrogram_type):
+    """
+    API endpoint to serve a spectrogram image of a file, rendered on first request and
+    cached on disk. The optional start and end query parameters (seconds) select a clip.
+    """
+    from .spectrogram_cache import cached_spectrogram_image
+    from .spectrogram_rendering import SPECTROGRAM_TITLES
+    
+    if spectrogram_type not in SPECTROGRAM_TITLES:
+        raise Http404("Unknown spectrogram type")
+    
+    audio_file = get_object_or_404(OriginalAudioFile, pk=file_id)
+    
+    try:
+        start = float(request.GET['start']) if 'start' in request.GET else None
+        end = float(request.GET['end']) if 'end' in request.GET else None
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Invalid clip range'}, status=400)
+    if (start is not None and start < 0) or (start is not None and end is not None and end <= start):
+        return JsonResponse({'success': False, 'message': 'Invalid clip range'}, status=400)
+    
+    try:
+        path = cached_spectrogram_image(audio_file, spectrogram_type, start, end)
+    except FileNotFoundError:
+        raise Http404("Audio file not found")
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'message': f'Error generating spectrogram: {str(e)}'
+        }, status=500)
+    
+    response = FileResponse(open(path, 'rb'), content_type=f"image/{os.path.splitext(path)[1][1:]}")
+    patch_cache_control(response, private=True, max_age=3600)
+    return response
+
+@login_required
+def get_spectrogram_data(request, file_id):
+    """
+    API endpoint to serve a file's spectrogram pooled to the size it will be drawn at, in the
+    compact binary format of spectrogram_data (uint8 dB values after a JSON header).
+    Query parameters: start and end (seconds), width and height (cells), fmin and fmax (Hz),
+    and pool ('max' or 'mean').
+    """
+    from .spectrogram_cache import cached_spectrogram_data
+    
+    audio_file = get_object_or_404(OriginalAudioFile, pk=file_id)
+    
+    try:
+        start = float(request.GET['start']) if 'start' in request.GET else None
+        end = float(request.GET['end']) if 'end' in request.GET else None
+        width = int(request.GET.get('width', 1024))
+        height = int(request.GET['height']) if 'height' in request.GET else None
+        min_frequency = float(request.GET.get('fmin', 0))
+        max_frequency = float(request.GET['fmax']) if 'fmax' in request.GET else None
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Invalid parameters'}, status=400)
+    pooling = request.GET.get('pool', 'max')
+    
+    if ((start is not None and start < 0) or (start is not None and end is not None and end <= start)
+            or not 1 <= width <= 4096 or (height is not None and not 1 <= height <= 1024)
+            or min_frequency < 0 or (max_frequency is not None and max_frequency <= min_frequency)
+            or pooling not in ('max', 'mean')):
+        return JsonResponse({'success': False, 'message': 'Invalid parameters'}, status=400)
+    
+    try:
+        path = cached_spectrogram_data(audio_file, start, end, width=width, height=height, min_frequency=min_frequency,
+                                       max_frequency=max_frequency, pooling=pooling)
+    except FileNotFoundError:
+        raise Http404("Audio file not found")
+    except ValueError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'message': f'Error generating spectrogram data: {str(e)}'
+        }, status=500)
+    
+    response = FileResponse(open(path, 'rb'), content_type='application/octet-stream')
+    patch_cache_control(response, private=True, max_age=3600)
+    return response
+
+@login_required
+def get_waveform_peaks(request, file_id):
+    """
+    API endpoint to serve the min/max waveform peaks of a window of a file, from the level
+    of its peak pyramid that has at least one bucket per pixel. Query parameters: start and
+    end (seconds), width (pixels) or samples_per_bucket (a level).
+    
+    The response is a uint32 (little-endian) header length, a JSON header and the peaks as
+    little-endian int16 (min, max) pairs.
+    """
+    import json
+    import struct
+    from django.conf import settings
+    from .models import Waveform
+    from .waveform_peaks import read_peak_header, read_peaks, choose_peak_level
+    
+    audio_file = get_object_or_404(OriginalAudioFile, pk=file_id)
+    waveform = Waveform.objects.filter(audio_file=audio_file).exclude(peaks_path__isnull=True).exclude(peaks_path='').first()
+    if waveform is None:
+        raise Http404("No waveform peaks for this file")
+    path = os.path.join(settings.MEDIA_ROOT, waveform.peaks_path)
+    
+    try:
+        header, _ = read_peak_header(path)
+    except FileNotFoundError:
+        raise Http404("No waveform peaks for this file")
+    
+    try:
+        start = float(request.GET.get('start', 0))
+        end = float(request.GET['end']) if 'end' in request.GET else header['length'] / header['sample_rate']
+        width = int(request.GET.get('width', 1000))
+        samples_per_bucket = int(request.GET['samples_per_bucket']) if 'samples_per_bucket' in request.GET else None
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Invalid parameters'}, status=400)
+    if start < 0 or end <= start or not 1 <= width <= 8192:
+        return JsonResponse({'success': False, 'message': 'Invalid parameters'}, status=400)
+    
+    start_sample = int(start * header['sample_rate'])
+    end_sample = min(int(end * header['sample_rate']), header['length'])
+    if samples_per_bucket is None:
+        samples_per_bucket = choose_peak_level(header, end_sample - start_sample, width)['samples_per_bucket']
+    
+    first_bucket = start_sample // samples_per_bucket
+    try:
+        peaks = read_peaks(path, samples_per_bucket, first_bucket, -(-end_sample // samples_per_bucket))
+    except ValueError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    
+    response_header = json.dumps({
+        'sample_rate': header['sample_rate'],
+        'length': header['length'],
+        'levels': [level['samples_per_bucket'] for level in header['levels']],
+        'samples_per_bucket': samples_per_bucket,
+        'first_bucket': first_bucket,
+        'buckets': len(peaks),
+    }).encode('utf-8')
+    response = HttpResponse(struct.pack('<I', len(response_header)) + response_header + peaks.astype('<i2').tobytes(),
+                            content_type='application/octet-stream')
+    # Peaks only change when the file is processed again
+    patch_cache_control(response, private=True, max_age=3600)
+    return response
+
+@login_required
+def stream_audio(request, file_id):
+    """
+    API endpoint to stream a file's audio with HTTP Range support. With start and/or end
+    query parameters (seconds), only that window is served, as a WAV file of its own cut
+    from the original on the fly.
+    """
+    from .audio_streaming import audio_stream_response
+    from django.conf import settings
+    
+    audio_file = get_object_or_404(OriginalAudioFile, pk=file_id)
+    
+    try:
+        start = float(request.GET['start']) if 'start' in request.GET else None
+        end = float(request.GET['end']) if 'end' in request.GET else None
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Invalid clip range'}, status=400)
+    if (start is not None and start < 0) or (start is not None and end is not None and end <= start):
+        return JsonResponse({'success': False, 'message': 'Invalid clip range'}, status=400)
+    
+    try:
+        response = audio_stream_response(request, os.path.join(settings.MEDIA_ROOT, audio_file.audio_file.name), start, end)
+    except FileNotFoundError:
+        raise Http404("Audio file not found")
+    except ValueError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    
+    patch_cache_control(response, private=True, max_age=3600)
+    return response
+
+@login_required
+def stream_clip(request, clip_id):
+    """
+    API endpoint to stream a detected saw call with HTTP Range support, from its segment file
+    or, for virtual clips, cut from the original recording
+    """
+    from .audio_streaming import clip_stream_response
+    
+    detected_noise = get_object_or_404(DetectedNoiseAudioFile.objects.select_related('original_file'), pk=clip_id)
+    
+    try:
+        response = clip_stream_response(request, detected_noise)
+    except FileNotFoundError:
+        raise Http404("Audio file not found")
+    except ValueError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    
+    patch_cache_control(response, private=True, max_age=3600)
+    return response
+
+@login_required
+@require_POST
+def init_chunked_upload(request):
+    """
+    API endpoint to start a resumable upload. Form fields: file_name, total_size (bytes),
+    animal_type and zoo (as for upload_audio) and optionally sha256, the digest of the whole
+    file checked on finalize, and batch_id, to report the file with others uploaded
+    together (a new batch is started otherwise).
+    """
+    from django.conf import settings
+    from .chunked_uploads import create_upload, max_chunk_size
+    from .forms import AudioUploadForm
+    from .models import UploadBatch
+    
+    form = AudioUploadForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'success': False, 'message': 'Invalid upload', 'errors': form.errors}, status=400)
+    
+    file_name = request.POST.get('file_name', '')
+    if not file_name.lower().endswith('.wav'):
+        return JsonResponse({'success': False, 'message': 'Only .wav files can be uploaded'}, status=400)
+    try:
+        total_size = int(request.POST.get('total_size', ''))
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Invalid total_size'}, status=400)
+    if total_size <= 0:
+        return JsonResponse({'success': False, 'message': 'Invalid total_size'}, status=400)
+    sha256 = request.POST.get('sha256') or None
+    if sha256 and (len(sha256) != 64 or any(c not in '0123456789abcdefABCDEF' for c in sha256)):
+        return JsonResponse({'success': False, 'message': 'Invalid sha256'}, status=400)
+    
+    if request.POST.get('batch_id'):
+        try:
+            batch = UploadBatch.objects.get(batch_id=request.POST['batch_id'], created_by=request.user)
+        except (UploadBatch.DoesNotExist, ValidationError):
+            return JsonResponse({'success': False, 'message': 'Unknown batch_id'}, status=400)
+    else:
+        batch = UploadBatch.objects.create(created_by=request.user)
+    
+    upload = create_upload(file_name, total_size, form.cleaned_data['animal_type'], form.cleaned_data['zoo'],
+                           request.user, sha256=sha256, batch=batch)
+    return JsonResponse({
+        'success': True,
+        'upload_id': str(upload.upload_id),
+        'batch_id': str(batch.batch_id),
+        'received_bytes': upload.received_bytes,
+        'max_chunk_size': max_chunk_size(),
+    })
+
+@login_required
+def get_chunked_upload(request, upload_id):
+    """
+    API endpoint reporting how much of a resumable upload was received, so a client can
+    resume it from received_bytes after losing its connection
+    """
+    from .models import ChunkedUpload
+    
+    upload = get_object_or_404(ChunkedUpload, upload_id=upload_id, created_by=request.user)
+    return JsonResponse({
+        'success': True,
+        'upload_id': str(upload.upload_id),
+        'file_name': upload.file_name,
+        'status': upload.status,
+        'received_bytes': upload.received_bytes,
+        'total_size': upload.total_size,
+        'file_id': upload.audio_file_id,
+        'message': upload.message,
+    })
+
+@login_required
+@require_POST
+def upload_chunk(request, upload_id):
+    """
+    API endpoint receiving one chunk of a resumable upload: the raw bytes as the request
+    body, the offset of the chunk as the offset query parameter and its SHA-256 in the
+    X-Chunk-SHA256 header. A chunk is only accepted at the current end of the upload
+    (409 otherwise) and when it matches its checksum (400 otherwise); every response
+    carries received_bytes, where the next chunk starts.
+    """
+    from .chunked_uploads import ChunkOffsetMismatch, ChunkChecksumMismatch, max_chunk_size, write_chunk
+    from .models import ChunkedUpload
+    
+    upload = get_object_or_404(ChunkedUpload, upload_id=upload_id, created_by=request.user)
+    try:
+        offset = int(request.GET.get('offset', ''))
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Invalid offset', 'received_bytes': upload.received_bytes}, status=400)
+    checksum = request.headers.get('X-Chunk-SHA256', '')
+    if not checksum:
+        return JsonResponse({'success': False, 'message': 'Missing X-Chunk-SHA256 header', 'received_bytes': upload.received_bytes}, status=400)
+    if length > max_chunk_size():
+        return JsonResponse({'success': False, 'message': f'Chunks are limited to {max_chunk_size()} bytes', 'received_bytes': upload.received_bytes}, status=413)
+    
+    try:
+        received_bytes = write_chunk(upload, offset, request, length, checksum)
+    except ChunkOffsetMismatch as e:
+        upload.refresh_from_db()
+        return JsonResponse({'success': False, 'message': str(e), 'received_bytes': upload.received_bytes}, status=409)
+    except ValueError as e:
+        upload.refresh_from_db()
+        return JsonResponse({'success': False, 'message': str(e), 'received_bytes': upload.received_bytes}, status=400)
+    
+    return JsonResponse({'success': True, 'received_bytes': received_bytes, 'total_size': upload.total_size})
+
+@login_required
+@require_POST
+def finalize_chunked_upload(request, upload_id):
+    """
+    API endpoint completing a resumable upload once every byte was received: the file is
+    stored and queued for the background workers exactly as a file posted to upload_audio.
+    A retry sent while another request is storing the file gets a 409.
+    """
+    from .chunked_uploads import UploadBeingFinalized, finalize_upload
+    from .models import ChunkedUpload
+    
+    upload = get_object_or_404(ChunkedUpload, upload_id=upload_id, created_by=request.user)
+    
+    try:
+        audio_file, is_duplicate = finalize_upload(upload)
+    except UploadBeingFinalized as e:
+        upload.refresh_from_db()
+        if upload.status == 'complete':
+            # A finalize whose response was lost
+            return JsonResponse({'success': True, 'file_id': upload.audio_file_id})
+        return JsonResponse({'success': False, 'message': str(e), 'received_bytes': upload.received_bytes}, status=409)
+    except ValueError as e:
+        upload.refresh_from_db()
+        return JsonResponse({'success': False, 'message': str(e), 'received_bytes': upload.received_bytes}, status=400)
+    except OSError as e:
+        upload.refresh_from_db()
+        return JsonResponse({'success': False, 'message': f'Could not store the file: {str(e)}',
+                             'status': upload.status, 'received_bytes': upload.received_bytes}, status=409)
+    
+    return JsonResponse({'success': True, 'file_id': audio_file.file_id, 'duplicate': is_duplicate})
+
+@login_required
+def get_upload_batch_progress(request, batch_id):
+    """
+    API endpoint reporting how many files of an upload batch are waiting for ingestion
+    (metadata extraction by the background workers), pending, processing, processed or
+    failed, so the upload page can show the progress of large folder uploads
+    """
+    from .models import UploadBatch
+    from .tasks import get_batch_progress
+    
+    batch = get_object_or_404(UploadBatch, batch_id=batch_id, created_by=request.user)
+    return JsonResponse({'success': True, 'data': get_batch_progress(batch)})
@@ -0,0 +1,338 @@
+"""
+Shared access to the samples of uploaded WAV recordings.
+
+Every stage of a processing job (metadata, saw call detection, segment extraction and
+spectrograms) reads the recording through one AudioSource, which memory-maps the file
+once and hands out views by sample range instead of decoding the file again.
+"""
+import mmap
+import os
+import struct
+import weakref
+import numpy as np
+from scipy.io import wavfile as wav
+
+# WAVE format tags from the fmt chunk
+WAVE_FORMATS = {
+    0x0001: 'PCM',
+    0x0003: 'IEEE_FLOAT',
+    0x0006: 'ALAW',
+    0x0007: 'MULAW',
+}
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# Metadata chunks larger than this are listed but not parsed
+MAX_METADATA_CHUNK_BYTES = 64 * 1024
+
+
+def probe_wav_header(file_path):
+    """
+    Read the format and metadata of a WAV file from its chunk headers only.
+    
+    The sample data is never read: the probe seeks from chunk header to chunk header, so
+    only a few kilobytes are read even for multi-gigabyte recordings. LIST/INFO chunks and
+    Song Meter GUANO ('guan') chunks are parsed into dictionaries.
+    
+    Parameters:
+    - file_path: Path to the WAV file
+    
+    Returns:
+    - dict: channels, sample_rate, bit_depth, audio_format, frames, duration_seconds,
+      chunks (id, offset and size of every chunk), info and guano, and the layout of the
+      sample data (format_tag, block_align, byte_order, data_offset, data_size)
+    
+    Raises:
+    - ValueError: If the file is not a RIFF WAVE file or has no fmt/data chunk
+    """
+    with open(file_path, 'rb') as f:
+        file_size = os.fstat(f.fileno()).st_size
+        riff = f.read(12)
+        if len(riff) < 12 or riff[:4] not in (b'RIFF', b'RIFX') or riff[8:12] != b'WAVE':
+            raise ValueError(f"Not a RIFF WAVE file: {os.path.basename(file_path)}")
+        endian = '<' if riff[:4] == b'RIFF' else '>'
+        
+        header = None
+        data_offset = None
+        data_size = None
+        chunks = []
+        info = {}
+        guano = {}
+        
+        position = 12
+        while position + 8 <= file_size:
+            f.seek(position)
+            chunk_id, chunk_size = struct.unpack(endian + '4sI', f.read(8))
+            chunk_id = chunk_id.decode('latin-1')
+            chunks.append({'id': chunk_id.strip(), 'offset': position, 'size': chunk_size})
+            
+            if chunk_id == 'fmt ':
+                header = _parse_fmt_chunk(f.read(min(chunk_size, 40)), endian)
+            elif chunk_id == 'data':
+                data_offset = position + 8
+                remaining = file_size - data_offset
+                if chunk_size == 0 or chunk_size > remaining:
+                    # Recorders that were interrupted or stream their output leave a placeholder
+                    # size (0 or 0xFFFFFFFF); the samples run to the end of the file
+                    data_size = remaining
+                    chunks[-1]['size'] = remaining
+                    break
+                data_size = chunk_size
+            elif chunk_id in ('LIST', 'guan') and chunk_size <= MAX_METADATA_CHUNK_BYTES:
+                body = f.read(chunk_size)
+                if chunk_id == 'guan':
+                    guano.update(_parse_guano_chunk(body))
+                elif body[:4] == b'INFO':
+                    info.update(_parse_info_chunk(body[4:], endian))
+            
+            # Chunks are padded to an even number of bytes
+            position += 8 + chunk_size + (chunk_size & 1)
+    
+    if header is None or data_size is None:
+        raise ValueError(f"WAV file is missing its fmt or data chunk: {os.path.basename(file_path)}")
+    
+    frames = data_size // header['block_align'] if header['block_align'] else 0
+    return {
+        'channels': header['channels'],
+        'sample_rate': header['sample_rate'],
+        'bit_depth': header['bit_depth'],
+        'audio_format': header['audio_format'],
+        'frames': frames,
+        'duration_seconds': frames / header['sample_rate'] if header['sample_rate'] else 0.0,
+        'chunks': chunks,
+        'info': info,
+        'guano': guano,
+        'format_tag': header['format_tag'],
+        'block_align': header['block_align'],
+        'byte_order': endian,
+        'data_offset': data_offset,
+        'data_size': data_size,
+    }
+
+
+def wav_window_parts(file_path, start_frame=0, end_frame=None):
+    """
+    Describe a standalone WAV file holding frames start_frame..end_frame of a recording,
+    without reading its samples.
+    
+    The window is the concatenation of a synthesized header, a byte range of the recording's
+    data chunk (the frames exactly as stored) and, when that range has an odd length, the
+    pad byte RIFF requires. Serving these parts in order plays the clip as if it had been cut
+    to its own file.
+    
+    Parameters:
+    - file_path: Path to the WAV file
+    - start_frame, end_frame: Frame range (clamped to the recording; end defaults to its end)
+    
+    Returns:
+    - tuple: (parts, total size in bytes), where each part is either bytes or an
+      (offset, length) byte range of file_path
+    
+    Raises:
+    - ValueError: If the file is not a WAV file
+    """
+    probe = probe_wav_header(file_path)
+    frames = probe['frames']
+    end_frame = frames if end_frame is None else max(0, min(end_frame, frames))
+    start_frame = max(0, min(start_frame, end_frame))
+    block_align = probe['block_align']
+    data_size = (end_frame - start_frame) * block_align
+    pad = data_size & 1
+    
+    endian = probe['byte_order']
+    # Extensible files are described by their real format tag; plain fmt chunks are enough
+    # for the channel counts and sample formats recorders write
+    header = (
+        (b'RIFF' if endian == '<' else b'RIFX')
+        + struct.pack(endian + 'I', 36 + data_size + pad)
+        + b'WAVEfmt '
+        + struct.pack(endian + 'IHHIIHH', 16, probe['format_tag'], probe['channels'], probe['sample_rate'],
+                      probe['sample_rate'] * block_align, block_align, probe['bit_depth'])
+        + b'data'
+        + struct.pack(endian + 'I', data_size)
+    )
+    parts = [header]
+    if data_size:
+        parts.append((probe['data_offset'] + start_frame * block_align, data_size))
+    if pad:
+        parts.append(b'\x00')
+    return parts, len(header) + data_size + pad
+
+
+def _parse_fmt_chunk(body, endian):
+    """Decode the fields of a fmt chunk (including WAVE_FORMAT_EXTENSIBLE)"""
+    format_tag, channels, sample_rate, _, block_align, bit_depth = struct.unpack(endian + 'HHIIHH', body[:16])
+    if format_tag == WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+        # The real format tag is the first two bytes of the sub-format GUID
+        format_tag = struct.unpack(endian + 'H', body[24:26])[0]
+    return {
+        'format_tag': format_tag,
+        'audio_format': WAVE_FORMATS.get(format_tag, f'0x{format_tag:04X}'),
+        'channels': channels,
+        'sample_rate': sample_rate,
+        'block_align': block_align,
+        'bit_depth': bit_depth,
+    }
+
+
+def _parse_info_chunk(body, endian):
+    """Decode the sub-chunks of a LIST/INFO chunk (INAM, ICMT, ICRD, ...) into a dict"""
+    info = {}
+    position = 0
+    while position + 8 <= len(body):
+        key, size = struct.unpack(endian + '4sI', body[position:position + 8])
+        value = body[position + 8:position + 8 + size]
+        info[key.decode('latin-1').strip()] = value.split(b'\x00', 1)[0].decode('utf-8', errors='replace').strip()
+        position += 8 + size + (size & 1)
+    return info
+
+
+def _parse_guano_chunk(body):
+    """Decode a GUANO metadata chunk ('Key: value' lines, UTF-8) into a dict"""
+    guano = {}
+    for line in body.decode('utf-8', errors='replace').splitlines():
+        key, separator, value = line.partition(':')
+        if separator and key.strip():
+            guano[key.strip()] = value.strip().rstrip('\x00')
+    return guano
+
+
+class AudioSource:
+    """
+    Memory-mapped WAV recording shared by the stages of one processing job.
+    
+    Slices of samples are views into the mapped file (for 24-bit files, which cannot be
+    mapped, they are read from disk on demand), so nothing is decoded up front.
+    """
+    
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.sample_rate, self.samples = open_wav_samples(file_path)
+        self.channels = 1 if self.samples.ndim == 1 else self.samples.shape[1]
+        mapping = self.samples
+        while mapping is not None and not isinstance(mapping, mmap.mmap):
+            mapping = getattr(mapping, 'base', None)
+        self._mapping = weakref.ref(mapping) if mapping is not None else None
+    
+    def __len__(self):
+        return len(self.samples)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    @property
+    def duration_seconds(self):
+        return len(self.samples) / self.sample_rate
+    
+    def frames(self, start=0, end=None):
+        """Samples from start to end (sample indices) as a view, all channels"""
+        return self.samples[start:end]
+    
+    def seconds_to_samples(self, start_seconds, end_seconds):
+        """Convert a time range to the sample range process_audio uses for segments"""
+        return int(start_seconds * self.sample_rate), int(end_seconds * self.sample_rate)
+    
+    def mono(self, start=0, end=None):
+        """Mono samples in the file's dtype; a view for mono files"""
+        return _mono_block(self.samples[start:end])
+    
+    def normalized(self, start=0, end=None):
+        """
+        Mono float32 samples scaled to [-1, 1], matching librosa.load(sr=None).
+        
+        Returns:
+        - numpy.ndarray: Samples as librosa would load them
+        """
+        block = self.samples[start:end]
+        if block.dtype == np.uint8:
+            block = (block.astype(np.float32) - 128) / 128
+        elif np.issubdtype(block.dtype, np.integer):
+            block = block.astype(np.float32) / np.float32(-np.iinfo(block.dtype).min)
+        else:
+            block = block.astype(np.float32)
+        if block.ndim > 1:
+            block = np.mean(block, axis=1)
+        return block
+    
+    @property
+    def mapped(self):
+        """Whether the file is still memory-mapped (by this source or a view it handed out)"""
+        return self._mapping is not None and self._mapping() is not None
+    
+    def close(self):
+        """
+        Release the file. The mapping is unmapped right away unless a view handed out by
+        this source is still in use, in which case it goes with the last such view (numpy
+        does not pin the mapping, so unmapping it under a live view would crash the process).
+        A soundfile-backed source holds no open handle between reads.
+        """
+        self.samples = None
+
+
+def open_wav_samples(file_path):
+    """
+    Open the samples of a WAV file without reading them into memory.
+    
+    Uses a memory-mapped array from scipy.io.wavfile. Formats that scipy cannot map
+    (24-bit PCM) are read lazily through soundfile instead, with the same sample values
+    scipy.io.wavfile.read would return.
+    
+    Parameters:
+    - file_path: Path to the WAV file
+    
+    Returns:
+    - tuple: (sample_rate, samples) where samples supports len() and slicing like a numpy array
+    """
+    import warnings
+    try:
+        # Suppress warnings about unknown chunks (e.g. Song Meter GUANO metadata)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            return wav.read(file_path, mmap=True)
+    except ValueError:
+        samples = SoundFileSamples(file_path)
+        return samples.sample_rate, samples
+
+
+class SoundFileSamples:
+    """
+    Read-only, array-like view of a WAV file backed by soundfile.
+    
+    Only slicing along the first axis is supported; each slice seeks and reads just
+    those frames from disk.
+    """
+    
+    def __init__(self, file_path):
+        import soundfile as sf
+        self.file_path = file_path
+        info = sf.info(file_path)
+        self.sample_rate = info.samplerate
+        self.channels = info.channels
+        # Match the dtypes scipy.io.wavfile.read returns for these subtypes
+        self.dtype = np.dtype({'PCM_16': 'int16', 'PCM_24': 'int32', 'PCM_32': 'int32',
+                               'DOUBLE': 'float64'}.get(info.subtype, 'float32'))
+        self.frames = info.frames
+        self.shape = (self.frames,) if self.channels == 1 else (self.frames, self.channels)
+        self.ndim = len(self.shape)
+    
+    def __len__(self):
+        return self.frames
+    
+    def __getitem__(self, key):
+        import soundfile as sf
+        if not isinstance(key, slice):
+            raise TypeError("SoundFileSamples only supports slicing")
+        start, stop, step = key.indices(self.frames)
+        with sf.SoundFile(self.file_path) as audio:
+            audio.seek(start)
+            data = audio.read(max(stop - start, 0), dtype=self.dtype.name, always_2d=self.channels > 1)
+        return data[::step]
+
+
+def _mono_block(block):
+    """Average channels the same way process_audio converts stereo files to mono"""
+    if block.ndim > 1:
+        block = np.mean(block, axis=1).astype(block.dtype)
+    return block
@@ -12,9 +12,17 @@ import matplotlib.pyplot as plt
 from pathlib import Path
 from datetime import datetime
 from django.conf import settings
+from django.db import transaction
 from django.utils.timezone import now
 from scipy.io import wavfile as wav
-from .models import DetectedNoiseAudioFile, Database, ProcessingLog, OriginalAudioFile, Zoo, Spectrogram
+from scipy.signal import stft
+from .models import DetectedNoiseAudioFile, Database, ProcessingLog, OriginalAudioFile, Zoo, Spectrogram, Waveform
+from .processing_wakeup import notify_pending_files
+from .processing_log import log_processing, buffered_processing_logs
+from .clip_rendering import render_clip_spectrograms
+from .spectrogram_rendering import SPECTROGRAM_TITLES, compute_spectrogram_db, render_spectrogram_image
+from .audio_access import AudioSource, open_wav_samples, SoundFileSamples, _mono_block, probe_wav_header
+from .stored_files import move_stored_file
 from datetime import datetime
 from django.core.files.base import ContentFile
 from django.core.exceptions import ObjectDoesNotExist
@@ -28,6 +36,9 @@ def organize_audio_file_by_date(audio_file_obj, recording_date):
     """
     Move an audio file to a date-based directory structure based on its recording date.
     
+    The file is moved within its storage (see stored_files.move_stored_file): renamed on
+    the local file system, copied server-side on Azure Blob Storage, so the recording is
+    not copied through the app.
     """
     if not recording_date:
         return False
@@ -38,62 +49,171 @@ def organize_audio_file_by_date(audio_file_obj, recording_date):
         month = recording_date.strftime('%m')
         day = recording_date.strftime('%d')
         
-        # Construct the relative path for the new location
-        animal_type = original_audio.animal_type
-        new_relative_dir = os.path.join('audio_files', animal_type, year, month, day)
-        
-        # Ensure the directory exists
-        full_dir_path = os.path.join(settings.MEDIA_ROOT, new_relative_dir)
-        os.makedirs(full_dir_path, exist_ok=True)
-        
-        # Get the filename
-        filename = os.path.basename(original_audio.audio_file.name)
-        
-        # Construct the new path
-        new_relative_path = os.path.join(new_relative_dir, filename)
-        new_full_path = os.path.join(settings.MEDIA_ROOT, new_relative_path)
-        
-        # Get the current full path
-        current_full_path = original_audio.audio_file.path
+        # Construct the new name in the storage (always '/'-separated)
+        animal_type = audio_file_obj.animal_type
+        filename = os.path.basename(audio_file_obj.audio_file.name)
+        current_name = audio_file_obj.audio_file.name
+        new_name = '/'.join(['audio_files', animal_type, year, month, day, filename])
         
         # If the file is already in the correct location, no need to move it
-        if os.path.normpath(current_full_path) == os.path.normpath(new_full_path):
+        if current_name.replace('\\', '/') == new_name:
             return True
         
-        # Create a temporary file to avoid name conflicts
-        temp_dir = tempfile.mkdtemp(dir=os.path.dirname(new_full_path))
-        temp_path = os.path.join(temp_dir, filename)
-        
-        # Copy to temp location first to avoid issues with moving across filesystems
-        shutil.copy2(current_full_path, temp_path)
+        storage = audio_file_obj.audio_file.storage
+        new_name = move_stored_file(storage, current_name, new_name)
         
         # Update the model to point to the new location
-        original_audio.audio_file.name = new_relative_path
-        original_audio.save()
-        
-        # Move from temp to final destination
-        shutil.move(temp_path, new_full_path)
-        
-        # Clean up temp directory
-        shutil.rmtree(temp_dir, ignore_errors=True)
-        
-        # Remove the original file if it's different from the new location
-        if os.path.exists(current_full_path) and current_full_path != new_full_path:
-            os.remove(current_full_path)
+        audio_file_obj.audio_file.name = new_name
+        try:
+            audio_file_obj.save()
+        except Exception:
+            # Put the file back where the database says it is
+            move_stored_file(storage, new_name, current_name)
+            raise
         
         return True
         
     except Exception as e:
         # Log the error
-        ProcessingLog.objects.create(
-            audio_file=original_audio,
+        log_processing(
+            audio_file=audio_file_obj,
             message=f"Error organizing file: {str(e)}",
             level="ERROR"
         )
         return False
 
 
-def generate_spectrogram(audio_file_path, original_audio, spectrogram_type='mel'):
+def write_wav_file(path, sample_rate, samples):
+    """
+    Write samples to a WAV file atomically: the data goes to a uniquely named file in the
+    same directory, which then replaces path, so concurrent jobs never share a temporary
+    name and readers never see a half-written file
+    """
+    fd, temp_path = tempfile.mkstemp(suffix='.wav', dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            wav.write(temp_file, sample_rate, samples)
+        # mkstemp creates the file private to this user; media files are world-readable
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def spectrogram_directory(original_audio):
+    """
+    Relative media directory of a file's spectrograms: spectrograms/<animal>/<yyyy>/<mm>/<dd>,
+    dated by the recording date (or the upload date when it is unknown)
+    """
+    date = original_audio.recording_date or original_audio.upload_date
+    return os.path.join('spectrograms', original_audio.animal_type,
+                        date.strftime('%Y'), date.strftime('%m'), date.strftime('%d'))
+
+
+def spectrogram_image_path(original_audio, spectrogram_type='mel', image_format='png', clip_name=None):
+    """
+    Relative media path of a spectrogram image,
+    <spectrogram_directory>/<file>[_<clip_name>]_<type>_spectrogram.<format>
+    """
+    base_filename = os.path.splitext(os.path.basename(original_audio.audio_file.name))[0]
+    if clip_name:
+        base_filename = f"{base_filename}_{clip_name}"
+    return os.path.join(spectrogram_directory(original_audio), f"{base_filename}_{spectrogram_type}_spectrogram.{image_format}")
+
+
+def spectrogram_tile_directory(original_audio, spectrogram_type='mel'):
+    """
+    Absolute directory of a file's spectrogram tile pyramid (see spectrogram_tiles)
+    """
+    base_filename = os.path.splitext(os.path.basename(original_audio.audio_file.name))[0]
+    return os.path.join(settings.MEDIA_ROOT, spectrogram_directory(original_audio),
+                        f"{base_filename}_{spectrogram_type}_tiles")
+
+
+def tile_pyramids_on_demand():
+    """
+    Whether tile pyramids are built when the viewer first asks for them (lazy spectrogram
+    generation) rather than while processing
+    """
+    return (getattr(settings, 'SPECTROGRAM_TILE_PYRAMID', True)
+            and getattr(settings, 'SPECTROGRAM_GENERATION', 'lazy') != 'eager')
+
+
+def spectrogram_tiles_url(original_audio, spectrogram_type='mel'):
+    """
+    URL of the manifest of a file's spectrogram tile pyramid, or None if it has not been
+    built and is not built on demand
+    """
+    from django.urls import reverse
+    from .spectrogram_tiles import MANIFEST_NAME, PYRAMID_TYPES
+    
+    if not os.path.exists(os.path.join(spectrogram_tile_directory(original_audio, spectrogram_type), MANIFEST_NAME)):
+        if not (tile_pyramids_on_demand() and spectrogram_type in PYRAMID_TYPES):
+            return None
+    return reverse('api_spectrogram_tile_manifest', args=[original_audio.pk, spectrogram_type])
+
+
+def waveform_peaks_path(original_audio):
+    """
+    Relative media path of a file's waveform peak pyramid,
+    waveforms/<animal>/<yyyy>/<mm>/<dd>/<file>_peaks.bin (dated like spectrogram_directory)
+    """
+    date = original_audio.recording_date or original_audio.upload_date
+    base_filename = os.path.splitext(os.path.basename(original_audio.audio_file.name))[0]
+    return os.path.join('waveforms', original_audio.animal_type, date.strftime('%Y'), date.strftime('%m'),
+                        date.strftime('%d'), f"{base_filename}_peaks.bin")
+
+
+def waveform_peaks_url(original_audio):
+    """
+    URL of a file's waveform peaks endpoint, or None if its peaks have not been computed
+    """
+    from django.urls import reverse
+    
+    if not Waveform.objects.filter(audio_file=original_audio, peaks_path__isnull=False).exclude(peaks_path='').exists():
+        return None
+    return reverse('api_waveform_peaks', args=[original_audio.pk])
+
+
+def spectrogram_image_url(original_audio, spectrogram_type='mel', start=None, end=None):
+    """
+    URL of a spectrogram image rendered on first request (see spectrogram_cache): the whole
+    recording, or the clip from start to end (seconds or time objects)
+    """
+    from django.urls import reverse
+    from urllib.parse import urlencode
+    
+    url = reverse('api_spectrogram_image', args=[original_audio.pk, spectrogram_type])
+    if start is None and end is None:
+        return url
+    return f"{url}?{urlencode({'start': f'{time_to_seconds(start):.6f}', 'end': f'{time_to_seconds(end):.6f}'})}"
+
+
+def audio_stream_url(original_audio, start=None, end=None):
+    """
+    URL streaming a recording with Range support (see audio_streaming): the whole file, or
+    the clip from start to end (seconds or time objects) as a WAV file of its own
+    """
+    from django.urls import reverse
+    from urllib.parse import urlencode
+    
+    url = reverse('api_stream_audio', args=[original_audio.pk])
+    if start is None and end is None:
+        return url
+    return f"{url}?{urlencode({'start': f'{time_to_seconds(start):.6f}', 'end': f'{time_to_seconds(end):.6f}'})}"
+
+
+def clip_stream_url(detected_noise):
+    """URL streaming a detected saw call, whether it has a segment file or is a virtual clip"""
+    from django.urls import reverse
+    
+    return reverse('api_stream_clip', args=[detected_noise.pk])
+
+
+def generate_spectrogram(audio_file_path, original_audio, spectrogram_type='mel', audio=None,
+                         start_sample=0, end_sample=None, features=None, tiles=False, clip_name=None):
     """
     Generate and save a spectrogram from an audio file.
     
@@ -101,114 +221,93 @@ def generate_spectrogram(audio_file_path, original_audio, spectrogram_type='mel'
     - audio_file_path: Path to the audio file
     - original_audio: OriginalAudioFile model instance
     - spectrogram_type: Type of spectrogram to generate ('mel', 'linear', or 'chroma')
+    - audio: Optional AudioSource already open for this file; samples are then read from it
+      instead of decoding the file again
+    - start_sample, end_sample: Sample range of audio to use (whole recording by default)
+    - features: Optional SpectrogramAccumulator filled by detect_saw_calls for the whole
+      recording; the image is then projected from the detection STFT without a new transform
+    - tiles: Also build a zoomable tile pyramid of the whole recording ('mel' and 'linear'
+      only) next to the image, see spectrogram_tile_directory
+    - clip_name: Added to the image name of a clip (e.g. 'segment_3') so clips don't overwrite
+      each other or the full recording's image; defaults to the sample range for clips
     
     Returns:
     - Spectrogram model instance or None if failed
     """
     try:
         # Create a log entry for the start of spectrogram generation
-        ProcessingLog.objects.create(
+        log_processing(
             audio_file=original_audio,
             message=f"Starting {spectrogram_type} spectrogram generation",
             level="INFO"
         )
         
-        # Load the audio file
-        try:
-            # Use librosa for better handling of various audio formats
-            y, sr = librosa.load(audio_file_path, sr=None)
-        except Exception as e:
-            # If librosa fails, try with scipy as a fallback
-            ProcessingLog.objects.create(
-                audio_file=original_audio,
-                message=f"Librosa failed to load audio, trying scipy: {str(e)}",
-                level="WARNING"
-            )
-            sr, y = wav.read(audio_file_path)
-            # Convert to float32 for librosa compatibility if needed
-            if y.dtype != np.float32:
-                y = y.astype(np.float32) / np.iinfo(y.dtype).max
-        
-        # Generate the spectrogram based on the type
-        if spectrogram_type == 'mel':
-            # Mel spectrogram (good for general audio analysis)
-            S = librosa.feature.melspectrogram(y=y, sr=sr, n_mels=128, 
-                                            fmax=sr/2, hop_length=512)
-            # Convert to dB scale
-            S_dB = librosa.power_to_db(S, ref=np.max)
-            title = "Mel Spectrogram"
-        elif spectrogram_type == 'linear':
-            # Linear spectrogram (standard STFT)
-            S = np.abs(librosa.stft(y, hop_length=512))
-            # Convert to dB scale
-            S_dB = librosa.amplitude_to_db(S, ref=np.max)
-            title = "Linear Spectrogram"
-        elif spectrogram_type == 'chroma':
-            # Chromagram (good for tonal content)
-            S_dB = librosa.feature.chroma_stft(y=y, sr=sr, hop_length=512)
-            title = "Chromagram"
+        hop_length = 512
+        if features is not None:
+            # Project the power spectrum the detector already computed (no decode, no new STFT)
+            S_dB = features.spectrogram_db(spectrogram_type if spectrogram_type in SPECTROGRAM_TITLES else 'mel')
+            sr, hop_length = features.sample_rate, features.hop_length
         else:
-            # Default to mel spectrogram
-            S = librosa.feature.melspectrogram(y=y, sr=sr)
-            S_dB = librosa.power_to_db(S, ref=np.max)
-            title = "Mel Spectrogram"
-        
-        # Create a figure for the spectrogram
-        plt.figure(figsize=(10, 4))
+            # Load the audio file
+            try:
+                if audio is not None:
+                    # Reuse the job's memory-mapped samples (same scaling as librosa.load)
+                    y, sr = audio.normalized(start_sample, end_sample), audio.sample_rate
+                else:
+                    # Use librosa for better handling of various audio formats
+                    y, sr = librosa.load(audio_file_path, sr=None)
+            except Exception as e:
+                # If librosa fails, try with scipy as a fallback
+                log_processing(
+                    audio_file=original_audio,
+                    message=f"Librosa failed to load audio, trying scipy: {str(e)}",
+                    level="WARNING"
+                )
+                sr, y = wav.read(audio_file_path)
+                # Convert to float32 for librosa compatibility if needed
+                if y.dtype != np.float32:
+                    y = y.astype(np.float32) / np.iinfo(y.dtype).max
+            
+            # Generate the spectrogram based on the type
+            S_dB = compute_spectrogram_db(y, sr, spectrogram_type, hop_length=hop_length)
         
-        # Plot the spectrogram
-        librosa.display.specshow(S_dB, sr=sr, x_axis='time', y_axis='mel' if spectrogram_type != 'chroma' else 'chroma')
-        plt.colorbar(format='%+2.0f dB')
-        plt.title(title)
+        renderer = getattr(settings, 'SPECTROGRAM_RENDERER', 'fast')
+        image_format = 'png' if renderer == 'publication' else getattr(settings, 'SPECTROGRAM_IMAGE_FORMAT', 'png')
         
-        # Save the figure to a temporary file
-        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as temp_file:
+        with tempfile.NamedTemporaryFile(suffix=f'.{image_format}', delete=False) as temp_file:
             temp_path = temp_file.name
-            plt.savefig(temp_path, bbox_inches='tight', dpi=300)
-            plt.close()
+        render_spectrogram_image(S_dB, temp_path, sr, hop_length, spectrogram_type, renderer=renderer,
+                                 annotate=getattr(settings, 'SPECTROGRAM_ANNOTATE_AXES', True))
         
-        # Create a relative path for the spectrogram
-        filename = os.path.basename(original_audio.audio_file.name)
-        base_filename = os.path.splitext(filename)[0]
-        spectrogram_filename = f"{base_filename}_{spectrogram_type}_spectrogram.png"
-        
-        # Create a directory structure based on the recording date
-        if original_audio.recording_date:
-            year = original_audio.recording_date.strftime('%Y')
-            month = original_audio.recording_date.strftime('%m')
-            day = original_audio.recording_date.strftime('%d')
-        else:
-            # Use upload date as fallback
-            year = original_audio.upload_date.strftime('%Y')
-            month = original_audio.upload_date.strftime('%m')
-            day = original_audio.upload_date.strftime('%d')
-        
-        # Construct the relative path for the spectrogram
-        spectrogram_relative_dir = os.path.join('spectrograms', original_audio.animal_type, year, month, day)
+        # Create a relative path for the spectrogram (date-based directory structure)
+        if clip_name is None and (start_sample or end_sample is not None):
+            clip_name = f"{start_sample}_{end_sample}"
+        spectrogram_relative_path = spectrogram_image_path(original_audio, spectrogram_type, image_format, clip_name)
         
         # Ensure the directory exists
-        spectrogram_full_dir = os.path.join(settings.MEDIA_ROOT, spectrogram_relative_dir)
-        os.makedirs(spectrogram_full_dir, exist_ok=True)
-        
-        # Construct the full path for the spectrogram
-        spectrogram_relative_path = os.path.join(spectrogram_relative_dir, spectrogram_filename)
         spectrogram_full_path = os.path.join(settings.MEDIA_ROOT, spectrogram_relative_path)
+        os.makedirs(os.path.dirname(spectrogram_full_path), exist_ok=True)
         
         # Move the temporary file to the final location
         shutil.move(temp_path, spectrogram_full_path)
         
-        # Create or update the Spectrogram model
+        if tiles:
+            generate_spectrogram_tiles(audio_file_path, original_audio, spectrogram_type, audio=audio)
+        
+        # Create or update the Spectrogram model (one row per image, as for rendered clips)
+        is_full_audio = not start_sample and end_sample is None
         spectrogram, created = Spectrogram.objects.update_or_create(
             audio_file=original_audio,
-            spectrogram_type=spectrogram_type,
+            image_path=spectrogram_relative_path,
             defaults={
-                'spectrogram_file': spectrogram_relative_path,
-                'generated_date': now()
+                'is_full_audio': is_full_audio,
+                'clip_start_time': None if is_full_audio else start_sample / sr,
+                'clip_end_time': None if is_full_audio or end_sample is None else end_sample / sr
             }
         )
         
         # Log successful spectrogram generation
-        ProcessingLog.objects.create(
+        log_processing(
             audio_file=original_audio,
             message=f"{spectrogram_type.capitalize()} spectrogram generated successfully",
             level="SUCCESS"
@@ -218,13 +317,105 @@ def generate_spectrogram(audio_file_path, original_audio, spectrogram_type='mel'
         
     except Exception as e:
         # Log error in spectrogram generation
-        ProcessingLog.objects.create(
+        log_processing(
             audio_file=original_audio,
             message=f"Error generating {spectrogram_type} spectrogram: {str(e)}",
             level="ERROR"
         )
         return None
 
+def generate_spectrogram_tiles(audio_file_path, original_audio, spectrogram_type='mel', audio=None):
+    """
+    Build the zoomable tile pyramid of a recording's spectrogram (see spectrogram_tiles).
+    
+    Parameters:
+    - audio_file_path: Path to the audio file
+    - original_audio: OriginalAudioFile model instance
+    - spectrogram_type: 'mel' or 'linear'
+    - audio: Optional AudioSource already open for this file
+    
+    Returns:
+    - dict: The pyramid manifest, or None if failed
+    """
+    from .spectrogram_tiles import build_spectrogram_pyramid
+    
+    try:
+        source = audio if audio is not None else AudioSource(audio_file_path)
+        try:
+            manifest = build_spectrogram_pyramid(
+                source,
+                spectrogram_tile_directory(original_audio, spectrogram_type),
+                spectrogram_type=spectrogram_type,
+                tile_size=getattr(settings, 'SPECTROGRAM_TILE_SIZE', 256),
+                image_format=getattr(settings, 'SPECTROGRAM_IMAGE_FORMAT', 'png')
+            )
+        finally:
+            if source is not audio:
+                source.close()
+        
+        log_processing(
+            audio_file=original_audio,
+            message=f"{spectrogram_type.capitalize()} spectrogram tiles generated ({manifest['max_zoom'] + 1} zoom levels)",
+            level="SUCCESS"
+        )
+        return manifest
+    
+    except Exception as e:
+        log_processing(
+            audio_file=original_audio,
+            message=f"Error generating {spectrogram_type} spectrogram tiles: {str(e)}",
+            level="ERROR"
+        )
+        return None
+
+def generate_waveform_peaks(audio_file_path, original_audio, audio=None):
+    """
+    Compute the min/max peak pyramid of a recording (see waveform_peaks) and record it on
+    the file's Waveform.
+    
+    Parameters:
+    - audio_file_path: Path to the audio file
+    - original_audio: OriginalAudioFile model instance
+    - audio: Optional AudioSource already open for this file
+    
+    Returns:
+    - Waveform model instance or None if failed
+    """
+    from .waveform_peaks import build_peak_pyramid, DEFAULT_LEVELS
+    
+    try:
+        relative_path = waveform_peaks_path(original_audio)
+        full_path = os.path.join(settings.MEDIA_ROOT, relative_path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        
+        source = audio if audio is not None else AudioSource(audio_file_path)
+        try:
+            header = build_peak_pyramid(source, full_path, levels=getattr(settings, 'WAVEFORM_PEAK_LEVELS', DEFAULT_LEVELS))
+        finally:
+            if source is not audio:
+                source.close()
+        
+        waveform = Waveform.objects.filter(audio_file=original_audio).first()
+        if waveform is None:
+            waveform = Waveform(audio_file=original_audio)
+        waveform.peaks_path = relative_path
+        waveform.save()
+        
+        log_processing(
+            audio_file=original_audio,
+            message=f"Waveform peaks computed ({len(header['levels'])} levels)",
+            level="SUCCESS"
+        )
+        return waveform
+    
+    except Exception as e:
+        log_processing(
+            audio_file=original_audio,
+            message=f"Error computing waveform peaks: {str(e)}",
+            level="ERROR"
+        )
+        return None
+
 def parse_audio_filename(filename):
     """
     Parse audio filenames in various formats, with primary support for:
@@ -506,6 +697,7 @@ def parse_audio_filename(filename):
         # This allows processing to continue even with unexpected filename formats
         return default_device_info, current_time
 
+@buffered_processing_logs()
 def update_audio_metadata(file_path, original_audio):
     """
     Update the metadata of the audio file based on its filename and content
@@ -513,7 +705,7 @@ def update_audio_metadata(file_path, original_audio):
     """
     try:
         # Create a log entry for the start of metadata update
-        ProcessingLog.objects.create(
+        log_processing(
             audio_file=original_audio,
             message="Starting metadata extraction",
             level="INFO"
@@ -533,7 +725,7 @@ def update_audio_metadata(file_path, original_audio):
                 original_audio.save()
                 
                 # Log successful metadata extraction
-                ProcessingLog.objects.create(
+                log_processing(
                     audio_file=original_audio,
                     message=f"Successfully extracted metadata. Recording date: {recording_datetime}",
                     level="SUCCESS"
@@ -545,14 +737,14 @@ def update_audio_metadata(file_path, original_audio):
                     file_path = original_audio.audio_file.path
                     
                     # Log the new path
-                    ProcessingLog.objects.create(
+                    log_processing(
                         audio_file=original_audio,
                         message=f"File moved to: {original_audio.audio_file.name}",
                         level="INFO"
                     )
         except Exception as e:
             # Log error in metadata extraction but continue processing
-            ProcessingLog.objects.create(
+            log_processing(
                 audio_file=original_audio,
                 message=f"Error parsing filename: {str(e)}. Using upload date as fallback.",
                 level="WARNING"
@@ -564,7 +756,7 @@ def update_audio_metadata(file_path, original_audio):
                 original_audio.save()
                 
                 # Log fallback to upload date
-                ProcessingLog.objects.create(
+                log_processing(
                     audio_file=original_audio,
                     message=f"Using upload date as recording date: {original_audio.upload_date}",
                     level="INFO"
@@ -579,11 +771,10 @@ def update_audio_metadata(file_path, original_audio):
             # Update file size in the database
             original_audio.file_size_mb = file_size_mb
             
-            # Extract audio duration and sample rate using scipy.io.wavfile
-            sample_rate, audio_data = wav.read(file_path)
-            
-            # Calculate duration in seconds
-            duration_seconds = len(audio_data) / sample_rate
+            # Read the format and metadata chunks from the WAV header (samples are not read)
+            header = probe_wav_header(file_path)
+            sample_rate = header['sample_rate']
+            duration_seconds = header['duration_seconds']
             
             # Format duration as HH:MM:SS
             hours, remainder = divmod(int(duration_seconds), 3600)
@@ -594,16 +785,25 @@ def update_audio_metadata(file_path, original_audio):
             original_audio.sample_rate = sample_rate
             original_audio.duration_seconds = duration_seconds
             original_audio.duration = duration_str
+            original_audio.channels = header['channels']
+            original_audio.bit_depth = header['bit_depth']
+            original_audio.frame_count = header['frames']
+            original_audio.audio_format = header['audio_format']
+            original_audio.header_metadata = {
+                'chunks': header['chunks'],
+                'info': header['info'],
+                'guano': header['guano'],
+            }
             
             # Log audio properties
-            ProcessingLog.objects.create(
+            log_processing(
                 audio_file=original_audio,
-                message=f"Audio properties: {sample_rate}Hz, {duration_str} ({duration_seconds:.2f}s), {file_size_mb:.2f}MB",
+                message=f"Audio properties: {sample_rate}Hz, {header['channels']} channel(s), {header['bit_depth']}-bit {header['audio_format']}, {duration_str} ({duration_seconds:.2f}s), {file_size_mb:.2f}MB",
                 level="INFO"
             )
         except Exception as e:
             # Log error in audio property extraction but continue processing
-            ProcessingLog.objects.create(
+            log_processing(
                 audio_file=original_audio,
                 message=f"Error extracting audio properties: {str(e)}",
                 level="WARNING"
@@ -617,9 +817,17 @@ def update_audio_metadata(file_path, original_audio):
             audio_file=original_audio,
             defaults={'status': 'Pending'}
         )
+        if db_entry.status in ('Uploaded', 'Ingesting'):
+            # Queued by queue_uploaded_file; ready for processing now
+            db_entry.status = 'Pending'
+            db_entry.processing_start_time = None
+            db_entry.save(update_fields=['status', 'processing_start_time'])
+        if db_entry.status == 'Pending':
+            # Wake the background processor once the entry is committed
+            transaction.on_commit(notify_pending_files)
         
         # Log successful metadata update
-        ProcessingLog.objects.create(
+        log_processing(
             audio_file=original_audio,
             message="Metadata update completed successfully",
             level="SUCCESS"
@@ -629,13 +837,47 @@ def update_audio_metadata(file_path, original_audio):
         
     except Exception as e:
         # Log error in metadata update
-        ProcessingLog.objects.create(
+        log_processing(
             audio_file=original_audio,
             message=f"Error updating metadata: {str(e)}",
             level="ERROR"
         )
         return False
 
+def queue_uploaded_file(original_audio, batch=None):
+    """
+    Queue a stored upload for the background workers, which read its metadata, organize it
+    and mark it pending for processing (see tasks.ingest_uploaded_files), so upload
+    requests return as soon as the file is stored
+    
+    Parameters:
+    - original_audio: OriginalAudioFile model instance whose file is stored
+    - batch: UploadBatch the file was uploaded in (optional)
+    
+    Returns:
+    - Database: The entry of the file, with status Uploaded
+    """
+    from .tasks import ensure_background_processor
+    
+    db_entry, created = Database.objects.get_or_create(
+        audio_file=original_audio,
+        defaults={'status': 'Uploaded', 'batch': batch}
+    )
+    if not created and db_entry.batch is None and batch is not None:
+        db_entry.batch = batch
+        db_entry.save(update_fields=['batch'])
+    
+    log_processing(
+        audio_file=original_audio,
+        message="Upload stored, waiting for metadata extraction",
+        level="INFO"
+    )
+    
+    # Wake an idle worker once the entry is committed (starting the processor if needed)
+    transaction.on_commit(ensure_background_processor)
+    transaction.on_commit(notify_pending_files)
+    return db_entry
+
 def seconds_to_timestamp(seconds):
     """
     Converts seconds to a timestamp in HH:MM:SS.SS format, with seconds rounded to two decimal places.
@@ -651,147 +893,561 @@ def seconds_to_timestamp(seconds):
     return f"{int(hours):02d}:{int(minutes):02d}:{seconds:06.2f}"
 
 
-def detect_saw_calls(audio_data, sample_rate, animal_type=None):
+def parse_timestamp(timestamp):
     """
-    Detects saw calls in the audio data using STFT analysis.
+    Converts a timestamp from seconds_to_timestamp (or plain HH:MM:SS) to a time object.
+    
+    seconds_to_timestamp zero-pads the seconds to six characters (e.g. '00:00:005.05'),
+    which strptime cannot parse, so the fields are split by hand.
     
     Parameters:
-    - audio_data (numpy.ndarray): The audio data.
-    - sample_rate (int): The sample rate of the audio data.
-    - animal_type (str, optional): The type of animal to use parameters for. If None, uses default parameters.
+    - timestamp (str): The timestamp to convert.
     
     Returns:
-    - list: A list of dictionaries containing information about detected saw calls:
-            [{'start': start_time_str, 'end': end_time_str, 'magnitude': mag, 'frequency': freq, 'impulse_count': count}]
+    - datetime.time: The time of day the timestamp represents.
+    """
+    from datetime import time
+    hours, minutes, seconds = timestamp.split(':')
+    seconds = float(seconds)
+    whole_seconds = int(seconds)
+    microseconds = min(int(round((seconds - whole_seconds) * 1000000)), 999999)
+    return time(int(hours), int(minutes), whole_seconds, microseconds)
+
+
+def time_to_seconds(value):
+    """
+    Converts a clip time (a time object as DetectedNoiseAudioFile stores it, or seconds) to seconds.
+    
+    Parameters:
+    - value (datetime.time or float): The time to convert.
+    
+    Returns:
+    - float: Seconds from the start of the recording.
+    """
+    if hasattr(value, 'hour'):
+        return value.hour * 3600 + value.minute * 60 + value.second + value.microsecond / 1000000
+    return float(value)
+
+
+# Fallback detection parameters (Amur Leopard) used when no AnimalDetectionParameters row applies
+DEFAULT_DETECTION_PARAMETERS = {
+    'min_magnitude': 3500,
+    'max_magnitude': 10000,
+    'min_frequency': 15,
+    'max_frequency': 300,
+    'segment_duration': 0.1,
+    'time_threshold': 5,
+    'min_impulse_count': 3,
+}
+
+
+def get_detection_parameters(animal_type=None):
+    """
+    Load the saw call detection parameters for an animal type.
+    
+    Parameters:
+    - animal_type (str, optional): Slug of the AnimalDetectionParameters row to use. If None, uses the default row.
+    
+    Returns:
+    - dict: Detection parameters keyed like DEFAULT_DETECTION_PARAMETERS
     """
     # Import here to avoid circular imports
     from .models import AnimalDetectionParameters
     
-    # Get parameters from the database based on animal type or use default
     try:
         if animal_type:
             params = AnimalDetectionParameters.objects.filter(slug=animal_type).first()
         else:
             params = AnimalDetectionParameters.objects.filter(is_default=True).first()
-            
+        
         # If no parameters found, use default hardcoded values
         if params:
-            min_mag = params.min_magnitude
-            max_mag = params.max_magnitude
-            min_freq = params.min_frequency
-            max_freq = params.max_frequency
-            segment_duration = params.segment_duration
-            time_threshold = params.time_threshold
-            min_impulse_count = params.min_impulse_count
-        else:
-            # Fallback to hardcoded defaults (Amur Leopard)
-            min_mag = 3500
-            max_mag = 10000
-            min_freq = 15
-            max_freq = 300
-            segment_duration = 0.1
-            time_threshold = 5
-            min_impulse_count = 3
+            return {key: getattr(params, key) for key in DEFAULT_DETECTION_PARAMETERS}
     except Exception as e:
         # Log the error and use defaults
         print(f"Error loading detection parameters: {e}")
-        min_mag = 3500
-        max_mag = 10000
-        min_freq = 15
-        max_freq = 300
-        segment_duration = 0.1
-        time_threshold = 5
-        min_impulse_count = 3
-    
-    # Convert audio data to float32 if not already
-    audio_data = audio_data.astype(np.float32)
-    
-    # Remove DC offset by subtracting the mean
-    audio_data -= np.mean(audio_data)
-    
-    # Compute the STFT with a specified segment duration
-    nperseg = int(segment_duration * sample_rate)
-    frequencies, times, Zxx = stft(audio_data, fs=sample_rate, nperseg=nperseg)
-    magnitude = np.abs(Zxx)  # Magnitude of the STFT result
-    
-    # Initialize variables for event detection
-    last_event_time_seconds = None
-    event_data = []
-    
-    # Iterate over each time frame
-    for time_idx in range(magnitude.shape[1]):
-        # Filter for magnitudes above the threshold
-        magnitudes_at_time = magnitude[:, time_idx]
-        valid_indices = np.where(np.logical_and(magnitudes_at_time < max_mag, magnitudes_at_time > min_mag))[0]
-        
-        if valid_indices.size == 0:
-            continue  # Skip if no magnitudes exceed the threshold
-        
-        event_time_seconds = times[time_idx]
-        # Format with higher precision (2 decimal places for seconds)
-        event_time_str = seconds_to_timestamp(event_time_seconds)
-        
-        # Extract valid frequencies and magnitudes
-        valid_frequencies = frequencies[valid_indices]
-        valid_magnitudes = magnitudes_at_time[valid_indices]
-        
-        # Filter frequencies between min_freq and max_freq Hz
-        freq_mask = (valid_frequencies < max_freq) & (valid_frequencies > min_freq)
-        valid_frequencies = valid_frequencies[freq_mask]
-        valid_magnitudes = valid_magnitudes[freq_mask]
-        
-        if len(valid_frequencies) == 0:
-            continue  # Skip if no frequencies in the valid range
-        
-        # Process events
-        for freq, mag in zip(valid_frequencies, valid_magnitudes):
-            if last_event_time_seconds is None:
-                # First event, add to dataset
-                event_data.append({
-                    'start': event_time_str,
-                    'end': event_time_str,
-                    'start_seconds': event_time_seconds,  # Store raw seconds for precise calculations
-                    'end_seconds': event_time_seconds,    # Store raw seconds for precise calculations
-                    'magnitude': float(mag),
-                    'frequency': float(freq),
-                    'impulse_count': 1
-                })
-                last_event_time_seconds = event_time_seconds
-            else:
-                # Check if the event is within the time threshold and more than 0.1 seconds later
-                time_diff = event_time_seconds - last_event_time_seconds
-                
-                if time_diff <= time_threshold and time_diff > 0.1:  # Events within threshold are merged
-                    # Extend the duration of the last event
-                    event_data[-1]['end'] = event_time_str
-                    event_data[-1]['end_seconds'] = event_time_seconds
-                    # Increase count of impulses
-                    event_data[-1]['impulse_count'] += 1
-                    # Update magnitude and frequency if higher
-                    if mag > event_data[-1]['magnitude']:
-                        event_data[-1]['magnitude'] = float(mag)
-                        event_data[-1]['frequency'] = float(freq)
-                elif time_diff > time_threshold:
-                    # Add new event
-                    event_data.append({
-                        'start': event_time_str,
-                        'end': event_time_str,
-                        'start_seconds': event_time_seconds,
-                        'end_seconds': event_time_seconds,
-                        'magnitude': float(mag),
-                        'frequency': float(freq),
-                        'impulse_count': 1
-                    })
-                
-                # Update last event time
-                last_event_time_seconds = event_time_seconds
+    
+    return dict(DEFAULT_DETECTION_PARAMETERS)
+
+
+def collapse_detection_frames(Zxx, frequencies, params):
+    """
+    Reduce an STFT matrix to one detection sample per time frame.
+    
+    The in-band / in-magnitude mask is computed for the whole matrix at once. Only the
+    lowest in-band bin of a frame can start or extend an event (every other bin of the
+    same frame is 0 seconds after it), so each frame collapses to that lead bin.
+    
+    Parameters:
+    - Zxx (numpy.ndarray): Complex STFT (or magnitude) matrix shaped (frequencies, frames).
+    - frequencies (numpy.ndarray): Frequency of each row of Zxx in Hz.
+    - params (dict): Detection parameters from get_detection_parameters().
+    
+    Returns:
+    - tuple: (hits, lead_magnitudes, lead_frequencies), one entry per frame
+    """
+    # Only the rows inside the frequency band are ever compared, so take magnitudes for those alone
+    band_rows = np.flatnonzero((frequencies < params['max_frequency']) & (frequencies > params['min_frequency']))
+    frame_count = Zxx.shape[1]
+    if band_rows.size == 0:
+        return np.zeros(frame_count, dtype=bool), np.zeros(frame_count, dtype=np.float32), np.zeros(frame_count)
+    
+    band_magnitude = np.abs(Zxx[band_rows])
+    in_range = (band_magnitude < params['max_magnitude']) & (band_magnitude > params['min_magnitude'])
+    hits = in_range.any(axis=0)
+    
+    # argmax returns the first True row, i.e. the lowest valid frequency of each frame
+    lead_rows = in_range.argmax(axis=0)
+    lead_magnitudes = band_magnitude[lead_rows, np.arange(frame_count)]
+    lead_frequencies = frequencies[band_rows][lead_rows]
+    
+    return hits, lead_magnitudes, lead_frequencies
+
+
+def _build_saw_call_events(times, magnitudes, frequencies, first):
+    """
+    Turn counted impulse frames into event dictionaries.
+    
+    Parameters:
+    - times, magnitudes, frequencies (numpy.ndarray): Counted impulse frames in time order.
+    - first (numpy.ndarray): Index of the frame that opens each event.
+    
+    Returns:
+    - list: Event dictionaries in the format returned by detect_saw_calls
+    """
+    last = np.append(first[1:], len(times)) - 1
+    event_ids = np.repeat(np.arange(len(first)), last - first + 1)
+    
+    # Peak magnitude per event; ties keep the earliest frame like the sequential merge did
+    peaks = np.maximum.reduceat(magnitudes, first)
+    position = np.arange(len(times))
+    peak_index = np.minimum.reduceat(np.where(magnitudes == peaks[event_ids], position, len(times)), first)
+    
+    events = []
+    for start_idx, end_idx, peak_idx in zip(first, last, peak_index):
+        start_seconds = float(times[start_idx])
+        end_seconds = float(times[end_idx])
+        events.append({
+            'start': seconds_to_timestamp(start_seconds),
+            'end': seconds_to_timestamp(end_seconds),
+            'start_seconds': start_seconds,  # Store raw seconds for precise calculations
+            'end_seconds': end_seconds,      # Store raw seconds for precise calculations
+            'magnitude': float(magnitudes[peak_idx]),
+            'frequency': float(frequencies[peak_idx]),
+            'impulse_count': int(end_idx - start_idx + 1)
+        })
+    return events
+
+
+class SawCallEventMerger:
+    """
+    Merges impulse frames into saw call events block by block.
+    
+    A frame more than time_threshold seconds after the previous hit starts a new event, a
+    frame 0.1 to time_threshold seconds later extends the current event, and closer frames
+    only move the reference time forward. The last hit time and the open event are carried
+    between calls to add(), so feeding a recording in blocks gives the same events as
+    feeding it in one piece.
+    """
+    
+    def __init__(self, time_threshold):
+        self.time_threshold = time_threshold
+        self.events = []
+        self.last_hit_time = None
+    
+    def add(self, hit_times, hit_magnitudes, hit_frequencies):
+        """
+        Merge the next block of hit frames (ascending times, all later than earlier blocks).
+        """
+        if len(hit_times) == 0:
+            return
+        
+        # Gap to the previous hit frame; the very first hit always opens an event
+        if self.last_hit_time is None:
+            gaps = np.concatenate(([np.inf], np.diff(hit_times)))
+        else:
+            gaps = np.diff(hit_times, prepend=self.last_hit_time)
+        self.last_hit_time = hit_times[-1]
+        
+        starts_event = gaps > self.time_threshold
+        counted = (gaps > 0.1) | starts_event
+        
+        times = hit_times[counted]
+        magnitudes = hit_magnitudes[counted]
+        frequencies = hit_frequencies[counted]
+        starts_event = starts_event[counted]
+        if len(times) == 0:
+            return
+        
+        # Frames before the first new event extend the event left open by the previous block
+        continuing = int(starts_event.argmax()) if starts_event.any() else len(times)
+        if continuing:
+            self._extend_open_event(times[:continuing], magnitudes[:continuing], frequencies[:continuing])
+        
+        if continuing < len(times):
+            first = np.flatnonzero(starts_event[continuing:])
+            self.events.extend(_build_saw_call_events(
+                times[continuing:], magnitudes[continuing:], frequencies[continuing:], first
+            ))
+    
+    def _extend_open_event(self, times, magnitudes, frequencies):
+        event = self.events[-1]
+        event['end'] = seconds_to_timestamp(float(times[-1]))
+        event['end_seconds'] = float(times[-1])
+        event['impulse_count'] += len(times)
+        
+        # Update magnitude and frequency if higher
+        peak_idx = int(magnitudes.argmax())
+        if magnitudes[peak_idx] > event['magnitude']:
+            event['magnitude'] = float(magnitudes[peak_idx])
+            event['frequency'] = float(frequencies[peak_idx])
+
+
+def merge_saw_call_events(hit_times, hit_magnitudes, hit_frequencies, time_threshold):
+    """
+    Merge impulse frames into saw call events using run segmentation.
+    
+    Parameters:
+    - hit_times (numpy.ndarray): Times in seconds of frames that contain a valid impulse, ascending.
+    - hit_magnitudes (numpy.ndarray): Lead bin magnitude of each hit frame.
+    - hit_frequencies (numpy.ndarray): Lead bin frequency of each hit frame.
+    - time_threshold (float): Maximum gap in seconds for merging impulses into one event.
+    
+    Returns:
+    - list: Event dictionaries in the format returned by detect_saw_calls (before impulse filtering)
+    """
+    merger = SawCallEventMerger(time_threshold)
+    merger.add(hit_times, hit_magnitudes, hit_frequencies)
+    return merger.events
+
+
+class _CenteredSignal:
+    """Mono float32 view of audio_data with the DC offset removed, read slice by slice"""
+    
+    def __init__(self, audio_data, dc_offset):
+        self.audio_data = audio_data
+        self.dc_offset = np.float32(dc_offset)
+    
+    def __len__(self):
+        return len(self.audio_data)
+    
+    def __getitem__(self, key):
+        return _mono_block(self.audio_data[key]).astype(np.float32) - self.dc_offset
+
+
+class _FIRDecimator:
+    """
+    One decimation stage of _DecimatedSignal: a linear-phase FIR low-pass applied with FFT
+    convolution to a stream of chunks, keeping every factor-th sample of the stream
+    """
+    
+    def __init__(self, taps, factor):
+        self.taps = taps.astype(np.float32)
+        self.factor = factor
+        # Input before the current chunk (zeros before the start of the stream)
+        self.history = np.zeros(len(taps) - 1, dtype=np.float32)
+        self.position = 0
+    
+    def process(self, chunk):
+        from scipy.signal import oaconvolve
+        signal = np.concatenate([self.history, chunk])
+        filtered = oaconvolve(signal, self.taps, mode='valid')
+        kept = filtered[(-self.position) % self.factor::self.factor]
+        self.position += len(chunk)
+        self.history = signal[len(chunk):]
+        return kept
+
+
+class _DecimatedSignal:
+    """
+    Low-pass filtered and decimated view of audio_data for band-limited detection.
+    
+    The anti-aliasing filters are linear-phase FIRs whose combined delay is a whole number
+    of decimated samples, so advancing the output by that delay makes the front end
+    zero-phase: every frequency keeps its timing and the decimated samples line up exactly
+    with the full-band ones. The recording is filtered one chunk at a time with the filter
+    state carried across chunks, in one sequential pass. Slices must move forward through
+    the signal (they may overlap the previous slice), which is how detect_saw_calls reads blocks.
+    """
+    
+    chunk_samples = 1 << 20
+    
+    def __init__(self, audio_data, dc_offset, factor, stages, delay=0):
+        self.source = _CenteredSignal(audio_data, dc_offset)
+        self.stages = [_FIRDecimator(taps, stage_factor) for stage_factor, taps in stages]
+        self.source_position = 0
+        # The filters' tail past the end of the recording (delay decimated samples) is needed too
+        self.source_length = len(audio_data) + delay * factor
+        self.buffer = np.zeros(0, dtype=np.float32)
+        # The first `delay` decimated samples are dropped by starting the buffer before zero
+        self.buffer_start = -delay
+        self.length = -(-len(audio_data) // factor)
+    
+    def __len__(self):
+        return self.length
+    
+    def __getitem__(self, key):
+        start, stop, _ = key.indices(self.length)
+        
+        # Filter more of the source until the requested output exists
+        pieces = [self.buffer]
+        produced = self.buffer_start + len(self.buffer)
+        while produced < stop and self.source_position < self.source_length:
+            end = min(self.source_position + self.chunk_samples, self.source_length)
+            chunk = self.source[self.source_position:min(end, len(self.source))]
+            if len(chunk) < end - self.source_position:
+                chunk = np.concatenate([chunk, np.zeros(end - self.source_position - len(chunk), dtype=np.float32)])
+            self.source_position = end
+            for stage in self.stages:
+                chunk = stage.process(chunk)
+            pieces.append(chunk.astype(np.float32))
+            produced += len(chunk)
+        
+        # Past the end of the recording (after the delay shift) the signal is silent
+        if produced < stop:
+            pieces.append(np.zeros(stop - produced, dtype=np.float32))
+        self.buffer = np.concatenate(pieces)
+        
+        # Drop output that no later slice can ask for (including the delay, on the first read)
+        if start > self.buffer_start:
+            self.buffer = self.buffer[start - self.buffer_start:]
+            self.buffer_start = start
+        
+        return self.buffer[start - self.buffer_start:stop - self.buffer_start]
+
+
+def band_limited_decimation(sample_rate, params):
+    """
+    Choose how far to decimate for band-limited detection.
+    
+    The decimated rate keeps max_frequency at least 25% below the new Nyquist frequency, so
+    the anti-aliasing filter (passband up to 80% of the new Nyquist) leaves the detection
+    band intact. The factor also divides the STFT segment and hop lengths, so decimated
+    frames fall on exactly the same time grid as full-band frames.
+    
+    Parameters:
+    - sample_rate (int): Native sample rate.
+    - params (dict): Detection parameters from get_detection_parameters().
+    
+    Returns:
+    - int: Decimation factor (1 means the signal is already close to the band)
+    """
+    nperseg = int(params['segment_duration'] * sample_rate)
+    hop = nperseg - nperseg // 2
+    max_factor = int(sample_rate // (2 * params['max_frequency'] * 1.25))
+    for factor in range(max_factor, 1, -1):
+        if nperseg % factor == 0 and hop % factor == 0 and (nperseg // factor) % 2 == 0:
+            return factor
+    return 1
+
+
+def _anti_alias_filter(factor, sample_rate, params):
+    """
+    Design the decimation low-pass filters: linear-phase Kaiser-window FIRs with 60 dB of
+    stopband attenuation, passing up to 80% of the final Nyquist frequency.
+    
+    A composite factor is split into two stages. The first only has to keep aliases out of
+    the detection band, so its filter is short; the sharp filter then runs at the lower
+    intermediate rate. Each filter's length is rounded up so that the combined delay is a
+    whole number of decimated samples.
+    
+    Returns:
+    - tuple: (stages, delay) where stages is a list of (factor, taps) and delay is in
+      decimated samples
+    """
+    from scipy.signal import firwin, kaiserord
+    divisors = [d for d in range(2, factor) if factor % d == 0]
+    stage_factors = [divisors[-1], factor // divisors[-1]] if divisors else [factor]
+    
+    stages = []
+    delay = 0  # In samples at the input of the current stage
+    remaining = factor
+    for stage_factor in stage_factors:
+        # Edges relative to the Nyquist frequency at the stage's input
+        passband = 0.8 / remaining
+        stopband = 1 / stage_factor if stage_factor == remaining else 2 / stage_factor - passband
+        numtaps, beta = kaiserord(60, stopband - passband)
+        half = -(-(numtaps - 1) // 2)
+        half += -(delay + half) % stage_factor
+        stages.append((stage_factor, firwin(2 * half + 1, (passband + stopband) / 2, window=('kaiser', beta))))
+        delay = (delay + half) // stage_factor
+        remaining //= stage_factor
+    return stages, delay
+
+
+class SpectrogramAccumulator:
+    """
+    Collects the power spectrogram of a recording from the STFT blocks of detect_saw_calls.
+    
+    The detector already computes a full-band STFT of the whole recording; handing its blocks
+    to this accumulator lets generate_spectrogram render the full-file images from the same
+    transform instead of decoding the file and computing new STFTs. Frames are averaged in
+    groups of consecutive frames so at most max_columns columns are kept, which bounds memory
+    for hours-long recordings (an image cannot show more columns than it has pixels anyway).
+    """
+    
+    def __init__(self, max_columns=None):
+        self.max_columns = max_columns or getattr(settings, 'SPECTROGRAM_MAX_COLUMNS', 4096)
+        self.power = None
+    
+    def begin(self, n_frames, sample_rate, nperseg, hop):
+        """Called by detect_saw_calls with the frame layout before the first block"""
+        self.sample_rate = sample_rate
+        self.n_fft = nperseg
+        self.frames_per_column = max(1, -(-n_frames // self.max_columns))
+        self.hop_length = hop * self.frames_per_column
+        self.n_columns = -(-n_frames // self.frames_per_column)
+        self.counts = np.zeros(self.n_columns)
+        self.power = None
+    
+    def add(self, first_frame, Zxx):
+        """Add the STFT frames of one block (frequency x frame) starting at frame first_frame"""
+        power = np.abs(Zxx) ** 2
+        if self.power is None:
+            self.power = np.zeros((power.shape[0], self.n_columns), dtype=np.float32)
+        
+        # Sum the block's frames into their columns (a column may continue in the next block)
+        columns = (first_frame + np.arange(power.shape[1])) // self.frames_per_column
+        starts = np.flatnonzero(np.r_[True, columns[1:] != columns[:-1]])
+        self.power[:, columns[starts]] += np.add.reduceat(power, starts, axis=1)
+        self.counts[columns[starts]] += np.diff(np.r_[starts, power.shape[1]])
+    
+    def power_spectrum(self):
+        """Mean power per column, shape (n_fft // 2 + 1, columns)"""
+        return self.power / np.maximum(self.counts, 1).astype(np.float32)
+    
+    def spectrogram_db(self, spectrogram_type):
+        """
+        Project the power spectrum for one spectrogram type, in the scale generate_spectrogram plots.
+        
+        Parameters:
+        - spectrogram_type: 'mel', 'linear' or 'chroma'
+        
+        Returns:
+        - numpy.ndarray: dB values for 'mel' and 'linear', chroma energies for 'chroma'
+        """
+        power = self.power_spectrum()
+        if spectrogram_type == 'linear':
+            return librosa.amplitude_to_db(np.sqrt(power), ref=np.max)
+        if spectrogram_type == 'chroma':
+            return librosa.feature.chroma_stft(S=power, sr=self.sample_rate, n_fft=self.n_fft)
+        mel_basis = librosa.filters.mel(sr=self.sample_rate, n_fft=self.n_fft, n_mels=128, fmax=self.sample_rate / 2)
+        return librosa.power_to_db(mel_basis @ power, ref=np.max)
+
+
+def detect_saw_calls(audio_data, sample_rate, animal_type=None, block_frames=None, front_end=None,
+                     spectrogram=None):
+    """
+    Detects saw calls in the audio data using STFT analysis.
+    
+    The STFT is computed over blocks of block_frames frames at a time and the event merge
+    state is carried from block to block, so only one block of samples and its STFT are in
+    memory at once. audio_data may be a memory-mapped array (see open_wav_samples) and may
+    have several channels, which are averaged block by block.
+    
+    With the 'band_limited' front end the signal is low-pass filtered and decimated to just
+    above twice the parameter set's max_frequency before the STFT, so the transform covers
+    only the detection band. The frequency resolution (1 / segment_duration) is unchanged.
+    
+    Parameters:
+    - audio_data (numpy.ndarray): The audio data.
+    - sample_rate (int): The sample rate of the audio data.
+    - animal_type (str, optional): The type of animal to use parameters for. If None, uses default parameters.
+    - block_frames (int, optional): STFT frames per block. Defaults to settings.SAW_CALL_DETECTION_BLOCK_FRAMES.
+    - front_end (str, optional): 'full_band' or 'band_limited'. Defaults to settings.SAW_CALL_DETECTION_FRONT_END.
+    - spectrogram (SpectrogramAccumulator, optional): Receives every STFT block, so the
+      spectrogram images can be rendered from the detection transform.
+    
+    Returns:
+    - list: A list of dictionaries containing information about detected saw calls:
+            [{'start': start_time_str, 'end': end_time_str, 'magnitude': mag, 'frequency': freq, 'impulse_count': count}]
+    """
+    params = get_detection_parameters(animal_type)
+    if block_frames is None:
+        block_frames = getattr(settings, 'SAW_CALL_DETECTION_BLOCK_FRAMES', 1024)
+    if front_end is None:
+        front_end = getattr(settings, 'SAW_CALL_DETECTION_FRONT_END', 'full_band')
+    if front_end not in ('full_band', 'band_limited'):
+        raise ValueError(f"Unknown saw call detection front end: {front_end}")
+    
+    if len(audio_data) == 0:
+        return []
+    
+    # Remove DC offset by subtracting the mean (accumulated in fixed-size float64 chunks)
+    total = 0.0
+    for start in range(0, len(audio_data), 1 << 20):
+        total += _mono_block(audio_data[start:start + (1 << 20)]).astype(np.float32).sum(dtype=np.float64)
+    dc_offset = total / len(audio_data)
+    
+    factor = band_limited_decimation(sample_rate, params) if front_end == 'band_limited' else 1
+    if factor > 1:
+        stages, delay = _anti_alias_filter(factor, sample_rate, params)
+        signal = _DecimatedSignal(audio_data, dc_offset, factor, stages, delay)
+    else:
+        signal = _CenteredSignal(audio_data, dc_offset)
+    n_samples = len(signal)
+    
+    # Frame layout of scipy.signal.stft with its default zero boundary padding
+    nperseg = min(int(params['segment_duration'] * sample_rate) // factor, n_samples)
+    noverlap = nperseg // 2
+    hop = nperseg - noverlap
+    half = nperseg // 2
+    padded_length = n_samples + 2 * half
+    padded_length += (-(padded_length - nperseg) % hop) % nperseg
+    n_frames = (padded_length - nperseg) // hop + 1
+    
+    merger = SawCallEventMerger(params['time_threshold'])
+    if spectrogram is not None:
+        spectrogram.begin(n_frames, sample_rate / factor, nperseg, hop)
+    
+    for first_frame in range(0, n_frames, block_frames):
+        last_frame = min(first_frame + block_frames, n_frames)
+        
+        # Samples covered by this block's frames, in the coordinates of the unpadded signal
+        block_start = first_frame * hop - half
+        block_stop = (last_frame - 1) * hop + nperseg - half
+        block = np.zeros(block_stop - block_start, dtype=np.float32)
+        read_start = max(block_start, 0)
+        read_stop = min(block_stop, n_samples)
+        if read_stop > read_start:
+            block[read_start - block_start:read_stop - block_start] = signal[read_start:read_stop]
+        
+        frequencies, _, Zxx = stft(block, fs=sample_rate / factor, nperseg=nperseg, noverlap=noverlap,
+                                   boundary=None, padded=False)
+        # Frame times on the native sample grid (identical for both front ends), computed the
+        # way scipy.signal.stft computes segment centres so they match its times exactly
+        times = (nperseg * factor / 2 + np.arange(first_frame, last_frame) * hop * factor) / sample_rate - (nperseg * factor / 2) / sample_rate
+        
+        # Collapse the block to per-frame impulses and merge them into events
+        hits, lead_magnitudes, lead_frequencies = collapse_detection_frames(Zxx, frequencies, params)
+        merger.add(times[hits], lead_magnitudes[hits], lead_frequencies[hits])
+        if spectrogram is not None:
+            spectrogram.add(first_frame, Zxx)
     
     # Filter out events with less than 3 impulses (likely false positives)
-    filtered_events = [event for event in event_data if event['impulse_count'] >= 3]
+    filtered_events = [event for event in merger.events if event['impulse_count'] >= 3]
     
     return filtered_events
 
 
+def detect_saw_calls_in_file(file_path, animal_type=None, block_frames=None, front_end=None):
+    """
+    Detects saw calls in a WAV file without loading the whole recording into memory.
+    
+    Parameters:
+    - file_path: Path to the WAV file
+    - animal_type (str, optional): The type of animal to use parameters for.
+    - block_frames (int, optional): STFT frames per block.
+    - front_end (str, optional): 'full_band' or 'band_limited'.
+    
+    Returns:
+    - list: Detected saw calls in the format returned by detect_saw_calls
+    """
+    sample_rate, samples = open_wav_samples(file_path)
+    return detect_saw_calls(samples, sample_rate, animal_type=animal_type, block_frames=block_frames,
+                            front_end=front_end)
+
+
 def generate_excel_report(original_audio, saw_calls):
     """
     Generate an Excel report for the detected saw calls.
@@ -921,7 +1577,7 @@ def generate_excel_report(original_audio, saw_calls):
         original_audio.analysis_excel.save(excel_filename, ContentFile(excel_file.read()), save=True)
         
         # Log successful Excel generation
-        ProcessingLog.objects.create(
+        log_processing(
             audio_file=original_audio,
             message=f"Generated Excel report: {excel_filename}",
             level="SUCCESS"
@@ -931,7 +1587,7 @@ def generate_excel_report(original_audio, saw_calls):
         
     except Exception as e:
         # Log error in Excel generation
-        ProcessingLog.objects.create(
+        log_processing(
             audio_file=original_audio,
             message=f"Error generating Excel report: {str(e)}",
             level="ERROR"
@@ -950,7 +1606,7 @@ def generate_excel_report(original_audio, saw_calls):
         
         if db_entry and db_entry.status == 'Processed':
             # Log that file is already processed
-            ProcessingLog.objects.create(
+            log_processing(
                 audio_file=original_audio,
                 message="File already processed. Skipping processing.",
                 level="INFO"
@@ -970,7 +1626,7 @@ def generate_excel_report(original_audio, saw_calls):
             )
         
         # Log processing start
-        ProcessingLog.objects.create(
+        log_processing(
             audio_file=original_audio,
             message="Starting audio processing",
             level="INFO"
@@ -980,7 +1636,7 @@ def generate_excel_report(original_audio, saw_calls):
         try:
             # First try using scipy.io.wavfile for better compatibility with various WAV formats
             try:
-                ProcessingLog.objects.create(
+                log_processing(
                     audio_file=original_audio,
                     message="Attempting to load audio with scipy.io.wavfile",
                     level="INFO"
@@ -996,14 +1652,14 @@ def generate_excel_report(original_audio, saw_calls):
                 if isinstance(audio_data, np.ndarray) and len(audio_data.shape) > 1:
                     audio_data = np.mean(audio_data, axis=1)
                 
-                ProcessingLog.objects.create(
+                log_processing(
                     audio_file=original_audio,
                     message=f"Loaded audio file with scipy.io.wavfile: {sample_rate}Hz, {len(audio_data)/sample_rate:.2f}s",
                     level="SUCCESS"
                 )
             except Exception as e:
                 # If scipy fails, try librosa
-                ProcessingLog.objects.create(
+                log_processing(
                     audio_file=original_audio,
                     message=f"scipy.io.wavfile failed: {str(e)}. Trying librosa...",
                     level="WARNING"
@@ -1011,7 +1667,7 @@ def generate_excel_report(original_audio, saw_calls):
                 
                 audio_data, sample_rate = librosa.load(file_path, sr=None, mono=True)
                 
-                ProcessingLog.objects.create(
+                log_processing(
                     audio_file=original_audio,
                     message=f"Loaded audio file with librosa: {sample_rate}Hz, {len(audio_data)/sample_rate:.2f}s",
                     level="SUCCESS"
@@ -1025,14 +1681,14 @@ def generate_excel_report(original_audio, saw_calls):
                 original_audio.sample_rate = sample_rate
                 original_audio.save()
                 
-                ProcessingLog.objects.create(
+                log_processing(
                     audio_file=original_audio,
                     message=f"Updated file metadata: Duration={original_audio.duration}, Sample Rate={sample_rate}Hz",
                     level="INFO"
                 )
             
             # Detect saw calls using STFT analysis
-            ProcessingLog.objects.create(
+            log_processing(
                 audio_file=original_audio,
                 message="Starting saw call detection with STFT analysis",
                 level="INFO"
@@ -1043,7 +1699,7 @@ def generate_excel_report(original_audio, saw_calls):
             # Filter out calls with less than 3 impulses (likely false positives)
             filtered_saw_calls = [call for call in saw_calls if call['impulse_count'] >= 3]
             
-            ProcessingLog.objects.create(
+            log_processing(
                 audio_file=original_audio,
                 message=f"Detected {len(filtered_saw_calls)} saw calls after filtering (minimum 3 impulses required)",
                 level="SUCCESS"
@@ -1051,7 +1707,7 @@ def generate_excel_report(original_audio, saw_calls):
             
         except Exception as e:
             # Log error in saw call detection
-            ProcessingLog.objects.create(
+            log_processing(
                 audio_file=original_audio,
                 message=f"Error detecting saw calls: {str(e)}",
                 level="ERROR"
@@ -1074,7 +1730,7 @@ def generate_excel_report(original_audio, saw_calls):
             file_date = recording_datetime.date()
         except Exception as e:
             # Log warning but continue processing
-            ProcessingLog.objects.create(
+            log_processing(
                 audio_file=original_audio,
                 message=f"Warning: Could not extract date from filename: {str(e)}",
                 level="WARNING"
@@ -1118,13 +1774,13 @@ def generate_excel_report(original_audio, saw_calls):
                 saw_count += 1
                 
                 # Log individual saw call detection with precise timestamps
-                ProcessingLog.objects.create(
+                log_processing(
                     audio_file=original_audio,
                     message=f"Detected saw call: Start={saw_call['start']}, End={saw_call['end']}, Duration={(end_seconds-start_seconds):.2f}s, Impulses={saw_call['impulse_count']}, Freq={saw_call['frequency']:.2f}Hz, Mag={saw_call['magnitude']:.2f}",
                     level="INFO"
                 )
             except Exception as e:
-                ProcessingLog.objects.create(
+                log_processing(
                     audio_file=original_audio,
                     message=f"Error storing saw call data: {str(e)}",
                     level="WARNING"
@@ -1132,14 +1788,14 @@ def generate_excel_report(original_audio, saw_calls):
         
         # If no saw calls were detected, log this explicitly
         if saw_count == 0:
-            ProcessingLog.objects.create(
+            log_processing(
                 audio_file=original_audio,
                 message="No saw calls detected in this audio file",
                 level="INFO"
             )
         else:
             # Log successful storage of saw calls
-            ProcessingLog.objects.create(
+            log_processing(
                 audio_file=original_audio,
                 message=f"Successfully stored {saw_count} saw call timeframes",
                 level="SUCCESS"
@@ -1151,14 +1807,14 @@ def generate_excel_report(original_audio, saw_calls):
             temp_files.append(excel_path)  # Track the Excel file for potential cleanup
             
             # Log Excel report generation
-            ProcessingLog.objects.create(
+            log_processing(
                 audio_file=original_audio,
                 message=f"Excel report generated successfully: {excel_path}",
                 level="INFO"
             )
         except Exception as e:
             # Log error but continue processing
-            ProcessingLog.objects.create(
+            log_processing(
                 audio_file=original_audio,
                 message=f"Error generating Excel report: {str(e)}",
                 level="ERROR"
@@ -1170,7 +1826,7 @@ def generate_excel_report(original_audio, saw_calls):
         db_entry.save()
         
         # Log successful processing completion
-        ProcessingLog.objects.create(
+        log_processing(
             audio_file=original_audio,
             message="Audio processing completed successfully",
             level="SUCCESS"
@@ -1180,7 +1836,7 @@ def generate_excel_report(original_audio, saw_calls):
         
     except Exception as e:
         # Log the error
-        ProcessingLog.objects.create(
+        log_processing(
             audio_file=original_audio,
             message=f"Error processing audio file: {str(e)}",
             level="ERROR"
@@ -1198,13 +1854,13 @@ def generate_excel_report(original_audio, saw_calls):
             try:
                 if os.path.exists(temp_file):
                     os.remove(temp_file)
-                    ProcessingLog.objects.create(
+                    log_processing(
                         audio_file=original_audio,
                         message=f"Cleaned up temporary file: {temp_file}",
                         level="INFO"
                     )
             except Exception as cleanup_error:
-                ProcessingLog.objects.create(
+                log_processing(
                     audio_file=original_audio,
                     message=f"Failed to clean up temporary file {temp_file}: {str(cleanup_error)}",
                     level="WARNING"
@@ -1233,12 +1889,13 @@ def get_processing_status():
     Get the current processing status counts
     """
     from .models import OriginalAudioFile, Database
-    from .tasks import get_processor_status
+    from .tasks import get_processor_status, get_processor_mode, get_worker_status
     
     # Get all audio files
     total_files = OriginalAudioFile.objects.count()
     
     # Get counts by status
+    ingesting_files = Database.objects.filter(status__in=['Uploaded', 'Ingesting']).count()
     pending_files = Database.objects.filter(status='Pending').count()
     processing_files = Database.objects.filter(status='Processing').count()
     processed_files = Database.objects.filter(status='Processed').count()
@@ -1249,23 +1906,27 @@ def get_processing_status():
     untracked_files = max(0, total_files - files_with_db_entries)
     
     # Verify the counts add up correctly
-    expected_total = pending_files + processing_files + processed_files + failed_files + untracked_files
+    expected_total = ingesting_files + pending_files + processing_files + processed_files + failed_files + untracked_files
     if expected_total != total_files:
         # If there's a mismatch, recount directly from the database to ensure accuracy
+        ingesting_files = Database.objects.filter(status__in=['Uploaded', 'Ingesting']).count()
         pending_files = Database.objects.filter(status='Pending').count()
         processing_files = Database.objects.filter(status='Processing').count()
         processed_files = Database.objects.filter(status='Processed').count()
         failed_files = Database.objects.filter(status='Failed').count()
-        untracked_files = max(0, total_files - (pending_files + processing_files + processed_files + failed_files))
+        untracked_files = max(0, total_files - (ingesting_files + pending_files + processing_files + processed_files + failed_files))
     
     return {
         'total': total_files,
+        'ingesting': ingesting_files,
         'pending': pending_files,
         'processing': processing_files,
         'processed': processed_files,
         'failed': failed_files,
         'untracked': untracked_files,
-        'processor_status': get_processor_status()
+        'processor_status': get_processor_status(),
+        'processor_mode': get_processor_mode(),
+        'workers': get_worker_status()
     }
 
 def search_zoo(zoo_name):
@@ -1299,7 +1960,13 @@ def search_animal(animal_type):
 
 def handle_duplicate_file(new_file, animal_type, zoo=None, uploaded_by=None):
     """
-    Handles duplicate file detection and replacement.
+    Handles duplicate file detection by content.
+    
+    Uploads are identified by the SHA-256 of their bytes (computed while they were uploaded,
+    see upload_handlers), not by name: a byte-identical re-upload, whatever its name, is not
+    stored or processed again and the existing file with its detections and artifacts is
+    returned instead. A different recording that happens to have the name of an earlier one
+    is stored as a new file next to it.
     
     Args:
         new_file: The uploaded file object
@@ -1308,14 +1975,13 @@ def handle_duplicate_file(new_file, animal_type, zoo=None, uploaded_by=None):
         uploaded_by: User profile who uploaded the file (optional)
         
     Returns:
-        tuple: (original_audio, is_duplicate, replaced_file_id)
-            - original_audio: The saved OriginalAudioFile instance
-            - is_duplicate: Boolean indicating if this was a duplicate
-            - replaced_file_id: ID of the file that was replaced (if any)
+        tuple: (original_audio, is_duplicate, existing_file_id)
+            - original_audio: The saved OriginalAudioFile instance (the existing one for a duplicate)
+            - is_duplicate: Boolean indicating if this was a byte-identical re-upload
+            - existing_file_id: ID of the existing file the upload matched (if any)
     """
-    from django.db import transaction
-    import os
     from .models import AnimalTable
+    from .upload_handlers import file_content_hash
     
     # Find the corresponding animal in AnimalTable
     animal = None
@@ -1327,116 +1993,102 @@ def handle_duplicate_file(new_file, animal_type, zoo=None, uploaded_by=None):
         # If there's an error finding the animal, log it but continue
         logging.error(f"Error finding animal for type {animal_type}: {str(e)}")
     
-    # Check if a file with the same name already exists
-    existing_file = OriginalAudioFile.objects.filter(audio_file_name=new_file.name).first()
+    content_hash = file_content_hash(new_file)
+    existing_file = find_identical_upload(content_hash, new_file.name)
     
     if existing_file:
-        # We found a duplicate
-        replaced_file_id = existing_file.file_id
-        
-        try:
-            with transaction.atomic():
-                # Log the duplicate detection with a more visible WARNING level
-                ProcessingLog.objects.create(
-                    audio_file=existing_file,
-                    timestamp=now(),
-                    level='WARNING',
-                    message=f'DUPLICATE FILE DETECTED: {new_file.name} - Replacing previous version with new upload.'
-                )
-                
-                # Get the old file path before deleting
-                old_file_path = existing_file.audio_file.path if existing_file.audio_file else None
-                
-                # Delete related database entries
-                # First, get the database entry to delete it properly
-                db_entries = Database.objects.filter(audio_file=existing_file)
-                for entry in db_entries:
-                    entry.delete()
-                
-                # Delete any spectrograms associated with this file
-                Spectrogram.objects.filter(audio_file=existing_file).delete()
-                
-                # Delete any detected noise files associated with this file
-                DetectedNoiseAudioFile.objects.filter(original_file=existing_file).delete()
-                
-                # Delete the physical file if it exists
-                if old_file_path and os.path.exists(old_file_path):
-                    try:
-                        os.remove(old_file_path)
-                    except (PermissionError, OSError) as e:
-                        # Log error but continue with replacement
-                        ProcessingLog.objects.create(
-                            audio_file=existing_file,
-                            timestamp=now(),
-                            level='ERROR',
-                            message=f'Error deleting old file: {str(e)}'
-                        )
-                
-                # Update the existing record with new file
-                existing_file.audio_file = new_file
-                existing_file.animal_type = animal_type
-                # Associate with the animal from AnimalTable if found
-                if animal:
-                    existing_file.animal = animal
-                if zoo:
-                    existing_file.zoo = zoo
-                if uploaded_by:
-                    existing_file.uploaded_by = uploaded_by
-                existing_file.upload_date = now()
-                existing_file.recording_date = None  # Will be extracted from filename later
-                existing_file.file_size_mb = None  # Will be calculated on save
-                existing_file.save()
-                
-                # Create a new database entry with Pending status
-                db_entry = Database(
-                    audio_file=existing_file,
-                    status='Pending'
-                )
-                db_entry.save()
-                
-                # Create a log entry for the replacement with a more visible SUCCESS level
-                ProcessingLog.objects.create(
-                    audio_file=existing_file,
-                    timestamp=now(),
-                    level='SUCCESS',
-                    message=f'DUPLICATE REPLACED: {new_file.name} - File successfully replaced with new upload.'
-                )
-                
-                return existing_file, True, replaced_file_id
-                
-        except Exception as e:
-            # Log the error
-            if existing_file:
-                ProcessingLog.objects.create(
-                    audio_file=existing_file,
-                    timestamp=now(),
-                    level='ERROR',
-                    message=f'Error replacing duplicate file: {str(e)}'
-                )
-            # If replacement fails, we'll create a new file instead
-            pass
+        log_processing(
+            audio_file=existing_file,
+            timestamp=now(),
+            level='WARNING',
+            message=f'DUPLICATE FILE DETECTED: {new_file.name} is identical to this file - Reusing its results instead of processing it again.'
+        )
+        return existing_file, True, existing_file.file_id
     
-    # No duplicate found or replacement failed, create a new file
+    # No identical file found, create a new file
     original_audio = OriginalAudioFile(
-        audio_file=new_file,
         audio_file_name=new_file.name,
+        content_hash=content_hash,
         animal_type=animal_type,
         zoo=zoo,
         upload_date=now(),
         uploaded_by=uploaded_by,
         animal=animal  # Associate with the animal from AnimalTable if found
     )
+    
+    # With the recording date known up front the file is saved straight to its date-based
+    # path (a rename of the upload's temporary file, see upload_handlers), not moved later
+    try:
+        _, original_audio.recording_date = parse_audio_filename(new_file.name)
+    except Exception as e:
+        logging.warning(f"Could not read the recording date of {new_file.name}: {str(e)}")
+    
+    # Format details read from the header while the upload was received
+    header = getattr(new_file, 'wav_header', None)
+    if header:
+        original_audio.sample_rate = header['sample_rate']
+        original_audio.channels = header['channels']
+        original_audio.bit_depth = header['bit_depth']
+        original_audio.frame_count = header['frames']
+        original_audio.audio_format = header['audio_format']
+        original_audio.duration_seconds = header['duration_seconds']
+    
+    original_audio.audio_file.save(new_file.name, new_file, save=False)
     original_audio.save()
     
+    if OriginalAudioFile.objects.filter(audio_file_name=new_file.name).exclude(pk=original_audio.pk).exists():
+        log_processing(
+            audio_file=original_audio,
+            timestamp=now(),
+            level='WARNING',
+            message=f'A different recording named {new_file.name} was uploaded before - Both are kept.'
+        )
+    
     return original_audio, False, None
 
 
+def find_identical_upload(content_hash, file_name=None):
+    """
+    Find an uploaded file with the given content hash whose audio is still stored.
+    
+    Files uploaded before content hashes were recorded have none; those with the same name
+    are hashed on the way (once, the hash is saved) so re-uploads of them are recognized too.
+    
+    Parameters:
+    - content_hash: SHA-256 hex digest of the upload
+    - file_name: Name of the upload (optional)
+    
+    Returns:
+    - OriginalAudioFile or None
+    """
+    from .upload_handlers import file_content_hash
+    
+    candidates = list(OriginalAudioFile.objects.filter(content_hash=content_hash).order_by('file_id'))
+    if file_name:
+        for legacy_file in OriginalAudioFile.objects.filter(audio_file_name=file_name, content_hash__isnull=True):
+            try:
+                with legacy_file.audio_file.open('rb') as stored_file:
+                    legacy_file.content_hash = file_content_hash(stored_file)
+            except (OSError, ValueError):
+                continue
+            legacy_file.save(update_fields=['content_hash'])
+            if legacy_file.content_hash == content_hash:
+                candidates.append(legacy_file)
+    
+    for candidate in candidates:
+        if candidate.audio_file and candidate.audio_file.storage.exists(candidate.audio_file.name):
+            return candidate
+    return None
+
+
+@buffered_processing_logs()
 def process_audio(file_path, original_audio):
     """
     Process the uploaded audio file and store saw call timeframes.
     Uses improved STFT-based detection to accurately identify and log saw calls.
     """
     temp_files = []  # Track temporary files for cleanup
+    audio = None
     
     try:
         # Update the database status to Processing
@@ -1448,14 +2100,18 @@ def process_audio(file_path, original_audio):
         
         # Load the audio file
         try:
-            sample_rate, audio_data = wav.read(file_path)
-            
-            # Convert to mono if stereo
-            if len(audio_data.shape) > 1:
-                audio_data = np.mean(audio_data, axis=1).astype(audio_data.dtype)
+            # Every stage below reads from this one mapping of the file
+            audio = AudioSource(file_path)
+            sample_rate = audio.sample_rate
+            if getattr(settings, 'SAW_CALL_DETECTION_MODE', 'streaming') == 'streaming':
+                # Detection and segment extraction read blocks on demand
+                audio_data = audio.samples
+            else:
+                # Read the whole recording into memory as mono
+                audio_data = np.array(audio.mono())
             
             # Log successful audio loading
-            ProcessingLog.objects.create(
+            log_processing(
                 audio_file=original_audio,
                 timestamp=now(),
                 level='INFO',
@@ -1463,7 +2119,7 @@ def process_audio(file_path, original_audio):
             )
         except Exception as e:
             # Log error and raise to be caught by outer try/except
-            ProcessingLog.objects.create(
+            log_processing(
                 audio_file=original_audio,
                 timestamp=now(),
                 level='ERROR',
@@ -1471,162 +2127,181 @@ def process_audio(file_path, original_audio):
             )
             raise
         
-        # Detect saw calls
-        saw_calls = detect_saw_calls(audio_data, sample_rate, animal_type=original_audio.animal_type)
+        # Spectrogram images are rendered here only in eager mode; otherwise the pages render
+        # them on first request (see spectrogram_cache)
+        eager_spectrograms = getattr(settings, 'SPECTROGRAM_GENERATION', 'lazy') == 'eager'
+        
+        # Detect saw calls, keeping the full-band STFT for the full audio spectrograms
+        # (the band-limited front end only transforms the detection band)
+        features = None
+        if eager_spectrograms and getattr(settings, 'SAW_CALL_DETECTION_FRONT_END', 'full_band') == 'full_band':
+            features = SpectrogramAccumulator()
+        saw_calls = detect_saw_calls(audio_data, sample_rate, animal_type=original_audio.animal_type,
+                                     spectrogram=features)
+        if features is not None and features.power is None:
+            # Nothing was transformed (empty recording), render from the samples instead
+            features = None
         
         # Log detection results
-        ProcessingLog.objects.create(
+        log_processing(
             audio_file=original_audio,
             timestamp=now(),
             level='INFO',
             message=f'Detected {len(saw_calls)} saw calls in the audio'
         )
         
-        # Save each detected saw call as a separate audio file
+        # Save each detected saw call, as a separate audio file unless clips are virtual (cut from
+        # the recording when played, see audio_streaming)
+        # Detections are collected here and inserted together, and problems are summarised in a
+        # single log entry, so the number of queries does not grow with the number of calls
+        virtual_clips = getattr(settings, 'DETECTED_CLIP_STORAGE', 'virtual') == 'virtual'
+        noise_files = []
+        segment_ranges = []
+        segment_errors = []
         for i, call in enumerate(saw_calls):
             try:
                 # Calculate start and end samples
-                start_seconds = call['start_seconds']
-                end_seconds = call['end_seconds']
-                start_sample = int(start_seconds * sample_rate)
-                end_sample = int(end_seconds * sample_rate)
-                
-                # Extract the audio segment
-                segment = audio_data[start_sample:end_sample]
+                start_sample, end_sample = audio.seconds_to_samples(call['start_seconds'], call['end_seconds'])
                 
-                # Create a temporary file for the segment
-                temp_dir = os.path.join(settings.MEDIA_ROOT, 'temp')
-                ensure_directory_exists(temp_dir)
-                temp_file = os.path.join(temp_dir, f'temp_segment_{i}.wav')
-                temp_files.append(temp_file)  # Track for cleanup
+                # Convert start and end timestamps (HH:MM:SS.SS) to time objects if they're not already
+                start_time = call['start']
+                end_time = call['end']
+                if isinstance(start_time, str):
+                    start_time = parse_timestamp(start_time)
+                if isinstance(end_time, str):
+                    end_time = parse_timestamp(end_time)
                 
-                # Save the segment to a temporary WAV file
-                wav.write(temp_file, sample_rate, segment)
-                
-                # Create a filename for the segment
-                segment_filename = f'{os.path.splitext(original_audio.audio_file_name)[0]}_segment_{i+1}.wav'
-                
-                # Create a DetectedNoiseAudioFile instance
-                with open(temp_file, 'rb') as f:
-                    # Convert start and end time strings to time objects if they're not already
-                    if isinstance(call['start'], str):
-                        start_time = datetime.strptime(call['start'], '%H:%M:%S').time()
-                    else:
-                        start_time = call['start']
-                        
-                    if isinstance(call['end'], str):
-                        end_time = datetime.strptime(call['end'], '%H:%M:%S').time()
-                    else:
-                        end_time = call['end']
+                if virtual_clips:
+                    # Only the sample range is stored
+                    relative_path = ""
+                    file_size_mb = 0.0
+                else:
+                    # Extract the audio segment (a view into the mapped file for mono recordings)
+                    segment = audio.mono(start_sample, end_sample)
                     
-                    # Calculate file size in MB
-                    file_size_mb = os.path.getsize(temp_file) / (1024 * 1024)
+                    # Create a filename for the segment (recordings can share a name, so it
+                    # starts with the file's id)
+                    segment_filename = f'{original_audio.pk}_{os.path.splitext(original_audio.audio_file_name)[0]}_segment_{i+1}.wav'
                     
-                    # Save the segment to a permanent location
+                    # Save the segment straight to its permanent location
                     segment_dir = os.path.join(settings.MEDIA_ROOT, 'detected_noises')
                     ensure_directory_exists(segment_dir)
                     permanent_segment_path = os.path.join(segment_dir, segment_filename)
+                    write_wav_file(permanent_segment_path, sample_rate, segment)
                     
-                    # Copy the file to the permanent location
-                    shutil.copy2(temp_file, permanent_segment_path)
+                    # Calculate file size in MB
+                    file_size_mb = os.path.getsize(permanent_segment_path) / (1024 * 1024)
                     
                     # Create relative path for database storage
                     relative_path = os.path.join('detected_noises', segment_filename).replace('\\', '/')
-                    
-                    # Create the DetectedNoiseAudioFile instance
-                    noise_file = DetectedNoiseAudioFile(
-                        original_file=original_audio,
-                        detected_noise_file_path=relative_path,
-                        start_time=start_time,
-                        end_time=end_time,
-                        # Use saw_count and saw_call_count for the impulse count
-                        saw_count=call['impulse_count'],
-                        saw_call_count=1,  # Each detection is one call
-                        frequency=call['frequency'],
-                        magnitude=call['magnitude'],
-                        file_size_mb=file_size_mb
-                    )
-                    noise_file.save()
                 
-                # Generate spectrogram for the segment using our new function
-                try:
-                    # First save the segment to a temporary file that can be read by our spectrogram function
-                    segment_file = os.path.join(temp_dir, f'segment_for_spec_{i}.wav')
-                    temp_files.append(segment_file)  # Track for cleanup
-                    wav.write(segment_file, sample_rate, segment)
-                    
-                    # Generate mel spectrogram for the segment
-                    segment_spectrogram = generate_spectrogram(
-                        segment_file, 
-                        original_audio, 
-                        spectrogram_type='mel'
-                    )
-                    
-                    # Associate the spectrogram with the noise file
-                    if segment_spectrogram:
-                        segment_spectrogram.noise_file = noise_file
-                        segment_spectrogram.is_full_audio = False
-                        segment_spectrogram.save()
-                        
-                        # Log successful spectrogram generation
-                        ProcessingLog.objects.create(
-                            audio_file=original_audio,
-                            timestamp=now(),
-                            level='INFO',
-                            message=f'Spectrogram generated for segment {i+1} ({call["start"]} - {call["end"]})'
-                        )
-                    
-                except Exception as e:
-                    # Log error but continue processing
-                    ProcessingLog.objects.create(
+                # Create the DetectedNoiseAudioFile instance (inserted below with the others)
+                noise_files.append(DetectedNoiseAudioFile(
+                    original_file=original_audio,
+                    detected_noise_file_path=relative_path,
+                    start_time=start_time,
+                    end_time=end_time,
+                    start_sample=start_sample,
+                    end_sample=end_sample,
+                    # Use saw_count and saw_call_count for the impulse count
+                    saw_count=call['impulse_count'],
+                    saw_call_count=1,  # Each detection is one call
+                    frequency=call['frequency'],
+                    magnitude=call['magnitude'],
+                    file_size_mb=file_size_mb,
+                    # bulk_create skips DetectedNoiseAudioFile.save(), which normally sets this
+                    noise_verified=True
+                ))
+                segment_ranges.append((i, start_sample, end_sample))
+            
+            except Exception as e:
+                # Note the error but continue with other segments
+                segment_errors.append(f'segment {i+1}: {str(e)}')
+        
+        # Insert all detections in one transaction
+        with transaction.atomic():
+            DetectedNoiseAudioFile.objects.bulk_create(noise_files)
+        
+        # Hand the segment spectrograms to the clip rendering stage (a background process pool
+        # by default, so the file is marked Processed without waiting for the images)
+        if eager_spectrograms:
+            renderer = getattr(settings, 'SPECTROGRAM_RENDERER', 'fast')
+            image_format = 'png' if renderer == 'publication' else getattr(settings, 'SPECTROGRAM_IMAGE_FORMAT', 'png')
+            clips = [
+                {
+                    'name': f'segment {i+1}',
+                    'start_sample': start_sample,
+                    'end_sample': end_sample,
+                    'start_seconds': start_sample / sample_rate,
+                    'end_seconds': end_sample / sample_rate,
+                    'image_path': spectrogram_image_path(original_audio, 'mel', image_format, f'segment_{i+1}'),
+                }
+                for i, start_sample, end_sample in segment_ranges
+            ]
+            try:
+                render_clip_spectrograms(file_path, original_audio, clips)
+            except Exception as e:
+                segment_errors.append(f'segment spectrograms: {str(e)}')
+        
+        # Log one summary of the saved detections
+        log_processing(
+            audio_file=original_audio,
+            timestamp=now(),
+            level='INFO',
+            message=f'Saved {len(noise_files)} of {len(saw_calls)} detected saw calls'
+        )
+        if segment_errors:
+            shown = '; '.join(segment_errors[:10])
+            more = f' (and {len(segment_errors) - 10} more)' if len(segment_errors) > 10 else ''
+            log_processing(
+                audio_file=original_audio,
+                timestamp=now(),
+                level='WARNING',
+                message=f'{len(segment_errors)} errors while saving detected saw calls: {shown}{more}'
+            )
+        
+        # Min/max peaks of the whole recording for the waveform viewer
+        if getattr(settings, 'WAVEFORM_PEAKS', True):
+            generate_waveform_peaks(file_path, original_audio, audio=audio)
+        
+        # Generate spectrograms for the full audio using our new function
+        # (in lazy mode the images and the tile pyramid are built when first viewed)
+        if eager_spectrograms:
+            try:
+                # Generate mel spectrogram (good for general audio analysis)
+                mel_spectrogram = generate_spectrogram(file_path, original_audio, spectrogram_type='mel', audio=audio,
+                                                       features=features,
+                                                       tiles=getattr(settings, 'SPECTROGRAM_TILE_PYRAMID', True))
+                
+                # Generate linear spectrogram (standard STFT)
+                linear_spectrogram = generate_spectrogram(file_path, original_audio, spectrogram_type='linear', audio=audio,
+                                                          features=features)
+                
+                # For very long audio, log that we're using the optimized spectrogram function
+                if len(audio_data) > 10000000:  # 10 million samples
+                    log_processing(
                         audio_file=original_audio,
                         timestamp=now(),
-                        level='WARNING',
-                        message=f'Error generating spectrogram for segment {i+1}: {str(e)}'
+                        level='INFO',
+                        message='Using optimized spectrogram generation for large audio file'
                     )
-            
-            except Exception as e:
-                # Log error but continue with other segments
-                ProcessingLog.objects.create(
+                
+                # Log successful spectrogram generation
+                log_processing(
                     audio_file=original_audio,
                     timestamp=now(),
-                    level='WARNING',
-                    message=f'Error processing segment {i+1}: {str(e)}'
+                    level='INFO',
+                    message=f'Multiple spectrograms generated successfully for full audio'
                 )
-        
-        # Generate spectrograms for the full audio using our new function
-        try:
-            # Generate mel spectrogram (good for general audio analysis)
-            mel_spectrogram = generate_spectrogram(file_path, original_audio, spectrogram_type='mel')
-            
-            # Generate linear spectrogram (standard STFT)
-            linear_spectrogram = generate_spectrogram(file_path, original_audio, spectrogram_type='linear')
-            
-            # For very long audio, log that we're using the optimized spectrogram function
-            if len(audio_data) > 10000000:  # 10 million samples
-                ProcessingLog.objects.create(
+                
+            except Exception as e:
+                # Log error but continue processing
+                log_processing(
                     audio_file=original_audio,
                     timestamp=now(),
-                    level='INFO',
-                    message='Using optimized spectrogram generation for large audio file'
+                    level='WARNING',
+                    message=f'Error generating full audio spectrogram: {str(e)}'
                 )
-            
-            # Log successful spectrogram generation
-            ProcessingLog.objects.create(
-                audio_file=original_audio,
-                timestamp=now(),
-                level='INFO',
-                message=f'Multiple spectrograms generated successfully for full audio'
-            )
-            
-        except Exception as e:
-            # Log error but continue processing
-            ProcessingLog.objects.create(
-                audio_file=original_audio,
-                timestamp=now(),
-                level='WARNING',
-                message=f'Error generating full audio spectrogram: {str(e)}'
-            )
         
         # Generate Excel report
         try:
@@ -1634,7 +2309,7 @@ def process_audio(file_path, original_audio):
             temp_files.append(excel_path)  # Track the Excel file for potential cleanup
             
             # Log Excel report generation
-            ProcessingLog.objects.create(
+            log_processing(
                 audio_file=original_audio,
                 timestamp=now(),
                 level='INFO',
@@ -1642,7 +2317,7 @@ def process_audio(file_path, original_audio):
             )
         except Exception as e:
             # Log error but continue processing
-            ProcessingLog.objects.create(
+            log_processing(
                 audio_file=original_audio,
                 timestamp=now(),
                 level='ERROR',
@@ -1656,7 +2331,7 @@ def process_audio(file_path, original_audio):
             db_entry.save()
         
         # Log successful processing
-        ProcessingLog.objects.create(
+        log_processing(
             audio_file=original_audio,
             timestamp=now(),
             level='SUCCESS',
@@ -1667,7 +2342,7 @@ def process_audio(file_path, original_audio):
     
     except Exception as e:
         # Log the error
-        ProcessingLog.objects.create(
+        log_processing(
             audio_file=original_audio,
             timestamp=now(),
             level='ERROR',
@@ -1685,14 +2360,14 @@ def process_audio(file_path, original_audio):
             try:
                 if os.path.exists(temp_file):
                     os.remove(temp_file)
-                    ProcessingLog.objects.create(
+                    log_processing(
                         audio_file=original_audio,
                         timestamp=now(),
                         level='INFO',
                         message=f'Cleaned up temporary file: {temp_file}'
                     )
             except Exception as cleanup_error:
-                ProcessingLog.objects.create(
+                log_processing(
                     audio_file=original_audio,
                     timestamp=now(),
                     level='WARNING',
@@ -1700,6 +2375,12 @@ def process_audio(file_path, original_audio):
                 )
         
         return False
+    
+    finally:
+        # Drop the views into the mapping so closing the source unmaps the file
+        audio_data = segment = None
+        if audio is not None:
+            audio.close()
 
 def advanced_search_audio(search_params):
     """
@@ -0,0 +1,215 @@
+"""
+Streaming of recordings and clips over HTTP, with Range request support.
+
+Browsers fetch audio with Range requests to seek and to read only what they play, so the
+stream endpoint answers them with 206 Partial Content instead of sending whole files.
+Clips are not cut to files: a window of a WAV recording is served as a synthesized header
+followed by its frames, read straight from the original (see audio_access.wav_window_parts).
+
+Detected saw calls stored as virtual clips (DETECTED_CLIP_STORAGE = 'virtual') only keep
+their sample range and are cut this way whenever they are played. The clips served most
+recently are kept in a small in-memory LRU cache (DETECTED_CLIP_CACHE_MB per process, 0 to
+turn it off), since a clip is usually played several times in a row while it is reviewed.
+"""
+import mimetypes
+import os
+import re
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+
+# Bytes read from disk per chunk of a response
+STREAM_BLOCK_SIZE = 64 * 1024
+
+_RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+_clip_cache = OrderedDict()
+_clip_cache_bytes = 0
+_clip_cache_lock = threading.Lock()
+
+
+class RangeNotSatisfiable(ValueError):
+    """The requested byte range lies outside the content"""
+
+
+def parse_range_header(value, size):
+    """
+    Parse a Range header against content of the given size
+    
+    Parameters:
+    - value: The header value (e.g. 'bytes=0-1023', 'bytes=1024-' or 'bytes=-512'), or None
+    - size: Size of the content in bytes
+    
+    Returns:
+    - tuple: (first, last) inclusive byte positions, or None to send the whole content
+      (no header, or a form this endpoint does not serve, such as several ranges)
+    
+    Raises:
+    - RangeNotSatisfiable: If the range starts past the end of the content
+    """
+    match = _RANGE_PATTERN.match((value or '').strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if not length:
+            raise RangeNotSatisfiable(value)
+        return max(0, size - length), size - 1
+    first = int(first)
+    last = size - 1 if not last else min(int(last), size - 1)
+    if first >= size or last < first:
+        raise RangeNotSatisfiable(value)
+    return first, last
+
+
+def iter_window_bytes(file_path, parts, first, last, block_size=STREAM_BLOCK_SIZE):
+    """
+    Yield bytes first..last (inclusive) of the concatenation of parts, where each part is
+    bytes or an (offset, length) byte range of file_path read in blocks of block_size
+    """
+    position = 0
+    with open(file_path, 'rb') as audio:
+        for part in parts:
+            length = len(part) if isinstance(part, bytes) else part[1]
+            start, end = max(first, position), min(last + 1, position + length)
+            if start < end:
+                if isinstance(part, bytes):
+                    yield part[start - position:end - position]
+                else:
+                    audio.seek(part[0] + start - position)
+                    remaining = end - start
+                    while remaining > 0:
+                        block = audio.read(min(block_size, remaining))
+                        if not block:
+                            return
+                        remaining -= len(block)
+                        yield block
+            position += length
+            if position > last:
+                return
+
+
+def audio_stream_response(request, file_path, start_seconds=None, end_seconds=None):
+    """
+    Response streaming a recording, or the window start_seconds..end_seconds of it as a
+    WAV file of its own, honouring the request's Range header.
+    
+    Parameters:
+    - request: The HttpRequest
+    - file_path: Path to the recording
+    - start_seconds, end_seconds: Window to serve; the whole file when both are None
+    
+    Returns:
+    - HttpResponse: 200 with the whole content, 206 with the requested range or 416
+    
+    Raises:
+    - FileNotFoundError: If the recording is missing
+    - ValueError: If a window is requested from a file that is not a WAV file
+    """
+    from .audio_access import probe_wav_header, wav_window_parts
+    
+    if start_seconds is None and end_seconds is None:
+        size = os.path.getsize(file_path)
+        return _ranged_response(request, file_path, [(0, size)], size,
+                                mimetypes.guess_type(file_path)[0] or 'application/octet-stream')
+    
+    sample_rate = probe_wav_header(file_path)['sample_rate']
+    start_frame = int((start_seconds or 0.0) * sample_rate)
+    end_frame = None if end_seconds is None else int(end_seconds * sample_rate)
+    parts, size = wav_window_parts(file_path, start_frame, end_frame)
+    return _ranged_response(request, file_path, parts, size, 'audio/wav')
+
+
+def clip_stream_response(request, detected_noise):
+    """
+    Response streaming a detected saw call: its segment file when it has one, otherwise the
+    clip cut from the original recording by its sample range (through the clip cache).
+    
+    Parameters:
+    - request: The HttpRequest
+    - detected_noise: DetectedNoiseAudioFile model instance
+    
+    Returns:
+    - HttpResponse: As audio_stream_response
+    
+    Raises:
+    - FileNotFoundError: If neither the segment file nor the recording exists
+    - ValueError: If the recording is not a WAV file
+    """
+    from .audio_access import probe_wav_header, wav_window_parts
+    from .audio_processing import time_to_seconds
+    
+    if detected_noise.detected_noise_file_path:
+        segment_path = os.path.join(settings.MEDIA_ROOT, detected_noise.detected_noise_file_path)
+        if os.path.exists(segment_path):
+            return audio_stream_response(request, segment_path)
+    
+    file_path = os.path.join(settings.MEDIA_ROOT, detected_noise.original_file.audio_file.name)
+    start_frame, end_frame = detected_noise.start_sample, detected_noise.end_sample
+    if start_frame is None or end_frame is None:
+        # Detections saved before sample ranges were recorded
+        sample_rate = probe_wav_header(file_path)['sample_rate']
+        start_frame = int(time_to_seconds(detected_noise.start_time) * sample_rate)
+        end_frame = int(time_to_seconds(detected_noise.end_time) * sample_rate)
+    
+    stat = os.stat(file_path)
+    key = (file_path, stat.st_size, stat.st_mtime_ns, start_frame, end_frame)
+    data = _cached_clip(key)
+    if data is None:
+        parts, size = wav_window_parts(file_path, start_frame, end_frame)
+        if size > _clip_cache_budget():
+            # Too long to keep; stream it from the recording
+            return _ranged_response(request, file_path, parts, size, 'audio/wav')
+        data = b''.join(iter_window_bytes(file_path, parts, 0, size - 1))
+        _cache_clip(key, data)
+    return _ranged_response(request, file_path, [data], len(data), 'audio/wav')
+
+
+def _clip_cache_budget():
+    """Size budget of the clip cache in bytes"""
+    return getattr(settings, 'DETECTED_CLIP_CACHE_MB', 32) * 1024 * 1024
+
+
+def _cached_clip(key):
+    """Bytes of a recently served clip, or None"""
+    with _clip_cache_lock:
+        data = _clip_cache.get(key)
+        if data is not None:
+            _clip_cache.move_to_end(key)
+        return data
+
+
+def _cache_clip(key, data):
+    """Keep a served clip, dropping the least recently served ones past the cache budget"""
+    global _clip_cache_bytes
+    max_bytes = _clip_cache_budget()
+    with _clip_cache_lock:
+        if key in _clip_cache:
+            return
+        _clip_cache[key] = data
+        _clip_cache_bytes += len(data)
+        while _clip_cache_bytes > max_bytes:
+            _, dropped = _clip_cache.popitem(last=False)
+            _clip_cache_bytes -= len(dropped)
+
+
+def _ranged_response(request, file_path, parts, size, content_type):
+    """Streaming response of the parts (see iter_window_bytes), or of the requested range of them"""
+    try:
+        byte_range = parse_range_header(request.headers.get('Range'), size)
+    except RangeNotSatisfiable:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    
+    first, last = byte_range or (0, size - 1)
+    response = StreamingHttpResponse(iter_window_bytes(file_path, parts, first, last),
+                                     status=206 if byte_range else 200, content_type=content_type)
+    response['Content-Length'] = str(max(0, last - first + 1))
+    response['Accept-Ranges'] = 'bytes'
+    if byte_range:
+        response['Content-Range'] = f'bytes {first}-{last}/{size}'
+    return response
@@ -0,0 +1,277 @@
+"""
+Resumable uploads of long recordings, received in chunks over several requests.
+
+A client starts an upload (create_upload), sends the file in order as chunks that each
+carry their SHA-256 (write_chunk), and finalizes it once every byte has arrived
+(finalize_upload). Each chunk is verified before it counts, and only verified bytes are
+kept in the upload's part file, so after a dropped connection the client asks how many
+bytes were received (ChunkedUpload.received_bytes) and resumes from there instead of
+sending the whole recording again.
+
+Part files are kept in upload_temp_directory()/chunked/, on the same file system as
+MEDIA_ROOT, so the finished file is renamed to its date-organized path by
+handle_duplicate_file rather than copied. Uploads left unfinished for
+CHUNKED_UPLOAD_EXPIRY_HOURS are removed with their part files.
+"""
+import hashlib
+import logging
+import os
+import struct
+from datetime import timedelta
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
+from django.utils.timezone import now
+from .models import ChunkedUpload
+from .upload_handlers import HASH_CHUNK_SIZE, upload_temp_directory
+
+logger = logging.getLogger(__name__)
+
+# Bytes read from a request at a time while a chunk is written
+CHUNK_BLOCK_SIZE = 1024 * 1024
+
+
+class ChunkOffsetMismatch(ValueError):
+    """The chunk does not start where the verified part of the upload ends"""
+
+
+class ChunkChecksumMismatch(ValueError):
+    """The received bytes do not match the checksum sent with them"""
+
+
+class UploadBeingFinalized(ValueError):
+    """Another request is finalizing the upload, or already has"""
+
+
+class AssembledUpload(UploadedFile):
+    """
+    A finished part file passed to handle_duplicate_file like an upload; storage moves it
+    into place through temporary_file_path()
+    """
+    
+    def __init__(self, path, name, size):
+        super().__init__(open(path, 'rb'), name, 'audio/wav', size)
+        self.path = path
+    
+    def temporary_file_path(self):
+        return self.path
+
+
+def max_chunk_size():
+    """Largest chunk accepted in one request, in bytes"""
+    return int(getattr(settings, 'CHUNKED_UPLOAD_MAX_CHUNK_MB', 64) * 1024 * 1024)
+
+
+def upload_part_path(upload):
+    """Path of the file holding the bytes received so far"""
+    return os.path.join(upload_temp_directory(), 'chunked', f"{upload.upload_id}.part")
+
+
+def create_upload(file_name, total_size, animal_type, zoo, user, sha256=None, batch=None):
+    """
+    Start a resumable upload
+    
+    Parameters:
+    - file_name: Name of the recording (the recording date is read from it as for other uploads)
+    - total_size: Size of the whole file in bytes
+    - animal_type, zoo: As for upload_audio
+    - user: CustomUser sending the file; only they can add to or finalize the upload
+    - sha256: Hex digest of the whole file, checked when the upload is finalized (optional)
+    - batch: UploadBatch the file is queued in once finalized (optional)
+    
+    Returns:
+    - ChunkedUpload: The new upload, with an empty part file
+    """
+    expire_stale_uploads()
+    
+    upload = ChunkedUpload.objects.create(
+        file_name=os.path.basename(file_name),
+        total_size=total_size,
+        sha256=sha256.lower() if sha256 else None,
+        animal_type=animal_type,
+        zoo=zoo,
+        created_by=user,
+        batch=batch,
+    )
+    part_path = upload_part_path(upload)
+    os.makedirs(os.path.dirname(part_path), exist_ok=True)
+    open(part_path, 'wb').close()
+    return upload
+
+
+def write_chunk(upload, offset, stream, length, checksum):
+    """
+    Append a chunk to an upload once its checksum is verified
+    
+    The chunk must start at upload.received_bytes. Bytes past that (from a chunk whose
+    request was cut off) are discarded first, and a chunk that arrives short or does not
+    match its checksum is discarded too, leaving the upload where it was.
+    
+    Parameters:
+    - upload: ChunkedUpload model instance
+    - offset: Position of the chunk in the file
+    - stream: File-like object the chunk is read from (the request)
+    - length: Size of the chunk in bytes
+    - checksum: SHA-256 hex digest of the chunk
+    
+    Returns:
+    - int: Bytes received so far
+    
+    Raises:
+    - ChunkOffsetMismatch: If the chunk does not start at upload.received_bytes
+    - ChunkChecksumMismatch: If the chunk does not match its checksum
+    - ValueError: If the upload is not in progress, or the chunk is empty, short or past the end of the file
+    """
+    with transaction.atomic():
+        # One chunk of an upload is written at a time
+        upload = ChunkedUpload.objects.select_for_update().get(pk=upload.pk)
+        if upload.status != 'uploading':
+            raise ValueError(f"Upload is {upload.get_status_display().lower()}")
+        if offset != upload.received_bytes:
+            raise ChunkOffsetMismatch(f"Expected a chunk at offset {upload.received_bytes}, not {offset}")
+        if length <= 0 or offset + length > upload.total_size:
+            raise ValueError("Chunk is empty or extends past the end of the file")
+        
+        digest = hashlib.sha256()
+        written = 0
+        with open(upload_part_path(upload), 'r+b') as part_file:
+            part_file.truncate(offset)
+            part_file.seek(offset)
+            while written < length:
+                block = stream.read(min(CHUNK_BLOCK_SIZE, length - written))
+                if not block:
+                    break
+                digest.update(block)
+                part_file.write(block)
+                written += len(block)
+            
+            if written < length or digest.hexdigest() != checksum.lower():
+                part_file.truncate(offset)
+                if written < length:
+                    raise ValueError(f"Chunk ended after {written} of {length} bytes")
+                raise ChunkChecksumMismatch("Chunk does not match its checksum")
+            
+            # Only count bytes that are on disk
+            part_file.flush()
+            os.fsync(part_file.fileno())
+        
+        upload.received_bytes = offset + length
+        upload.save(update_fields=['received_bytes', 'updated_at'])
+    return upload.received_bytes
+
+
+def finalize_upload(upload):
+    """
+    Hand a fully received upload to handle_duplicate_file and queue it for the background
+    workers (queue_uploaded_file), as upload_audio does for a file posted in one request
+    
+    The upload is moved to 'finalizing' under a row lock first, so a retry sent while it is
+    stored cannot store it a second time. If storing fails while the part file is still
+    there, the upload goes back to 'uploading' and finalizing can be tried again.
+    
+    Parameters:
+    - upload: ChunkedUpload model instance
+    
+    Returns:
+    - tuple: (OriginalAudioFile, is_duplicate)
+    
+    Raises:
+    - UploadBeingFinalized: If another request is finalizing the upload or has finished it
+    - ChunkChecksumMismatch: If the file does not match the digest given when the upload started
+    - ValueError: If bytes are still missing or the upload is not in progress
+    - OSError: If the part file could not be read or stored
+    """
+    from .audio_access import probe_wav_header
+    from .audio_processing import handle_duplicate_file, queue_uploaded_file
+    
+    with transaction.atomic():
+        upload = ChunkedUpload.objects.select_for_update().get(pk=upload.pk)
+        if upload.status in ('finalizing', 'complete'):
+            raise UploadBeingFinalized(f"Upload is {upload.get_status_display().lower()}")
+        if upload.status != 'uploading':
+            raise ValueError(f"Upload is {upload.get_status_display().lower()}")
+        if upload.received_bytes != upload.total_size:
+            raise ValueError(f"Received {upload.received_bytes} of {upload.total_size} bytes")
+        upload.status = 'finalizing'
+        upload.save(update_fields=['status', 'updated_at'])
+    
+    part_path = upload_part_path(upload)
+    try:
+        # The chunks were hashed as they arrived, but the file's digest needs one more read
+        digest = hashlib.sha256()
+        with open(part_path, 'rb') as part_file:
+            for block in iter(lambda: part_file.read(HASH_CHUNK_SIZE), b''):
+                digest.update(block)
+        content_hash = digest.hexdigest()
+        if upload.sha256 and content_hash != upload.sha256:
+            raise ChunkChecksumMismatch("File does not match its checksum")
+        
+        new_file = AssembledUpload(part_path, upload.file_name, upload.total_size)
+        new_file.content_hash = content_hash
+        try:
+            new_file.wav_header = probe_wav_header(part_path)
+        except (OSError, ValueError, struct.error):
+            new_file.wav_header = None
+        
+        try:
+            audio_file, is_duplicate, _ = handle_duplicate_file(
+                new_file=new_file,
+                animal_type=upload.animal_type,
+                zoo=upload.zoo
+            )
+            if not is_duplicate:
+                queue_uploaded_file(audio_file, upload.batch)
+        finally:
+            new_file.close()
+    except ChunkChecksumMismatch as e:
+        _fail_upload(upload, str(e))
+        raise
+    except Exception as e:
+        if os.path.exists(part_path):
+            # Nothing was stored; finalizing can be tried again
+            upload.status = 'uploading'
+            upload.message = str(e)
+            upload.save(update_fields=['status', 'message', 'updated_at'])
+        else:
+            _fail_upload(upload, str(e))
+        raise
+    
+    # A duplicate leaves the part file behind (a new file was renamed into place)
+    if os.path.exists(part_path):
+        os.remove(part_path)
+    
+    upload.status = 'complete'
+    upload.audio_file = audio_file
+    upload.save(update_fields=['status', 'audio_file', 'updated_at'])
+    return audio_file, is_duplicate
+
+
+def expire_stale_uploads():
+    """
+    Remove uploads that received nothing for CHUNKED_UPLOAD_EXPIRY_HOURS, with their part
+    files (including uploads whose finalize request died while storing them)
+    
+    Returns:
+    - int: Number of uploads removed
+    """
+    hours = getattr(settings, 'CHUNKED_UPLOAD_EXPIRY_HOURS', 48)
+    stale = list(ChunkedUpload.objects.filter(status__in=['uploading', 'finalizing'], updated_at__lt=now() - timedelta(hours=hours)))
+    for upload in stale:
+        try:
+            os.remove(upload_part_path(upload))
+        except FileNotFoundError:
+            pass
+        logger.info(f"Removed unfinished upload of {upload.file_name} ({upload.received_bytes}/{upload.total_size} bytes)")
+    ChunkedUpload.objects.filter(pk__in=[upload.pk for upload in stale]).delete()
+    return len(stale)
+
+
+def _fail_upload(upload, message):
+    """Mark an upload as failed and remove its part file"""
+    try:
+        os.remove(upload_part_path(upload))
+    except FileNotFoundError:
+        pass
+    upload.status = 'failed'
+    upload.message = message
+    upload.save(update_fields=['status', 'message', 'updated_at'])
@@ -0,0 +1,237 @@
+"""
+Clip spectrogram rendering stage.
+
+process_audio saves the detected calls and then hands their spectrogram images to this
+stage instead of rendering them one after another inside the processing job. The mode is
+chosen with the CLIP_SPECTROGRAM_RENDERING setting:
+
+- 'pool': the images are rendered by a bounded pool of low-priority worker processes
+  (CLIP_SPECTROGRAM_WORKERS) while the job carries on, so the detections and the Processed
+  status are available right away. A collector thread records a Spectrogram row for each
+  finished image and reports progress through ProcessingLog.
+- 'inline': the images are rendered in the processing job itself before it finishes.
+
+Daemonic processes cannot start a pool of their own, so jobs run by the background
+processor's 'pool' workers always render inline.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from django.conf import settings
+from django.db import connection
+from .models import Spectrogram
+from .processing_log import log_processing
+from .spectrogram_rendering import render_clip_spectrogram, lower_process_priority
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_clip_render_pool():
+    """
+    Get this process's clip rendering pool, starting it on first use
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Spawned workers only import the Django-free rendering modules
+            _executor = ProcessPoolExecutor(
+                max_workers=getattr(settings, 'CLIP_SPECTROGRAM_WORKERS', 2),
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=lower_process_priority,
+                initargs=(getattr(settings, 'CLIP_SPECTROGRAM_NICENESS', 10),)
+            )
+        return _executor
+
+
+def _discard_pool(executor):
+    """Forget a broken pool so the next batch starts a new one"""
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ClipRenderBatch:
+    """
+    The clip spectrograms of one processing job.
+    
+    Each clip is a dict with 'name' (used in progress messages), 'start_sample',
+    'end_sample', 'start_seconds', 'end_seconds' and 'image_path' (relative to MEDIA_ROOT).
+    """
+    
+    def __init__(self, file_path, original_audio, clips, spectrogram_type='mel'):
+        self.file_path = file_path
+        self.original_audio = original_audio
+        self.clips = clips
+        self.spectrogram_type = spectrogram_type
+        self.rendered = 0
+        self.errors = []
+        self.thread = None
+    
+    def job_arguments(self, clip):
+        renderer = getattr(settings, 'SPECTROGRAM_RENDERER', 'fast')
+        return (self.file_path, clip['start_sample'], clip['end_sample'],
+                os.path.join(settings.MEDIA_ROOT, clip['image_path']), self.spectrogram_type,
+                renderer, getattr(settings, 'SPECTROGRAM_ANNOTATE_AXES', True))
+    
+    def run_inline(self):
+        """Render every clip in this thread"""
+        results = []
+        for clip in self.clips:
+            try:
+                render_clip_spectrogram(*self.job_arguments(clip))
+                results.append((clip, None))
+            except Exception as e:
+                results.append((clip, e))
+        self._collect(results)
+    
+    def start(self):
+        """Submit every clip to the pool and collect the results in a background thread"""
+        executor = get_clip_render_pool()
+        try:
+            futures = {executor.submit(render_clip_spectrogram, *self.job_arguments(clip)): clip for clip in self.clips}
+        except BrokenProcessPool:
+            # A worker died during an earlier batch; start a new pool once
+            _discard_pool(executor)
+            executor = get_clip_render_pool()
+            futures = {executor.submit(render_clip_spectrogram, *self.job_arguments(clip)): clip for clip in self.clips}
+        
+        self.thread = threading.Thread(target=self._collect_futures, args=(executor, futures), daemon=True,
+                                       name=f"clip-render-{self.original_audio.pk}")
+        self.thread.start()
+    
+    def wait(self, timeout=None):
+        """Wait until the collector thread has recorded every clip (pool mode)"""
+        if self.thread is not None:
+            self.thread.join(timeout)
+    
+    def _collect_futures(self, executor, futures):
+        def results():
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                    yield futures[future], None
+                except BrokenProcessPool as e:
+                    _discard_pool(executor)
+                    yield futures[future], e
+                except Exception as e:
+                    yield futures[future], e
+        
+        try:
+            self._collect(results())
+        except Exception as e:
+            logger.error(f"Clip spectrogram collector failed for {self.original_audio.pk}: {str(e)}")
+        finally:
+            # The collector has its own database connection
+            connection.close()
+    
+    def _collect(self, results):
+        """
+        Record finished clips, flushing Spectrogram rows and a progress entry every
+        CLIP_SPECTROGRAM_PROGRESS_INTERVAL seconds and once at the end
+        """
+        interval = getattr(settings, 'CLIP_SPECTROGRAM_PROGRESS_INTERVAL', 5.0)
+        total = len(self.clips)
+        pending_rows = []
+        last_flush = time.monotonic()
+        
+        for clip, error in results:
+            if error is None:
+                self.rendered += 1
+                pending_rows.append(clip)
+            else:
+                self.errors.append(f"{clip['name']}: {str(error)}")
+            
+            done = self.rendered + len(self.errors)
+            if done < total and time.monotonic() - last_flush >= interval:
+                self._save_rows(pending_rows)
+                pending_rows = []
+                last_flush = time.monotonic()
+                log_processing(
+                    audio_file=self.original_audio,
+                    level='INFO',
+                    message=f'Rendered {done} of {total} clip spectrograms'
+                )
+        
+        self._save_rows(pending_rows)
+        log_processing(
+            audio_file=self.original_audio,
+            level='SUCCESS' if not self.errors else 'WARNING',
+            message=f'Rendered {self.rendered} of {total} clip spectrograms'
+        )
+        if self.errors:
+            shown = '; '.join(self.errors[:10])
+            more = f' (and {len(self.errors) - 10} more)' if len(self.errors) > 10 else ''
+            log_processing(
+                audio_file=self.original_audio,
+                level='WARNING',
+                message=f'{len(self.errors)} clip spectrograms failed: {shown}{more}'
+            )
+    
+    def _save_rows(self, clips):
+        if not clips:
+            return
+        image_paths = [clip['image_path'] for clip in clips]
+        # Reprocessing a file renders its clips again; keep one row per image
+        Spectrogram.objects.filter(audio_file=self.original_audio, is_full_audio=False,
+                                   image_path__in=image_paths).delete()
+        Spectrogram.objects.bulk_create([
+            Spectrogram(
+                audio_file=self.original_audio,
+                image_path=clip['image_path'],
+                is_full_audio=False,
+                clip_start_time=clip['start_seconds'],
+                clip_end_time=clip['end_seconds']
+            )
+            for clip in clips
+        ])
+
+
+def render_clip_spectrograms(file_path, original_audio, clips, spectrogram_type='mel', mode=None):
+    """
+    Render the spectrogram images of a job's clips.
+    
+    Parameters:
+    - file_path: Path to the recording
+    - original_audio: OriginalAudioFile model instance
+    - clips: List of clip dicts (see ClipRenderBatch)
+    - spectrogram_type: Type of the clip spectrograms
+    - mode: 'pool' or 'inline'. Defaults to settings.CLIP_SPECTROGRAM_RENDERING; 'pool'
+      falls back to 'inline' in a daemonic process.
+    
+    Returns:
+    - ClipRenderBatch: Finished in 'inline' mode; in 'pool' mode, call wait() to block
+      until every image has been recorded
+    """
+    if mode is None:
+        mode = getattr(settings, 'CLIP_SPECTROGRAM_RENDERING', 'pool')
+    if mode not in ('pool', 'inline'):
+        raise ValueError(f"Unknown clip spectrogram rendering mode: {mode}")
+    if mode == 'pool' and multiprocessing.current_process().daemon:
+        # A daemonic process is not allowed to have children
+        mode = 'inline'
+    
+    batch = ClipRenderBatch(file_path, original_audio, clips, spectrogram_type)
+    if not clips:
+        return batch
+    for clip in clips:
+        os.makedirs(os.path.dirname(os.path.join(settings.MEDIA_ROOT, clip['image_path'])), exist_ok=True)
+    
+    if mode == 'inline':
+        batch.run_inline()
+    else:
+        log_processing(
+            audio_file=original_audio,
+            level='INFO',
+            message=f'Rendering {len(clips)} clip spectrograms in the background'
+        )
+        batch.start()
+    return batch
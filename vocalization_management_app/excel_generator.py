@@ -2,7 +2,8 @@ import os
 import pandas as pd
 from django.conf import settings
 from django.utils.timezone import now
-from .models import OriginalAudioFile, ProcessingLog, DetectedNoiseAudioFile
+from .models import OriginalAudioFile, DetectedNoiseAudioFile
+from .processing_log import log_processing
 
 def generate_excel_report_for_processed_file(audio_file_id):
     """
@@ -22,7 +23,7 @@ def generate_excel_report_for_processed_file(audio_file_id):
         # Check if the file has been processed
         db_entry = audio_file.database_entry.first()
         if not db_entry or db_entry.status != 'Processed':
-            ProcessingLog.objects.create(
+            log_processing(
                 audio_file=audio_file,
                 message="Cannot generate Excel report: File not fully processed",
                 level="WARNING"
@@ -33,7 +34,7 @@ def generate_excel_report_for_processed_file(audio_file_id):
         detected_noises = DetectedNoiseAudioFile.objects.filter(original_file=audio_file).order_by('start_time')
         
         if not detected_noises.exists():
-            ProcessingLog.objects.create(
+            log_processing(
                 audio_file=audio_file,
                 message="No saw calls detected, generating empty Excel report",
                 level="INFO"
@@ -49,7 +50,7 @@ def generate_excel_report_for_processed_file(audio_file_id):
             device_info, recording_datetime = parse_audio_filename(audio_file.audio_file_name)
             file_date = recording_datetime.date()
         except Exception as e:
-            ProcessingLog.objects.create(
+            log_processing(
                 audio_file=audio_file,
                 message=f"Warning: Could not extract date from filename for Excel report: {str(e)}",
                 level="WARNING"
@@ -114,7 +115,7 @@ def generate_excel_report_for_processed_file(audio_file_id):
         audio_file.save(update_fields=['analysis_excel'])
         
         # Log successful Excel generation
-        ProcessingLog.objects.create(
+        log_processing(
             audio_file=audio_file,
             message=f"Excel report generated and saved: {excel_filename}",
             level="SUCCESS"
@@ -125,7 +126,7 @@ def generate_excel_report_for_processed_file(audio_file_id):
     except Exception as e:
         # Log error
         try:
-            ProcessingLog.objects.create(
+            log_processing(
                 audio_file=OriginalAudioFile.objects.get(file_id=audio_file_id),
                 message=f"Error generating Excel report: {str(e)}",
                 level="ERROR"
@@ -341,7 +341,7 @@ def download_file_from_drive(file_id, file_name, service=None):
         raise
 
 
-def process_drive_folder(folder_id, animal_type, zoo, uploaded_by=None, token_info=None):
+def process_drive_folder(folder_id, animal_type, zoo, uploaded_by=None, token_info=None, batch=None):
     """
     Process all audio files in a Google Drive folder.
     
@@ -351,12 +351,13 @@ def process_drive_folder(folder_id, animal_type, zoo, uploaded_by=None, token_in
         zoo: The zoo to associate with the files
         uploaded_by: The user who initiated the upload
         token_info: Optional dictionary containing token information from browser authentication
+        batch: Optional UploadBatch the files are queued in
         
     Returns:
         Dictionary with statistics about the processed files
     """
     from .models import OriginalAudioFile, ProcessingLog
-    from .audio_processing import handle_duplicate_file, update_audio_metadata
+    from .audio_processing import handle_duplicate_file, queue_uploaded_file
     from django.utils.timezone import now
     
     stats = {
@@ -395,22 +396,24 @@ def process_drive_folder(folder_id, animal_type, zoo, uploaded_by=None, token_in
                 # Download the file using the service
                 django_file = download_file_from_drive(file_id, file_name, service=service_or_auth)
                 
-                # Handle duplicate file detection and replacement
-                original_audio, is_duplicate, replaced_file_id = handle_duplicate_file(
+                # Handle duplicate file detection (by content)
+                original_audio, is_duplicate, existing_file_id = handle_duplicate_file(
                     new_file=django_file,
                     animal_type=animal_type,
                     zoo=zoo,
                     uploaded_by=uploaded_by
                 )
                 
-                # Track duplicate count
+                # Track duplicate count; the identical file is already stored and processed
+                # (and must not be tracked for cleanup)
                 if is_duplicate:
                     stats['duplicates'] += 1
+                    continue
                 
-                # Update metadata
+                # Queue the file; its metadata is read by the background workers
                 file_path = original_audio.audio_file.path
                 temp_files.append(file_path)  # Track the file path for potential cleanup
-                update_audio_metadata(file_path, original_audio)
+                queue_uploaded_file(original_audio, batch)
                 
                 # Create initial processing log
                 ProcessingLog.objects.create(
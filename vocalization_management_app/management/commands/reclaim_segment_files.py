@@ -0,0 +1,96 @@
+"""
+Turn detected saw calls saved as segment files into virtual clips and delete the files.
+
+Each clip keeps its sample range in the original recording (computed from its start and end
+times when it was saved before sample ranges were recorded) and is cut from the recording
+when played. Clips whose recording is missing or is not a WAV file keep their segment file,
+since it is then the only playable copy.
+"""
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from vocalization_management_app.audio_access import probe_wav_header
+from vocalization_management_app.audio_processing import time_to_seconds
+from vocalization_management_app.models import DetectedNoiseAudioFile
+
+
+class Command(BaseCommand):
+    help = "Convert detected saw calls with segment files into virtual clips and delete the segment files"
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Report what would be reclaimed without changing anything")
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Clips updated per transaction")
+    
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        sample_rates = {}
+        reclaimed = 0
+        skipped = 0
+        freed_bytes = 0
+        
+        clips = (DetectedNoiseAudioFile.objects.select_related('original_file')
+                 .exclude(detected_noise_file_path__isnull=True).exclude(detected_noise_file_path='')
+                 .order_by('pk'))
+        last_pk = 0
+        while True:
+            batch = list(clips.filter(pk__gt=last_pk)[:options['batch_size']])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            
+            updated = []
+            segment_paths = []
+            for clip in batch:
+                sample_rate = self._sample_rate(clip.original_file, sample_rates)
+                if sample_rate is None:
+                    skipped += 1
+                    continue
+                
+                if clip.start_sample is None or clip.end_sample is None:
+                    # As process_audio's seconds_to_samples
+                    clip.start_sample = int(time_to_seconds(clip.start_time) * sample_rate)
+                    clip.end_sample = int(time_to_seconds(clip.end_time) * sample_rate)
+                segment_path = os.path.join(settings.MEDIA_ROOT, clip.detected_noise_file_path)
+                if os.path.exists(segment_path):
+                    freed_bytes += os.path.getsize(segment_path)
+                    segment_paths.append(segment_path)
+                clip.detected_noise_file_path = ""
+                clip.file_size_mb = 0.0
+                updated.append(clip)
+            
+            reclaimed += len(updated)
+            if dry_run:
+                continue
+            
+            # Files are only deleted once their clips no longer point at them
+            with transaction.atomic():
+                DetectedNoiseAudioFile.objects.bulk_update(
+                    updated, ['start_sample', 'end_sample', 'detected_noise_file_path', 'file_size_mb']
+                )
+            for segment_path in segment_paths:
+                try:
+                    os.remove(segment_path)
+                except FileNotFoundError:
+                    pass
+        
+        verb = "Would reclaim" if dry_run else "Reclaimed"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {reclaimed} segment files ({freed_bytes / (1024 * 1024):.2f} MB)"
+        ))
+        if skipped:
+            self.stdout.write(self.style.WARNING(
+                f"Kept {skipped} segment files whose recording is missing or not a WAV file"
+            ))
+    
+    def _sample_rate(self, original_audio, sample_rates):
+        """Sample rate of a clip's recording, or None if it cannot be cut from it"""
+        if original_audio.pk not in sample_rates:
+            try:
+                file_path = os.path.join(settings.MEDIA_ROOT, original_audio.audio_file.name)
+                sample_rates[original_audio.pk] = probe_wav_header(file_path)['sample_rate']
+            except (OSError, ValueError):
+                sample_rates[original_audio.pk] = None
+        return sample_rates[original_audio.pk]
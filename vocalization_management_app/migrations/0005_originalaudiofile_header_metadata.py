@@ -0,0 +1,38 @@
+# Generated by Django 5.0.14 on 2026-10-17 03:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vocalization_management_app', '0004_alter_database_status_alter_database_uploaded_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='originalaudiofile',
+            name='audio_format',
+            field=models.CharField(blank=True, max_length=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='originalaudiofile',
+            name='bit_depth',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='originalaudiofile',
+            name='channels',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='originalaudiofile',
+            name='frame_count',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='originalaudiofile',
+            name='header_metadata',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
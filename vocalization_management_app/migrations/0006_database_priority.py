@@ -0,0 +1,22 @@
+# Generated by Django 5.0.14 on 2026-10-17 03:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vocalization_management_app', '0005_originalaudiofile_header_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='database',
+            name='priority',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='database',
+            index=models.Index(fields=['status', '-priority', 'uploaded_at'], name='vocalizatio_status_7d98ab_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.14 on 2026-10-17 03:44
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vocalization_management_app', '0006_database_priority'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='processinglog',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.14 on 2026-10-17 04:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vocalization_management_app', '0007_alter_processinglog_timestamp'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='waveform',
+            name='peaks_path',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AlterField(
+            model_name='waveform',
+            name='image_path',
+            field=models.ImageField(blank=True, upload_to='waveforms/'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.14 on 2026-10-17 04:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vocalization_management_app', '0008_waveform_peaks_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detectednoiseaudiofile',
+            name='end_sample',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='detectednoiseaudiofile',
+            name='start_sample',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
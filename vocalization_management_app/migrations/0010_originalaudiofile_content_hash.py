@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-17 04:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vocalization_management_app', '0009_detected_noise_sample_range'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='originalaudiofile',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+    ]
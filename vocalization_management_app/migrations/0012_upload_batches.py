@@ -0,0 +1,42 @@
+# Generated by Django 5.0.14 on 2026-10-17 04:30
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vocalization_management_app', '0011_chunkedupload'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='database',
+            name='status',
+            field=models.CharField(choices=[('Uploaded', 'Uploaded'), ('Ingesting', 'Ingesting'), ('Pending', 'Pending'), ('Processing', 'Processing'), ('Processed', 'Processed'), ('Failed', 'Failed')], db_index=True, default='Pending', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='UploadBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('batch_id', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('duplicate_count', models.IntegerField(default=0)),
+                ('failed_count', models.IntegerField(default=0)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='upload_batches', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='chunkedupload',
+            name='batch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='chunked_uploads', to='vocalization_management_app.uploadbatch'),
+        ),
+        migrations.AddField(
+            model_name='database',
+            name='batch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='entries', to='vocalization_management_app.uploadbatch'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-17 05:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vocalization_management_app', '0012_upload_batches'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='chunkedupload',
+            name='status',
+            field=models.CharField(choices=[('uploading', 'Uploading'), ('finalizing', 'Finalizing'), ('complete', 'Complete'), ('failed', 'Failed')], db_index=True, default='uploading', max_length=20),
+        ),
+    ]
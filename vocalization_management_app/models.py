@@ -1,3 +1,4 @@
+import uuid
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.utils.timezone import now
@@ -67,12 +68,17 @@ class AnimalTable(models.Model):
 def audio_file_path(instance, filename):
     """
     Function to generate the upload path for audio files.
-    Initially stores files in a temporary location.
-    The files will be moved to their proper location after metadata extraction.
+    Files with a recording date are stored straight in the date-based structure
+    (audio_files/<animal>/<yyyy>/<mm>/<dd>/, as organize_audio_file_by_date lays it out).
+    Others are stored in a temporary location and moved there after metadata extraction.
     """
     # Create a clean filename with animal type prefix
     clean_filename = f"{instance.animal_type}_{filename}"
     
+    if instance.recording_date:
+        date = instance.recording_date
+        return f"audio_files/{instance.animal_type}/{date.strftime('%Y')}/{date.strftime('%m')}/{date.strftime('%d')}/{clean_filename}"
+    
     # Store initially in a temporary location
     # Files will be moved to a date-based structure after metadata extraction
     return f'storage/temp/{clean_filename}'
@@ -94,6 +100,7 @@ class OriginalAudioFile(models.Model):
         max_length=255
     )
     audio_file_name = models.CharField(max_length=255, db_index=True)  # Add index for faster filename searches
+    content_hash = models.CharField(max_length=64, blank=True, null=True, db_index=True)  # SHA-256 of the file, to recognize re-uploads
     recording_date = models.DateTimeField(blank=True, null=True, db_index=True)  # Add index for date range queries
     animal_type = models.CharField(max_length=20, choices=ANIMAL_CHOICES, db_index=True)  # Add index for filtering by animal type
     animal = models.ForeignKey(AnimalTable, on_delete=models.CASCADE, related_name="original_audio", blank=True, null=True)
@@ -105,6 +112,12 @@ class OriginalAudioFile(models.Model):
     duration_seconds = models.FloatField(blank=True, null=True, default=0.0)
     duration = models.CharField(max_length=20, blank=True, null=True)
     sample_rate = models.IntegerField(blank=True, null=True)
+    # Format details read from the WAV header when the file is uploaded
+    channels = models.IntegerField(blank=True, null=True)
+    bit_depth = models.IntegerField(blank=True, null=True)
+    frame_count = models.BigIntegerField(blank=True, null=True)
+    audio_format = models.CharField(max_length=20, blank=True, null=True)
+    header_metadata = models.JSONField(blank=True, null=True)  # RIFF chunk list, LIST/INFO and GUANO fields
     
     class Meta:
         # Add composite indexes for common search patterns
@@ -144,6 +157,9 @@ class DetectedNoiseAudioFile(models.Model):
     detected_noise_file_path = models.CharField(max_length=255, blank=True, null=True)
     start_time = models.TimeField()
     end_time = models.TimeField()
+    # Sample range of the call in the original recording (clips without a file are cut from it)
+    start_sample = models.BigIntegerField(blank=True, null=True)
+    end_sample = models.BigIntegerField(blank=True, null=True)
     saw_count = models.IntegerField()
     saw_call_count = models.IntegerField()
     file_size_mb = models.FloatField(blank=True, null=True)
@@ -196,7 +212,8 @@ class Spectrogram(models.Model):
 # Waveform Table
 class Waveform(models.Model):
     audio_file = models.ForeignKey(OriginalAudioFile, on_delete=models.CASCADE, related_name='waveforms')
-    image_path = models.ImageField(upload_to='waveforms/')
+    image_path = models.ImageField(upload_to='waveforms/', blank=True)
+    peaks_path = models.CharField(max_length=255, blank=True, null=True)  # Min/max peak pyramid (see waveform_peaks)
     generated_by = models.ForeignKey(StaffProfile, on_delete=models.CASCADE, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -238,7 +255,7 @@ class ProcessingLog(models.Model):
     audio_file = models.ForeignKey(OriginalAudioFile, on_delete=models.CASCADE, related_name='processing_logs')
     message = models.TextField()
     level = models.CharField(max_length=10, choices=LOG_LEVELS, default='INFO')
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=now)  # Set when the entry is logged, even if it is written later
     
     class Meta:
         ordering = ['-timestamp']
@@ -247,10 +264,26 @@ class ProcessingLog(models.Model):
         return f"{self.get_level_display()} - {self.timestamp}: {self.message[:50]}"
 
 
+# Upload Batch Model
+class UploadBatch(models.Model):
+    """Files uploaded together, whose ingestion and processing progress is reported as a whole"""
+    batch_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    created_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='upload_batches')
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Uploads that did not get a Database entry of their own
+    duplicate_count = models.IntegerField(default=0)  # Identical to a stored file
+    failed_count = models.IntegerField(default=0)  # Could not be stored
+    
+    def __str__(self):
+        return f"Upload batch {self.batch_id}"
+
+
 # Database Model (Metadata & Processing Status)
 class Database(models.Model):
     audio_file = models.ForeignKey(OriginalAudioFile, on_delete=models.CASCADE, related_name='database_entry')
     status = models.CharField(max_length=20, choices=[
+        ('Uploaded', 'Uploaded'),  # Stored, waiting for a background worker to read its metadata
+        ('Ingesting', 'Ingesting'),
         ('Pending', 'Pending'), 
         ('Processing', 'Processing'), 
         ('Processed', 'Processed'),
@@ -260,10 +293,13 @@ class Database(models.Model):
     uploaded_at = models.DateTimeField(auto_now_add=True, db_index=True)  # Add index for date filtering
     processing_start_time = models.DateTimeField(null=True, blank=True)
     processing_end_time = models.DateTimeField(null=True, blank=True)
+    priority = models.IntegerField(default=0)  # Higher priority files are claimed for processing first
+    batch = models.ForeignKey(UploadBatch, on_delete=models.SET_NULL, null=True, blank=True, related_name='entries')
     
     class Meta:
         indexes = [
             models.Index(fields=['status', 'uploaded_at']),  # Composite index for common query pattern
+            models.Index(fields=['status', '-priority', 'uploaded_at']),  # Order in which pending files are claimed
         ]
 
     def __str__(self):
@@ -301,4 +337,33 @@ class AnimalDetectionParameters(models.Model):
         # If no default exists, make this the default
         elif not AnimalDetectionParameters.objects.filter(is_default=True).exists():
             self.is_default = True
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+
+
+# Resumable Upload Model
+class ChunkedUpload(models.Model):
+    """A recording uploaded in chunks that can be resumed after a dropped connection (see chunked_uploads)"""
+    STATUS_CHOICES = [
+        ('uploading', 'Uploading'),
+        ('finalizing', 'Finalizing'),  # Being stored by a finalize request
+        ('complete', 'Complete'),
+        ('failed', 'Failed'),
+    ]
+    
+    upload_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    file_name = models.CharField(max_length=255)
+    total_size = models.BigIntegerField()
+    received_bytes = models.BigIntegerField(default=0)  # Verified bytes on disk; the next chunk starts here
+    sha256 = models.CharField(max_length=64, blank=True, null=True)  # Digest of the whole file, when the client sent it
+    animal_type = models.CharField(max_length=20)
+    zoo = models.ForeignKey(Zoo, on_delete=models.CASCADE, related_name='chunked_uploads', null=True, blank=True)
+    created_by = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='chunked_uploads')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='uploading', db_index=True)
+    message = models.TextField(blank=True)
+    audio_file = models.ForeignKey(OriginalAudioFile, on_delete=models.SET_NULL, null=True, blank=True, related_name='chunked_uploads')
+    batch = models.ForeignKey(UploadBatch, on_delete=models.SET_NULL, null=True, blank=True, related_name='chunked_uploads')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    
+    def __str__(self):
+        return f"Upload of {self.file_name} ({self.received_bytes}/{self.total_size} bytes)"
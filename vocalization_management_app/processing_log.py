@@ -0,0 +1,140 @@
+"""
+Buffered writer for ProcessingLog entries.
+
+Processing code logs through log_processing(), which takes the same arguments as
+ProcessingLog.objects.create(). Inside buffered_processing_logs() (a context manager that
+also works as a decorator) the entries are kept in memory and written with bulk_create when
+the buffer is full, when its oldest entry is older than the flush interval, or when the
+block exits - including when it exits with an exception. A timer flushes entries that reach
+the flush interval while nothing else is logged, so progress shows on the dashboard during
+long steps. Entries below the PROCESSING_LOG_MIN_LEVEL setting are dropped.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import connection
+from django.utils.timezone import now
+from .models import ProcessingLog
+
+logger = logging.getLogger(__name__)
+
+# Severity of the ProcessingLog levels, for the minimum level setting
+LOG_LEVEL_ORDER = {
+    'INFO': 20,
+    'SUCCESS': 25,
+    'WARNING': 30,
+    'ERROR': 40,
+}
+
+_local = threading.local()
+
+
+def is_level_enabled(level):
+    """
+    Check a log level against the PROCESSING_LOG_MIN_LEVEL setting
+    """
+    min_level = getattr(settings, 'PROCESSING_LOG_MIN_LEVEL', 'INFO')
+    return LOG_LEVEL_ORDER.get(level, 0) >= LOG_LEVEL_ORDER.get(min_level, 0)
+
+
+class ProcessingLogBuffer:
+    """
+    In-memory batch of ProcessingLog entries written with bulk_create
+    """
+    
+    def __init__(self, max_entries=None, max_age=None):
+        self.max_entries = max_entries or getattr(settings, 'PROCESSING_LOG_BUFFER_SIZE', 50)
+        self.max_age = max_age if max_age is not None else getattr(settings, 'PROCESSING_LOG_FLUSH_INTERVAL', 5.0)
+        self.entries = []
+        self.first_entry_time = None
+        self.lock = threading.Lock()
+        self.timer = None
+    
+    def add(self, audio_file, message, level='INFO', timestamp=None):
+        """
+        Buffer a log entry, flushing if the size or time threshold is reached
+        Returns the (unsaved) ProcessingLog, or None if its level is filtered out
+        """
+        if not is_level_enabled(level):
+            return None
+        
+        # Take the timestamp now so entries keep their order when written together
+        entry = ProcessingLog(audio_file=audio_file, message=message, level=level, timestamp=timestamp or now())
+        with self.lock:
+            if not self.entries:
+                self.first_entry_time = time.monotonic()
+                # Write the entry after the flush interval even if nothing else is logged
+                self.timer = threading.Timer(self.max_age, self.flush_on_timer)
+                self.timer.daemon = True
+                self.timer.start()
+            self.entries.append(entry)
+            due = len(self.entries) >= self.max_entries or time.monotonic() - self.first_entry_time >= self.max_age
+        
+        if due:
+            self.flush()
+        return entry
+    
+    def flush(self):
+        """
+        Write all buffered entries in one query
+        """
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            if not self.entries:
+                return
+            entries, self.entries = self.entries, []
+            ProcessingLog.objects.bulk_create(entries)
+    
+    def flush_on_timer(self):
+        """
+        Flush from the timer thread, closing the database connection it opened
+        """
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Could not write buffered processing logs: {str(e)}")
+        finally:
+            connection.close()
+
+
+def log_processing(audio_file, message, level='INFO', timestamp=None):
+    """
+    Record a ProcessingLog entry (same arguments as ProcessingLog.objects.create)
+    The entry is buffered if a buffered_processing_logs() block is active in this thread,
+    otherwise it is written immediately
+    """
+    buffer = getattr(_local, 'buffer', None)
+    if buffer is not None:
+        return buffer.add(audio_file, message, level=level, timestamp=timestamp)
+    if not is_level_enabled(level):
+        return None
+    return ProcessingLog.objects.create(audio_file=audio_file, message=message, level=level,
+                                        timestamp=timestamp or now())
+
+
+@contextmanager
+def buffered_processing_logs(max_entries=None, max_age=None):
+    """
+    Buffer log_processing() calls in this thread until the block exits
+    Nested blocks share the outermost buffer, which is flushed once at the end
+    """
+    if getattr(_local, 'buffer', None) is not None:
+        yield _local.buffer
+        return
+    
+    buffer = ProcessingLogBuffer(max_entries=max_entries, max_age=max_age)
+    _local.buffer = buffer
+    try:
+        yield buffer
+    finally:
+        _local.buffer = None
+        pending = len(buffer.entries)
+        try:
+            buffer.flush()
+        except Exception as e:
+            # Don't hide the job's own exception (or result) because the logs could not be written
+            logger.error(f"Could not write {pending} buffered processing logs: {str(e)}")
@@ -0,0 +1,147 @@
+"""
+Wake-up channel between uploads and the background audio processor.
+
+When a Database row becomes Pending, the upload code calls notify_pending_files() and idle
+processor workers start immediately instead of waiting for their next poll. The backend is
+chosen with the AUDIO_PROCESSOR_WAKEUP setting:
+
+- 'condition': a threading.Condition, for uploads and processor in the same process
+  (the default threaded processor under runserver).
+- 'socket': datagrams to a localhost UDP port (AUDIO_PROCESSOR_WAKEUP_ADDRESS), so uploads
+  handled by any web process on the machine wake the processor.
+
+Notifications are only hints: workers still re-check the queue after a long idle timeout,
+so a lost notification delays a file but never strands it.
+"""
+import logging
+import select
+import socket
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class ConditionWakeup:
+    """
+    In-process wake-up backed by a condition variable
+    """
+    
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.pending = 0
+    
+    def listen(self):
+        return True
+    
+    def notify(self):
+        with self.condition:
+            self.pending += 1
+            self.condition.notify_all()
+    
+    def wait(self, timeout):
+        """
+        Block until notify() is called or timeout seconds pass
+        Returns True if there was a notification
+        """
+        with self.condition:
+            if not self.pending:
+                self.condition.wait(timeout)
+            woken = self.pending > 0
+            self.pending = 0
+            return woken
+    
+    def close(self):
+        pass
+
+
+class SocketWakeup:
+    """
+    Cross-process wake-up over a localhost UDP socket
+    Any process can notify(); the processor process calls listen() once and then wait()
+    """
+    
+    def __init__(self, address):
+        self.address = tuple(address)
+        self.sock = None
+    
+    def listen(self):
+        """
+        Bind the wake-up port in this process
+        Returns False if another process already listens on it
+        """
+        if self.sock is not None:
+            return True
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.bind(self.address)
+        except OSError as e:
+            sock.close()
+            logger.warning(f"Cannot listen for processing wake-ups on {self.address}: {str(e)}")
+            return False
+        sock.setblocking(False)
+        self.sock = sock
+        return True
+    
+    def notify(self):
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.sendto(b'pending', self.address)
+    
+    def wait(self, timeout):
+        """
+        Block until a wake-up datagram arrives or timeout seconds pass
+        Returns True if there was a notification
+        """
+        if self.sock is None:
+            # Not listening (the port is taken), fall back to waiting out the timeout
+            threading.Event().wait(timeout)
+            return False
+        readable, _, _ = select.select([self.sock], [], [], timeout)
+        woken = False
+        while readable:
+            # Several uploads may have notified; one wake-up covers them all
+            try:
+                self.sock.recv(64)
+                woken = True
+            except BlockingIOError:
+                break
+        return woken
+    
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+
+_wakeup = None
+_wakeup_lock = threading.Lock()
+
+
+def get_wakeup():
+    """
+    Get this process's wake-up channel for the configured backend
+    """
+    global _wakeup
+    from django.conf import settings
+    
+    with _wakeup_lock:
+        if _wakeup is None:
+            backend = getattr(settings, 'AUDIO_PROCESSOR_WAKEUP', 'condition')
+            if backend == 'socket':
+                _wakeup = SocketWakeup(getattr(settings, 'AUDIO_PROCESSOR_WAKEUP_ADDRESS', ('127.0.0.1', 47219)))
+            elif backend == 'condition':
+                _wakeup = ConditionWakeup()
+            else:
+                raise ValueError(f"Unknown AUDIO_PROCESSOR_WAKEUP backend: {backend}")
+        return _wakeup
+
+
+def notify_pending_files():
+    """
+    Wake the background processor because a file has become Pending
+    Call this after the Database row is committed (see transaction.on_commit)
+    """
+    try:
+        get_wakeup().notify()
+    except Exception as e:
+        # Workers fall back to their idle timeout, so a failed wake-up only delays processing
+        logger.warning(f"Could not wake the audio processor: {str(e)}")
@@ -0,0 +1,23 @@
+"""
+Entry point of the audio processing worker processes started by tasks.supervise_worker_pool.
+
+Worker processes are spawned as fresh interpreters, so Django has to be set up before any
+model (or the tasks module, which imports models) can be imported. This module therefore
+only imports Django's setup function at the top level.
+"""
+import django
+
+
+def worker_main(worker_id, stop_event, status_queue, work_available=None):
+    """
+    Set up Django in the worker process and run the worker loop
+    """
+    django.setup()
+    
+    from django.db import connections
+    from .tasks import run_pool_worker
+    
+    try:
+        run_pool_worker(worker_id, stop_event, status_queue, work_available)
+    finally:
+        connections.close_all()
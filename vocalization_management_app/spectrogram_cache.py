@@ -0,0 +1,301 @@
+"""
+Spectrogram images and graph data rendered on demand, with an LRU disk cache.
+
+Most spectrograms are never opened, so instead of rendering them while a file is processed
+(SPECTROGRAM_GENERATION = 'eager') the pages link to the api_spectrogram_image endpoint,
+which renders an image the first time it is requested and keeps it in the cache directory
+(SPECTROGRAM_CACHE_DIR, spectrogram_cache/ under MEDIA_ROOT by default).
+
+Entries are keyed by the recording (including its size and modification time), the sample
+range, the spectrogram type and the render settings, so changing any of them renders a new
+image instead of serving a stale one. Every hit bumps the entry's modification time; once
+the cache grows past SPECTROGRAM_CACHE_MAX_MB the least recently used entries are deleted.
+
+The pooled spectrogram matrices and spectra of the graphs page (see spectrogram_data) are
+cached the same way, next to the images. Tile pyramids of the zoomable viewer are built on
+first request too, but kept with the file's other spectrograms outside the LRU cache.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+import librosa
+from django.conf import settings
+from .audio_access import AudioSource
+from .audio_processing import SpectrogramAccumulator, generate_spectrogram_tiles, spectrogram_tile_directory, tile_pyramids_on_demand
+from .spectrogram_rendering import compute_spectrogram_db, render_spectrogram_image
+from .spectrogram_tiles import read_padded, read_pyramid_manifest
+
+# STFT layout of the on-demand spectrograms (as generate_spectrogram)
+N_FFT = 2048
+HOP_LENGTH = 512
+
+_render_locks = {}
+_render_locks_lock = threading.Lock()
+
+
+def spectrogram_cache_directory():
+    """Absolute directory of the spectrogram image cache"""
+    return getattr(settings, 'SPECTROGRAM_CACHE_DIR', None) or os.path.join(settings.MEDIA_ROOT, 'spectrogram_cache')
+
+
+def spectrogram_render_settings():
+    """The settings that change how a spectrogram image looks (part of the cache key)"""
+    renderer = getattr(settings, 'SPECTROGRAM_RENDERER', 'fast')
+    return {
+        'renderer': renderer,
+        'image_format': 'png' if renderer == 'publication' else getattr(settings, 'SPECTROGRAM_IMAGE_FORMAT', 'png'),
+        'annotate': getattr(settings, 'SPECTROGRAM_ANNOTATE_AXES', True),
+        'max_columns': getattr(settings, 'SPECTROGRAM_MAX_COLUMNS', 4096),
+    }
+
+
+def spectrogram_cache_key(file_path, original_audio, params):
+    """
+    Cache key of one cached image or data file
+    
+    Parameters:
+    - file_path: Path to the recording (its size and modification time are part of the key)
+    - original_audio: OriginalAudioFile model instance
+    - params: JSON-serializable dict of everything else the entry depends on (kind, sample
+      range, spectrogram type, render settings...)
+    
+    Returns:
+    - str: Hex digest naming the cached file
+    """
+    stat = os.stat(file_path)
+    identity = [original_audio.pk, original_audio.audio_file.name, stat.st_size, stat.st_mtime_ns, params]
+    return hashlib.sha1(json.dumps(identity, sort_keys=True).encode()).hexdigest()
+
+
+def cached_spectrogram_image(original_audio, spectrogram_type='mel', start_seconds=None, end_seconds=None):
+    """
+    Get a spectrogram image of a recording, rendering it if it is not cached yet.
+    
+    Parameters:
+    - original_audio: OriginalAudioFile model instance
+    - spectrogram_type: 'mel', 'linear' or 'chroma'
+    - start_seconds, end_seconds: Clip range; the whole recording when both are None
+    
+    Returns:
+    - str: Absolute path of the cached image
+    """
+    render_settings = spectrogram_render_settings()
+    
+    def render(audio, start_sample, end_sample, temp_path):
+        S_dB, hop_length = _range_spectrogram_db(audio, start_sample, end_sample, spectrogram_type,
+                                                 render_settings['max_columns'])
+        render_spectrogram_image(S_dB, temp_path, audio.sample_rate, hop_length, spectrogram_type,
+                                 renderer=render_settings['renderer'], annotate=render_settings['annotate'])
+    
+    params = dict(render_settings, kind='image', spectrogram_type=spectrogram_type)
+    return _cached_entry(original_audio, start_seconds, end_seconds, params, render_settings['image_format'], render)
+
+
+def cached_spectrogram_data(original_audio, start_seconds=None, end_seconds=None, width=1024, height=None,
+                            min_frequency=0.0, max_frequency=None, pooling='max'):
+    """
+    Get a pooled, quantized spectrogram matrix of a recording (see spectrogram_data),
+    computing it if it is not cached yet.
+    
+    Parameters:
+    - original_audio: OriginalAudioFile model instance
+    - start_seconds, end_seconds: Time window; the whole recording when both are None
+    - width, height, min_frequency, max_frequency, pooling: As spectrogram_matrix
+    
+    Returns:
+    - str: Absolute path of the cached file, in the binary format of spectrogram_data
+    """
+    from .spectrogram_data import spectrogram_matrix, encode_spectrogram_matrix
+    
+    def compute(audio, start_sample, end_sample, temp_path):
+        values, header = spectrogram_matrix(audio, start_sample, end_sample, width, min_frequency=min_frequency,
+                                            max_frequency=max_frequency, height=height, pooling=pooling)
+        with open(temp_path, 'wb') as data_file:
+            data_file.write(encode_spectrogram_matrix(values, header))
+    
+    params = {'kind': 'matrix', 'width': width, 'height': height, 'min_frequency': min_frequency,
+              'max_frequency': max_frequency, 'pooling': pooling}
+    return _cached_entry(original_audio, start_seconds, end_seconds, params, 'bin', compute)
+
+
+def cached_average_spectrum(original_audio, start_seconds=None, end_seconds=None):
+    """
+    Get the mean power spectrum of a recording (see spectrogram_data.average_spectrum),
+    computing it if it is not cached yet
+    
+    Returns:
+    - dict: 'frequencies' and 'magnitudes' lists
+    """
+    from .spectrogram_data import average_spectrum
+    
+    def compute(audio, start_sample, end_sample, temp_path):
+        with open(temp_path, 'w') as spectrum_file:
+            json.dump(average_spectrum(audio, start_sample, end_sample), spectrum_file)
+    
+    path = _cached_entry(original_audio, start_seconds, end_seconds, {'kind': 'spectrum'}, 'json', compute)
+    with open(path) as spectrum_file:
+        return json.load(spectrum_file)
+
+
+def spectrogram_pyramid_manifest(original_audio, spectrogram_type='mel'):
+    """
+    Get the manifest of a recording's spectrogram tile pyramid, building the pyramid if it
+    is built on demand (see tile_pyramids_on_demand) and does not exist yet
+    
+    Returns:
+    - dict: The pyramid manifest, or None if there is no pyramid (or building it failed)
+    """
+    pyramid_dir = spectrogram_tile_directory(original_audio, spectrogram_type)
+    manifest = read_pyramid_manifest(pyramid_dir)
+    if manifest is not None or not tile_pyramids_on_demand():
+        return manifest
+    
+    # The manifest and the first tiles are requested together; build the pyramid once
+    with _render_lock(f"tiles-{original_audio.pk}-{spectrogram_type}"):
+        manifest = read_pyramid_manifest(pyramid_dir)
+        if manifest is None:
+            file_path = os.path.join(settings.MEDIA_ROOT, original_audio.audio_file.name)
+            manifest = generate_spectrogram_tiles(file_path, original_audio, spectrogram_type)
+    return manifest
+
+
+def evict_spectrogram_cache(max_bytes=None):
+    """
+    Delete the least recently used cache entries until the cache fits its size budget
+    
+    Parameters:
+    - max_bytes: Size budget; defaults to settings.SPECTROGRAM_CACHE_MAX_MB
+    
+    Returns:
+    - int: Number of entries deleted
+    """
+    if max_bytes is None:
+        max_bytes = getattr(settings, 'SPECTROGRAM_CACHE_MAX_MB', 1024) * 1024 * 1024
+    
+    entries = []
+    total = 0
+    for directory, _, filenames in os.walk(spectrogram_cache_directory()):
+        for filename in filenames:
+            # Entries still being written start with a dot
+            if filename.startswith('.'):
+                continue
+            path = os.path.join(directory, filename)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+    
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    return removed
+
+
+def _cached_entry(original_audio, start_seconds, end_seconds, params, extension, write):
+    """
+    Path of a cache entry for a time range of a recording, created on a miss.
+    
+    Parameters:
+    - original_audio: OriginalAudioFile model instance
+    - start_seconds, end_seconds: Time range; the whole recording when both are None
+    - params: dict of what else the entry depends on (part of the key)
+    - extension: File extension of the entry
+    - write: Called as write(audio, start_sample, end_sample, temp_path) to create the entry
+    
+    Returns:
+    - str: Absolute path of the entry
+    """
+    file_path = os.path.join(settings.MEDIA_ROOT, original_audio.audio_file.name)
+    
+    with AudioSource(file_path) as audio:
+        if start_seconds is None and end_seconds is None:
+            start_sample, end_sample = 0, len(audio)
+        else:
+            start_sample, end_sample = audio.seconds_to_samples(
+                start_seconds or 0.0, audio.duration_seconds if end_seconds is None else end_seconds
+            )
+            start_sample, end_sample = max(0, start_sample), min(end_sample, len(audio))
+        
+        key = spectrogram_cache_key(file_path, original_audio,
+                                    dict(params, start_sample=start_sample, end_sample=end_sample))
+        path = os.path.join(spectrogram_cache_directory(), str(original_audio.pk), f"{key}.{extension}")
+        if _touch(path):
+            return path
+        
+        # Requests for the same entry wait for one render instead of each rendering it
+        with _render_lock(key):
+            if _touch(path):
+                return path
+            
+            # Written under a temporary name, then renamed into place
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(prefix='.render-', suffix=f".{extension}", dir=os.path.dirname(path))
+            os.close(fd)
+            try:
+                write(audio, start_sample, end_sample, temp_path)
+                os.replace(temp_path, path)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+    
+    evict_spectrogram_cache()
+    return path
+
+
+def _touch(path):
+    """Mark a cache entry as just used; returns False if it does not exist"""
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+@contextmanager
+def _render_lock(key):
+    with _render_locks_lock:
+        lock = _render_locks.setdefault(key, threading.Lock())
+    try:
+        with lock:
+            yield
+    finally:
+        with _render_locks_lock:
+            if _render_locks.get(key) is lock and not lock.locked():
+                del _render_locks[key]
+
+
+def _range_spectrogram_db(audio, start_sample, end_sample, spectrogram_type, max_columns):
+    """
+    Spectrogram of a sample range in the scale it is plotted in, and the hop of its columns.
+    
+    Short ranges (clips) are transformed in one go. Longer ones are transformed a chunk of
+    frames at a time into a SpectrogramAccumulator, which averages them down to max_columns
+    columns, so a whole recording is never held in memory.
+    """
+    n_frames = 1 + (end_sample - start_sample) // HOP_LENGTH
+    if n_frames <= max_columns:
+        y = audio.normalized(start_sample, end_sample)
+        return compute_spectrogram_db(y, audio.sample_rate, spectrogram_type, hop_length=HOP_LENGTH), HOP_LENGTH
+    
+    features = SpectrogramAccumulator(max_columns)
+    features.begin(n_frames, audio.sample_rate, N_FFT, HOP_LENGTH)
+    chunk_frames = 4096
+    for first in range(0, n_frames, chunk_frames):
+        last = min(first + chunk_frames, n_frames)
+        # Frames centred on their hop like librosa.stft(center=True)
+        start = start_sample + first * HOP_LENGTH - N_FFT // 2
+        y = read_padded(audio, start, start + (last - first - 1) * HOP_LENGTH + N_FFT)
+        features.add(first, librosa.stft(y, n_fft=N_FFT, hop_length=HOP_LENGTH, center=False))
+    return features.spectrogram_db(spectrogram_type), features.hop_length
@@ -0,0 +1,172 @@
+"""
+Compact time-frequency data for the interactive graphs page.
+
+Instead of rendering an image, the browser receives a spectrogram matrix already pooled down
+to the pixel size it will be drawn at, quantized to one byte per cell:
+
+    uint32 (little-endian)   length of the JSON header in bytes
+    JSON header (UTF-8)      sizes, scales and the dB range of the values
+    rows x columns uint8     row-major, row 0 = lowest frequency
+
+A value v stands for db_min + v / 255 * (db_max - db_min) dB (power, ref 1.0). A minute of
+audio at 1024 x 256 is 256 KB this way, against megabytes for a PNG at a usable resolution
+or a JSON array of floats.
+
+Like spectrogram_rendering, nothing here imports Django.
+"""
+import json
+import struct
+import numpy as np
+import librosa
+from .spectrogram_tiles import read_padded
+
+# Floor of the dB values, as librosa.power_to_db(amin=1e-10)
+_AMIN = 1e-10
+
+
+def spectrogram_matrix(audio, start_sample, end_sample, width, min_frequency=0.0, max_frequency=None,
+                       height=None, pooling='max', n_fft=2048, top_db=80.0, chunk_frames=4096):
+    """
+    Compute the spectrogram of a sample range pooled to width x height cells.
+    
+    The STFT is computed one chunk of frames at a time, so windows of any length use
+    bounded memory. Its hop grows with the window (up to n_fft, so no samples are skipped)
+    to keep the number of frames per column small. 'max' pooling keeps short calls visible
+    however far the view is zoomed out; 'mean' shows the average energy instead.
+    
+    Parameters:
+    - audio: AudioSource of the recording.
+    - start_sample, end_sample (int): Sample range of the window.
+    - width (int): Number of time columns (at most one per STFT frame).
+    - min_frequency, max_frequency (float): Frequency range in Hz (max defaults to Nyquist).
+    - height (int, optional): Number of frequency rows; defaults to one per FFT bin in range.
+    - pooling (str): 'max' or 'mean'.
+    - n_fft (int): FFT size.
+    - top_db (float): Dynamic range kept below the loudest cell.
+    - chunk_frames (int): STFT frames computed at once.
+    
+    Returns:
+    - tuple: (uint8 array of shape (rows, columns), header dict)
+    """
+    if pooling not in ('max', 'mean'):
+        raise ValueError(f"Unknown pooling: {pooling}")
+    
+    sample_rate = audio.sample_rate
+    n_samples = max(0, end_sample - start_sample)
+    hop_length = int(min(n_fft, max(n_fft // 4, n_samples // max(1, width * 4))))
+    n_frames = 1 + n_samples // hop_length
+    n_columns = max(1, min(width, n_frames))
+    
+    bin_frequencies = librosa.fft_frequencies(sr=sample_rate, n_fft=n_fft)
+    if max_frequency is None:
+        max_frequency = sample_rate / 2
+    in_range = np.flatnonzero((bin_frequencies >= min_frequency) & (bin_frequencies <= max_frequency))
+    if not len(in_range):
+        raise ValueError("No frequencies in the requested range")
+    low_bin, high_bin = in_range[0], in_range[-1] + 1
+    n_bins = high_bin - low_bin
+    n_rows = max(1, min(height or n_bins, n_bins))
+    
+    # First bin of each row and first frame of each column
+    row_starts = np.flatnonzero(np.r_[True, np.diff(np.arange(n_bins) * n_rows // n_bins) > 0])
+    column_of_frame = np.arange(n_frames) * n_columns // n_frames
+    reduce = np.maximum.reduceat if pooling == 'max' else np.add.reduceat
+    pooled = np.zeros((n_rows, n_columns), dtype=np.float64)
+    
+    for first in range(0, n_frames, chunk_frames):
+        last = min(first + chunk_frames, n_frames)
+        # Frames centred on their hop like librosa.stft(center=True)
+        start = start_sample + first * hop_length - n_fft // 2
+        y = read_padded(audio, start, start + (last - first - 1) * hop_length + n_fft)
+        power = np.abs(librosa.stft(y, n_fft=n_fft, hop_length=hop_length, center=False)[low_bin:high_bin]) ** 2
+        power = reduce(power, row_starts, axis=0)
+        
+        # Pool the chunk's frames into their columns (a column may continue in the next chunk)
+        columns = column_of_frame[first:last]
+        starts = np.flatnonzero(np.r_[True, columns[1:] != columns[:-1]])
+        block = reduce(power, starts, axis=1)
+        if pooling == 'max':
+            pooled[:, columns[starts]] = np.maximum(pooled[:, columns[starts]], block)
+        else:
+            pooled[:, columns[starts]] += block
+    
+    if pooling == 'mean':
+        bins_per_row = np.diff(np.r_[row_starts, n_bins])
+        frames_per_column = np.bincount(column_of_frame, minlength=n_columns)
+        pooled /= np.outer(bins_per_row, frames_per_column)
+    
+    db = 10.0 * np.log10(np.maximum(pooled, _AMIN))
+    db_max = float(db.max())
+    db_min = db_max - top_db
+    values = np.clip((db - db_min) * (255.0 / top_db), 0, 255).round().astype(np.uint8)
+    
+    row_frequencies = np.add.reduceat(bin_frequencies[low_bin:high_bin], row_starts) / np.diff(np.r_[row_starts, n_bins])
+    header = {
+        'version': 1,
+        'rows': n_rows,
+        'columns': n_columns,
+        'start_seconds': start_sample / sample_rate,
+        'end_seconds': (start_sample + n_samples) / sample_rate,
+        'seconds_per_column': n_samples / sample_rate / n_columns,
+        'frequencies': [round(float(frequency), 2) for frequency in row_frequencies],
+        'frequency_scale': 'linear',
+        'db_min': db_min,
+        'db_max': db_max,
+        'pooling': pooling,
+        'sample_rate': sample_rate,
+        'n_fft': n_fft,
+        'hop_length': hop_length,
+    }
+    return values, header
+
+
+def average_spectrum(audio, start_sample, end_sample, max_points=512, n_fft=4096, chunk_frames=1024):
+    """
+    Mean power spectrum of a sample range (Welch's method without overlap), in dB.
+    
+    Parameters:
+    - audio: AudioSource of the recording.
+    - start_sample, end_sample (int): Sample range.
+    - max_points (int): Adjacent FFT bins are averaged down to at most this many points.
+    - n_fft (int): FFT size.
+    - chunk_frames (int): FFT frames computed at once.
+    
+    Returns:
+    - dict: 'frequencies' (Hz) and 'magnitudes' (dB, ref 1.0) lists
+    """
+    frequencies = librosa.fft_frequencies(sr=audio.sample_rate, n_fft=n_fft)
+    total = np.zeros(len(frequencies))
+    n_frames = max(1, (end_sample - start_sample) // n_fft)
+    for first in range(0, n_frames, chunk_frames):
+        last = min(first + chunk_frames, n_frames)
+        start = start_sample + first * n_fft
+        y = read_padded(audio, start, start + (last - first) * n_fft)
+        total += (np.abs(librosa.stft(y, n_fft=n_fft, hop_length=n_fft, center=False)) ** 2).sum(axis=1)
+    power = total / n_frames
+    
+    group = -(-len(frequencies) // max_points)
+    starts = np.arange(0, len(frequencies), group)
+    counts = np.diff(np.r_[starts, len(frequencies)])
+    return {
+        'frequencies': [round(float(f), 2) for f in np.add.reduceat(frequencies, starts) / counts],
+        'magnitudes': [round(float(m), 2) for m in 10.0 * np.log10(np.maximum(np.add.reduceat(power, starts) / counts, _AMIN))],
+    }
+
+
+def encode_spectrogram_matrix(values, header):
+    """Pack a matrix from spectrogram_matrix into the binary format described above"""
+    header_bytes = json.dumps(header).encode('utf-8')
+    return struct.pack('<I', len(header_bytes)) + header_bytes + np.ascontiguousarray(values, dtype=np.uint8).tobytes()
+
+
+def decode_spectrogram_matrix(data):
+    """
+    Unpack the binary format
+    
+    Returns:
+    - tuple: (uint8 array of shape (rows, columns), header dict)
+    """
+    (header_length,) = struct.unpack_from('<I', data)
+    header = json.loads(data[4:4 + header_length].decode('utf-8'))
+    values = np.frombuffer(data, dtype=np.uint8, offset=4 + header_length).reshape(header['rows'], header['columns'])
+    return values, header
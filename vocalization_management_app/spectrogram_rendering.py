@@ -0,0 +1,245 @@
+"""
+Fast spectrogram image rendering.
+
+Spectrogram matrices are mapped through a 256-entry colormap lookup table straight into a
+uint8 RGB array and written with Pillow, which takes milliseconds where building a
+matplotlib figure and saving it at 300 dpi takes seconds. Optional axis annotation draws
+time and frequency ticks with Pillow as well. The matplotlib figure is kept as the
+'publication' renderer (SPECTROGRAM_RENDERER setting).
+
+Nothing here imports Django, so clip images can be rendered in worker processes that
+never set Django up (see clip_rendering).
+"""
+import os
+from functools import lru_cache
+import numpy as np
+import librosa
+from PIL import Image, ImageDraw, ImageFont
+
+# Margins (pixels) added around the spectrogram when axes are annotated
+AXIS_LEFT_MARGIN = 56
+AXIS_BOTTOM_MARGIN = 22
+
+SPECTROGRAM_TITLES = {'mel': "Mel Spectrogram", 'linear': "Linear Spectrogram", 'chroma': "Chromagram"}
+
+
+@lru_cache(maxsize=None)
+def colormap_lut(name='magma'):
+    """
+    Get the 256-colour lookup table of a matplotlib colormap as a (256, 3) uint8 array
+    """
+    from matplotlib import colormaps
+    return (colormaps[name](np.linspace(0.0, 1.0, 256))[:, :3] * 255).round().astype(np.uint8)
+
+
+def spectrogram_to_rgb(S, colormap='magma', top_db=80.0, vmax=None):
+    """
+    Map a spectrogram (frequency x time) to an RGB image array with low frequencies at the bottom.
+    
+    Parameters:
+    - S (numpy.ndarray): Spectrogram values, in dB unless top_db is None.
+    - colormap (str): Name of a matplotlib colormap.
+    - top_db (float or None): Dynamic range shown below the maximum; None scales min..max.
+    - vmax (float, optional): Value shown as the top colour, instead of the maximum of S
+      (tiles of one image must share the scale of the whole image).
+    
+    Returns:
+    - numpy.ndarray: uint8 array of shape (frequencies, times, 3)
+    """
+    S = np.asarray(S, dtype=np.float32)
+    if vmax is None:
+        vmax = float(S.max()) if S.size else 0.0
+    vmin = vmax - top_db if top_db is not None else (float(S.min()) if S.size else 0.0)
+    scale = 255.0 / max(vmax - vmin, 1e-12)
+    indices = np.clip((S - vmin) * scale, 0, 255).astype(np.uint8)
+    return colormap_lut(colormap)[indices[::-1]]
+
+
+def render_spectrogram(S, output_path, colormap='magma', top_db=80.0, width=None, height=400,
+                       annotate=False, duration=None, frequencies=None, title=None):
+    """
+    Render a spectrogram matrix to a PNG or WebP image (format taken from output_path).
+    
+    Parameters:
+    - S (numpy.ndarray): Spectrogram values (frequency x time).
+    - output_path (str): Destination file, '.png' or '.webp'.
+    - colormap (str): Name of a matplotlib colormap.
+    - top_db (float or None): Dynamic range in dB, None for non-dB data such as chroma.
+    - width (int, optional): Image width in pixels; defaults to one pixel per column (at most 4096).
+    - height (int): Image height in pixels.
+    - annotate (bool): Draw time and frequency axes.
+    - duration (float, optional): Length of the audio in seconds, for the time axis.
+    - frequencies (array, optional): Centre frequency (Hz) of each row, for the frequency axis.
+    - title (str, optional): Drawn in the top left corner when annotating.
+    
+    Returns:
+    - str: output_path
+    """
+    rgb = spectrogram_to_rgb(S, colormap=colormap, top_db=top_db)
+    if width is None:
+        width = min(max(rgb.shape[1], 1), 4096)
+    image = Image.fromarray(rgb).resize((width, height), Image.Resampling.BILINEAR)
+    
+    if annotate:
+        image = _annotate_axes(image, duration, frequencies, title)
+    
+    save_image(image, output_path)
+    return output_path
+
+
+def save_image(image, output_path):
+    """Write a PIL image as PNG or WebP (by extension) with fast encoder settings"""
+    # Encoding dominates the render time, so favour speed over the last few percent of size
+    if output_path.lower().endswith('.webp'):
+        image.save(output_path, quality=85, method=0)
+    else:
+        image.save(output_path, compress_level=1)
+
+
+def _annotate_axes(image, duration, frequencies, title):
+    """Add time and frequency tick labels around a rendered spectrogram"""
+    width, height = image.size
+    canvas = Image.new('RGB', (width + AXIS_LEFT_MARGIN, height + AXIS_BOTTOM_MARGIN), 'white')
+    canvas.paste(image, (AXIS_LEFT_MARGIN, 0))
+    draw = ImageDraw.Draw(canvas)
+    font = ImageFont.load_default()
+    
+    if duration:
+        for tick in np.linspace(0, duration, 6):
+            x = AXIS_LEFT_MARGIN + int(round(tick / duration * (width - 1)))
+            draw.line([(x, height), (x, height + 4)], fill='black')
+            label = f"{tick:.1f}s" if duration < 60 else f"{int(tick // 60)}:{int(tick % 60):02d}"
+            draw.text((min(x, AXIS_LEFT_MARGIN + width - 30), height + 6), label, fill='black', font=font)
+    
+    if frequencies is not None and len(frequencies):
+        rows = len(frequencies)
+        for row in np.linspace(0, rows - 1, 5).round().astype(int):
+            y = height - 1 - int(round(row / max(rows - 1, 1) * (height - 1)))
+            draw.line([(AXIS_LEFT_MARGIN - 4, y), (AXIS_LEFT_MARGIN, y)], fill='black')
+            frequency = frequencies[row]
+            label = f"{frequency / 1000:.1f}k" if frequency >= 1000 else f"{frequency:.0f}"
+            draw.text((2, max(y - 6, 0)), f"{label}Hz", fill='black', font=font)
+    
+    if title:
+        draw.text((AXIS_LEFT_MARGIN + 4, 2), title, fill='white', font=font)
+    return canvas
+
+
+def compute_spectrogram_db(y, sr, spectrogram_type='mel', hop_length=512):
+    """
+    Compute the spectrogram of a block of samples in the scale it is plotted in.
+    
+    Parameters:
+    - y (numpy.ndarray): Mono float samples (as librosa.load returns them).
+    - sr (int): Sample rate.
+    - spectrogram_type (str): 'mel', 'linear' or 'chroma'; anything else gives a default mel spectrogram.
+    - hop_length (int): STFT hop in samples.
+    
+    Returns:
+    - numpy.ndarray: dB values for 'mel' and 'linear', chroma energies for 'chroma'
+    """
+    if spectrogram_type == 'mel':
+        # Mel spectrogram (good for general audio analysis)
+        S = librosa.feature.melspectrogram(y=y, sr=sr, n_mels=128, fmax=sr / 2, hop_length=hop_length)
+        return librosa.power_to_db(S, ref=np.max)
+    if spectrogram_type == 'linear':
+        # Linear spectrogram (standard STFT)
+        S = np.abs(librosa.stft(y, hop_length=hop_length))
+        return librosa.amplitude_to_db(S, ref=np.max)
+    if spectrogram_type == 'chroma':
+        # Chromagram (good for tonal content)
+        return librosa.feature.chroma_stft(y=y, sr=sr, hop_length=hop_length)
+    # Default to mel spectrogram
+    S = librosa.feature.melspectrogram(y=y, sr=sr)
+    return librosa.power_to_db(S, ref=np.max)
+
+
+def render_spectrogram_image(S_dB, output_path, sr, hop_length, spectrogram_type='mel', renderer='fast',
+                             annotate=True):
+    """
+    Render a computed spectrogram to an image file with the chosen renderer.
+    
+    Parameters:
+    - S_dB (numpy.ndarray): Spectrogram from compute_spectrogram_db (or SpectrogramAccumulator).
+    - output_path (str): Destination file ('.png' for the publication renderer).
+    - sr, hop_length (int): Sample rate and hop of the spectrogram columns, for the time axis.
+    - spectrogram_type (str): 'mel', 'linear' or 'chroma'.
+    - renderer (str): 'fast' (colormap lookup and Pillow) or 'publication' (matplotlib, 300 dpi).
+    - annotate (bool): Draw time and frequency axes (fast renderer; publication always has them).
+    
+    Returns:
+    - str: output_path
+    """
+    title = SPECTROGRAM_TITLES.get(spectrogram_type, "Mel Spectrogram")
+    if renderer == 'publication':
+        import matplotlib.pyplot as plt
+        from librosa.display import specshow
+        
+        # Publication quality: matplotlib figure with labelled axes and a colorbar
+        plt.figure(figsize=(10, 4))
+        specshow(S_dB, sr=sr, hop_length=hop_length, x_axis='time', y_axis='mel' if spectrogram_type != 'chroma' else 'chroma')
+        plt.colorbar(format='%+2.0f dB')
+        plt.title(title)
+        plt.savefig(output_path, bbox_inches='tight', dpi=300)
+        plt.close()
+        return output_path
+    
+    # Fast path: colormap lookup table straight to an image with Pillow
+    if spectrogram_type == 'chroma':
+        row_frequencies = None
+    elif spectrogram_type == 'linear':
+        row_frequencies = np.linspace(0, sr / 2, S_dB.shape[0])
+    else:
+        row_frequencies = librosa.mel_frequencies(n_mels=S_dB.shape[0], fmax=sr / 2)
+    return render_spectrogram(
+        S_dB, output_path,
+        top_db=None if spectrogram_type == 'chroma' else 80.0,
+        annotate=annotate,
+        duration=S_dB.shape[1] * hop_length / sr,
+        frequencies=row_frequencies,
+        title=title
+    )
+
+
+def render_clip_spectrogram(file_path, start_sample, end_sample, output_path, spectrogram_type='mel',
+                            renderer='fast', annotate=True):
+    """
+    Render the spectrogram image of one clip of a recording (a process pool job).
+    
+    The clip is read from a memory mapping of the recording, so only its own samples are
+    loaded. The image is written under a temporary name and renamed into place, so a
+    viewer never sees a half-written file.
+    
+    Parameters:
+    - file_path (str): Path to the recording.
+    - start_sample, end_sample (int): Sample range of the clip.
+    - output_path (str): Destination image file.
+    - spectrogram_type, renderer, annotate: As render_spectrogram_image.
+    
+    Returns:
+    - str: output_path
+    """
+    from .audio_access import AudioSource
+    
+    with AudioSource(file_path) as audio:
+        y, sr = audio.normalized(start_sample, end_sample), audio.sample_rate
+    S_dB = compute_spectrogram_db(y, sr, spectrogram_type)
+    
+    root, extension = os.path.splitext(output_path)
+    temp_path = f"{root}.{os.getpid()}.tmp{extension}"
+    try:
+        render_spectrogram_image(S_dB, temp_path, sr, 512, spectrogram_type, renderer=renderer, annotate=annotate)
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return output_path
+
+
+def lower_process_priority(niceness):
+    """Process pool initializer: run rendering workers below the processing jobs"""
+    if niceness and hasattr(os, 'nice'):
+        try:
+            os.nice(niceness)
+        except OSError:
+            pass
@@ -0,0 +1,254 @@
+"""
+Multi-resolution tile pyramids for zoomable spectrograms of long recordings.
+
+The spectrogram is computed chunk by chunk and cut into fixed-size image tiles at several
+zoom levels, so a viewer only loads the tiles covering what is on screen. The deepest zoom
+level shows one STFT frame (hop_length samples) per pixel column; every level above it
+halves the time resolution (and the frequency resolution, until the frequency axis fits in
+one tile), up to zoom 0 where the whole recording fits in a single tile.
+
+Layout of a pyramid directory:
+
+    manifest.json          sizes and scales of every level
+    <zoom>/<x>_<y>.<ext>   tile x along time (0 = start) and y along frequency (0 = top)
+
+Tiles on the right and bottom edges of a level are smaller than tile_size.
+"""
+import json
+import math
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+import librosa
+from PIL import Image
+from .spectrogram_rendering import spectrogram_to_rgb, save_image
+
+MANIFEST_NAME = 'manifest.json'
+
+# Spectrogram types that can be tiled (chroma has too few rows to zoom into)
+PYRAMID_TYPES = ('mel', 'linear')
+
+# Floor of the dB values, as librosa.power_to_db(amin=1e-10)
+_AMIN = 1e-10
+
+
+def build_spectrogram_pyramid(audio, output_dir, spectrogram_type='mel', tile_size=256, n_fft=2048,
+                              hop_length=512, colormap='magma', top_db=80.0, image_format='png',
+                              chunk_frames=4096):
+    """
+    Render a tile pyramid of a recording's spectrogram into output_dir.
+    
+    Two passes keep memory bounded for recordings of any length: the first computes the
+    STFT one chunk of frames at a time and stores the dB columns in a temporary float16
+    memory map (the colour scale needs the maximum of the whole recording); the second
+    cuts the columns into tiles, pooling pairs of columns/rows for each coarser level as
+    the tiles are written. An existing pyramid in output_dir is replaced once the new
+    one is complete.
+    
+    Parameters:
+    - audio: AudioSource of the recording (samples are read with normalized()).
+    - output_dir (str): Directory of the pyramid.
+    - spectrogram_type (str): 'mel' or 'linear'.
+    - tile_size (int): Width and height of a tile in pixels.
+    - n_fft, hop_length (int): STFT frame layout, as librosa.stft.
+    - colormap (str): Name of a matplotlib colormap.
+    - top_db (float): Dynamic range shown below the loudest point of the recording.
+    - image_format (str): 'png' or 'webp'.
+    - chunk_frames (int): STFT frames computed at once.
+    
+    Returns:
+    - dict: The pyramid manifest
+    """
+    if spectrogram_type not in PYRAMID_TYPES:
+        raise ValueError(f"Cannot build a tile pyramid for {spectrogram_type} spectrograms")
+    
+    sample_rate = audio.sample_rate
+    n_samples = len(audio)
+    n_frames = 1 + n_samples // hop_length
+    if spectrogram_type == 'mel':
+        basis = librosa.filters.mel(sr=sample_rate, n_fft=n_fft, n_mels=128, fmax=sample_rate / 2)
+        frequencies = librosa.mel_frequencies(n_mels=128, fmax=sample_rate / 2)
+    else:
+        basis = None
+        frequencies = librosa.fft_frequencies(sr=sample_rate, n_fft=n_fft)
+    n_rows = len(frequencies)
+    
+    output_dir = os.path.abspath(output_dir)
+    parent_dir = os.path.dirname(output_dir)
+    os.makedirs(parent_dir, exist_ok=True)
+    work_dir = tempfile.mkdtemp(prefix='.tiles-', dir=parent_dir)
+    try:
+        # Pass 1: dB value of every frame, centred like librosa.stft(center=True)
+        columns = np.memmap(os.path.join(work_dir, 'columns.dat'), dtype=np.float16, mode='w+',
+                            shape=(n_rows, n_frames))
+        vmax = 10.0 * math.log10(_AMIN)
+        for first in range(0, n_frames, chunk_frames):
+            last = min(first + chunk_frames, n_frames)
+            start = first * hop_length - n_fft // 2
+            y = read_padded(audio, start, start + (last - first - 1) * hop_length + n_fft)
+            power = np.abs(librosa.stft(y, n_fft=n_fft, hop_length=hop_length, center=False)) ** 2
+            if basis is not None:
+                power = basis @ power
+            db = 10.0 * np.log10(np.maximum(power, _AMIN))
+            columns[:, first:last] = db
+            vmax = max(vmax, float(db.max()))
+        columns.flush()
+        
+        # Pass 2: tiles of every level, deepest first
+        writer = _PyramidWriter(os.path.join(work_dir, 'tiles'), n_rows, n_frames, tile_size, image_format,
+                                colormap, top_db, vmax)
+        strip = tile_size * max(1, chunk_frames // tile_size)
+        for first in range(0, n_frames, strip):
+            writer.add_columns(np.asarray(columns[:, first:first + strip], dtype=np.float32),
+                               final=first + strip >= n_frames)
+        del columns
+        
+        manifest = {
+            'spectrogram_type': spectrogram_type,
+            'version': int(time.time()),
+            'tile_size': tile_size,
+            'image_format': image_format,
+            'max_zoom': writer.max_zoom,
+            'sample_rate': sample_rate,
+            'n_fft': n_fft,
+            'hop_length': hop_length,
+            'duration': n_samples / sample_rate,
+            'frequency_scale': spectrogram_type,
+            'min_frequency': float(frequencies[0]),
+            'max_frequency': float(frequencies[-1]),
+            'colormap': colormap,
+            'top_db': top_db,
+            'levels': [
+                {
+                    'zoom': zoom,
+                    'width': width,
+                    'height': height,
+                    'tiles_x': -(-width // tile_size),
+                    'tiles_y': -(-height // tile_size),
+                    'seconds_per_pixel': hop_length * writer.time_factor(zoom) / sample_rate,
+                }
+                for zoom, (width, height) in enumerate(writer.level_sizes)
+            ],
+        }
+        with open(os.path.join(work_dir, 'tiles', MANIFEST_NAME), 'w') as manifest_file:
+            json.dump(manifest, manifest_file)
+        
+        # Swap the finished pyramid in
+        if os.path.exists(output_dir):
+            shutil.rmtree(output_dir)
+        os.replace(os.path.join(work_dir, 'tiles'), output_dir)
+        return manifest
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def read_pyramid_manifest(pyramid_dir):
+    """
+    Load the manifest of a tile pyramid
+    Returns None if no pyramid has been built in pyramid_dir
+    """
+    try:
+        with open(os.path.join(pyramid_dir, MANIFEST_NAME)) as manifest_file:
+            return json.load(manifest_file)
+    except FileNotFoundError:
+        return None
+
+
+def tile_path(pyramid_dir, zoom, x, y, image_format='png'):
+    """Path of one tile inside a pyramid directory"""
+    return os.path.join(pyramid_dir, str(zoom), f"{x}_{y}.{image_format}")
+
+
+def read_padded(audio, start, end):
+    """Normalized samples start..end of an AudioSource, zero-padded outside the recording"""
+    n_samples = len(audio)
+    block = audio.normalized(max(start, 0), max(min(end, n_samples), 0))
+    before = max(0, -start)
+    after = (end - start) - before - len(block)
+    if before or after:
+        block = np.pad(block, (before, after))
+    return block
+
+
+def _pool_pairs(power, axis):
+    """Average adjacent pairs along an axis (an odd last element is kept as it is)"""
+    n = power.shape[axis]
+    if n < 2:
+        return power
+    even = n - n % 2
+    first = np.take(power, np.arange(0, even, 2), axis=axis)
+    second = np.take(power, np.arange(1, even, 2), axis=axis)
+    pooled = (first + second) * 0.5
+    if n % 2:
+        pooled = np.concatenate([pooled, np.take(power, [n - 1], axis=axis)], axis=axis)
+    return pooled
+
+
+class _PyramidWriter:
+    """
+    Streams dB columns of the deepest level in and writes the tiles of every level.
+    Each level keeps the columns that don't yet fill a whole tile column; completed
+    columns are written and then pooled into the next coarser level.
+    """
+    
+    def __init__(self, tiles_dir, n_rows, n_frames, tile_size, image_format, colormap, top_db, vmax):
+        self.tiles_dir = tiles_dir
+        self.tile_size = tile_size
+        self.image_format = image_format
+        self.colormap = colormap
+        self.top_db = top_db
+        self.vmax = vmax
+        # Zoom level at which each axis reaches its full resolution
+        self.time_zoom = max(0, math.ceil(math.log2(n_frames / tile_size)))
+        self.row_zoom = max(0, math.ceil(math.log2(n_rows / tile_size)))
+        self.max_zoom = max(self.time_zoom, self.row_zoom)
+        self.level_sizes = [
+            (-(-n_frames // self.time_factor(zoom)), -(-n_rows // self.row_factor(zoom)))
+            for zoom in range(self.max_zoom + 1)
+        ]
+        self.pending = [None] * (self.max_zoom + 1)
+        self.next_x = [0] * (self.max_zoom + 1)
+        for zoom in range(self.max_zoom + 1):
+            os.makedirs(os.path.join(tiles_dir, str(zoom)), exist_ok=True)
+    
+    def time_factor(self, zoom):
+        """Frames per pixel column at a zoom level"""
+        return 2 ** max(0, self.time_zoom - zoom)
+    
+    def row_factor(self, zoom):
+        """Frequency bins per pixel row at a zoom level"""
+        return 2 ** max(0, self.row_zoom - zoom)
+    
+    def add_columns(self, db, final=False):
+        """Add the next dB columns (rows x columns) of the deepest level"""
+        self._push(self.max_zoom, db, final)
+    
+    def _push(self, zoom, db, final):
+        if self.pending[zoom] is not None:
+            db = np.concatenate([self.pending[zoom], db], axis=1)
+        ready = db.shape[1] if final else db.shape[1] - db.shape[1] % self.tile_size
+        done, self.pending[zoom] = db[:, :ready], db[:, ready:]
+        if ready:
+            self._write_tiles(zoom, done)
+        if zoom > 0 and (ready or final):
+            self._push(zoom - 1, self._pool(zoom, done), final)
+    
+    def _pool(self, zoom, db):
+        """Pool a block of level zoom into level zoom - 1 (averaging power, not dB)"""
+        power = np.power(np.float32(10.0), db / np.float32(10.0))
+        if self.time_factor(zoom - 1) > self.time_factor(zoom):
+            power = _pool_pairs(power, axis=1)
+        if self.row_factor(zoom - 1) > self.row_factor(zoom):
+            power = _pool_pairs(power, axis=0)
+        return 10.0 * np.log10(np.maximum(power, _AMIN))
+    
+    def _write_tiles(self, zoom, db):
+        rgb = spectrogram_to_rgb(db, colormap=self.colormap, top_db=self.top_db, vmax=self.vmax)
+        size = self.tile_size
+        for column in range(0, rgb.shape[1], size):
+            for row in range(0, rgb.shape[0], size):
+                path = tile_path(self.tiles_dir, zoom, self.next_x[zoom], row // size, self.image_format)
+                save_image(Image.fromarray(rgb[row:row + size, column:column + size]), path)
+            self.next_x[zoom] += 1
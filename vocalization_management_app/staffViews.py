@@ -2,7 +2,7 @@ from django.shortcuts import render, redirect, get_object_or_404, HttpResponse
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from .models import OriginalAudioFile, Database, ProcessingLog, Spectrogram, DetectedNoiseAudioFile
-from .audio_processing import process_pending_audio_files, get_processing_status
+from .audio_processing import process_pending_audio_files, get_processing_status, spectrogram_tiles_url, spectrogram_image_url, waveform_peaks_url, audio_stream_url
 
 @login_required
 def staff_home(request):
@@ -119,11 +119,10 @@ def view_spectrograms(request, file_id):
         # Prepare data for the template
         clips_data = []
         for noise in detected_noises:
-            # Find the corresponding spectrogram if it exists
-            spec = spectrograms.filter(start_time=noise.start_time, end_time=noise.end_time).first()
             clips_data.append({
                 'audio_clip': noise,
-                'spectrogram': spec,
+                # Rendered on first request
+                'spectrogram_url': spectrogram_image_url(original_file, 'mel', noise.start_time, noise.end_time),
                 'start_time': noise.start_time,
                 'end_time': noise.end_time
             })
@@ -138,7 +137,11 @@ def view_spectrograms(request, file_id):
             'processing_logs': processing_logs,
             'processing_status': processing_status,
             'detected_noises': detected_noises,
-            'total_impulses': total_impulses
+            'total_impulses': total_impulses,
+            'spectrogram_tiles_url': spectrogram_tiles_url(original_file),
+            'full_spectrogram_url': spectrogram_image_url(original_file),
+            'waveform_peaks_url': waveform_peaks_url(original_file),
+            'audio_stream_url': audio_stream_url(original_file)
         }
         
         return render(request, 'common/view_spectrograms.html', context)
@@ -0,0 +1,267 @@
+/**
+ * Tiled Spectrogram Viewer
+ * Pans and zooms a pre-rendered spectrogram tile pyramid, loading only the visible tiles
+ */
+
+document.addEventListener('DOMContentLoaded', function() {
+    // Initialize the tiled viewer
+    initializeTiledSpectrogram();
+});
+
+function initializeTiledSpectrogram() {
+    // Get DOM elements
+    const canvas = document.getElementById('tiledSpectrogram');
+    const status = document.getElementById('tiledSpectrogramStatus');
+    const zoomInBtn = document.getElementById('tileZoomInBtn');
+    const zoomOutBtn = document.getElementById('tileZoomOutBtn');
+    const zoomResetBtn = document.getElementById('tileZoomResetBtn');
+    const audioPlayer = document.getElementById('audioPlayer');
+    
+    // Skip if the page has no tile pyramid
+    if (!canvas || !canvas.dataset.manifestUrl) {
+        return;
+    }
+    
+    const ctx = canvas.getContext('2d', { alpha: false });
+    const tileCache = new Map();
+    const maxCachedTiles = 512;
+    
+    // View state: time at the left edge and seconds per screen pixel
+    let manifest = null;
+    let viewStart = 0;
+    let secondsPerPixel = 1;
+    let minSecondsPerPixel = 0;
+    let maxSecondsPerPixel = 1;
+    let drawPending = false;
+    
+    function setStatus(text, className) {
+        if (status) {
+            status.textContent = text;
+            status.className = 'badge ' + className;
+        }
+    }
+    
+    // Load the pyramid manifest, then show the whole recording
+    fetch(canvas.dataset.manifestUrl, { credentials: 'same-origin' })
+        .then(response => response.json())
+        .then(result => {
+            if (!result.success) {
+                throw new Error(result.message);
+            }
+            manifest = result.data;
+            resizeCanvas();
+            resetView();
+            setupEventListeners();
+            setStatus('Ready', 'bg-success');
+        })
+        .catch(e => {
+            console.error('Error loading spectrogram tiles:', e);
+            setStatus('Tiles unavailable', 'bg-danger');
+        });
+    
+    function resizeCanvas() {
+        canvas.width = canvas.offsetWidth || 800;
+        canvas.height = canvas.offsetHeight || 300;
+    }
+    
+    function resetView() {
+        // Fully zoomed out shows the whole recording; fully zoomed in shows 4 screen pixels per STFT frame
+        maxSecondsPerPixel = manifest.duration / canvas.width;
+        minSecondsPerPixel = manifest.levels[manifest.max_zoom].seconds_per_pixel / 4;
+        secondsPerPixel = maxSecondsPerPixel;
+        viewStart = 0;
+        requestDraw();
+    }
+    
+    function clampView() {
+        secondsPerPixel = Math.min(maxSecondsPerPixel, Math.max(minSecondsPerPixel, secondsPerPixel));
+        const visible = secondsPerPixel * canvas.width;
+        viewStart = Math.min(Math.max(0, viewStart), Math.max(0, manifest.duration - visible));
+    }
+    
+    // Zoom by a factor, keeping the time under screen position x in place
+    function zoomAt(factor, x) {
+        const anchor = viewStart + x * secondsPerPixel;
+        secondsPerPixel /= factor;
+        clampView();
+        viewStart = anchor - x * secondsPerPixel;
+        clampView();
+        requestDraw();
+    }
+    
+    // Most zoomed-out level that still has at least one level pixel per screen pixel
+    function levelForView() {
+        for (const level of manifest.levels) {
+            if (level.seconds_per_pixel <= secondsPerPixel) {
+                return level;
+            }
+        }
+        return manifest.levels[manifest.max_zoom];
+    }
+    
+    function tileUrl(zoom, x, y) {
+        return manifest.tile_url.replace('{z}', zoom).replace('{x}', x).replace('{y}', y) + '?v=' + manifest.version;
+    }
+    
+    // Get a tile image, starting its download if needed; returns null until it has loaded
+    function getTile(zoom, x, y, load) {
+        const key = `${zoom}/${x}/${y}`;
+        let entry = tileCache.get(key);
+        if (!entry) {
+            if (!load) return null;
+            entry = { image: new Image(), loaded: false };
+            entry.image.onload = () => {
+                entry.loaded = true;
+                requestDraw();
+            };
+            entry.image.src = tileUrl(zoom, x, y);
+            tileCache.set(key, entry);
+            
+            // Forget the oldest tiles once the cache is full
+            if (tileCache.size > maxCachedTiles) {
+                tileCache.delete(tileCache.keys().next().value);
+            }
+        }
+        return entry.loaded ? entry.image : null;
+    }
+    
+    // Draw the tiles of one level that cover the view
+    function drawLevel(level, load) {
+        const tileSize = manifest.tile_size;
+        const tileSeconds = tileSize * level.seconds_per_pixel;
+        const firstX = Math.max(0, Math.floor(viewStart / tileSeconds));
+        const lastX = Math.min(level.tiles_x - 1, Math.floor((viewStart + canvas.width * secondsPerPixel) / tileSeconds));
+        const rowScale = canvas.height / level.height;
+        
+        for (let x = firstX; x <= lastX; x++) {
+            for (let y = 0; y < level.tiles_y; y++) {
+                const image = getTile(level.zoom, x, y, load);
+                if (!image) continue;
+                
+                const left = (x * tileSeconds - viewStart) / secondsPerPixel;
+                const width = image.width * level.seconds_per_pixel / secondsPerPixel;
+                ctx.drawImage(image, left, y * tileSize * rowScale, width, image.height * rowScale);
+            }
+        }
+    }
+    
+    function requestDraw() {
+        if (!drawPending) {
+            drawPending = true;
+            requestAnimationFrame(draw);
+        }
+    }
+    
+    function draw() {
+        drawPending = false;
+        if (!manifest) return;
+        
+        ctx.fillStyle = 'black';
+        ctx.fillRect(0, 0, canvas.width, canvas.height);
+        
+        // Coarser levels already loaded fill in while the tiles of the current level download
+        const level = levelForView();
+        for (const coarser of manifest.levels) {
+            if (coarser.zoom >= level.zoom) break;
+            drawLevel(coarser, false);
+        }
+        drawLevel(level, true);
+        
+        drawPlayhead();
+        drawTimeLabels();
+    }
+    
+    function drawPlayhead() {
+        if (!audioPlayer || !audioPlayer.currentTime) return;
+        
+        const x = (audioPlayer.currentTime - viewStart) / secondsPerPixel;
+        if (x >= 0 && x <= canvas.width) {
+            ctx.strokeStyle = 'red';
+            ctx.beginPath();
+            ctx.moveTo(x, 0);
+            ctx.lineTo(x, canvas.height);
+            ctx.stroke();
+        }
+    }
+    
+    function drawTimeLabels() {
+        ctx.fillStyle = 'rgba(0, 0, 0, 0.6)';
+        ctx.fillRect(0, canvas.height - 16, canvas.width, 16);
+        ctx.fillStyle = 'white';
+        ctx.font = '10px Arial';
+        
+        ctx.textAlign = 'left';
+        ctx.fillText(formatTileTime(viewStart), 4, canvas.height - 4);
+        ctx.textAlign = 'right';
+        ctx.fillText(formatTileTime(viewStart + canvas.width * secondsPerPixel), canvas.width - 4, canvas.height - 4);
+        ctx.textAlign = 'center';
+        ctx.fillText(`${Math.round(manifest.min_frequency)}-${Math.round(manifest.max_frequency)} Hz (${manifest.frequency_scale})`,
+                     canvas.width / 2, canvas.height - 4);
+    }
+    
+    // Format time in HH:MM:SS.s
+    function formatTileTime(seconds) {
+        const hrs = Math.floor(seconds / 3600);
+        const mins = Math.floor((seconds % 3600) / 60);
+        const secs = (seconds % 60).toFixed(1);
+        
+        return `${hrs.toString().padStart(2, '0')}:${mins.toString().padStart(2, '0')}:${secs.padStart(4, '0')}`;
+    }
+    
+    // Set up event listeners
+    function setupEventListeners() {
+        // Mouse wheel zooms around the cursor
+        canvas.addEventListener('wheel', function(event) {
+            event.preventDefault();
+            zoomAt(event.deltaY < 0 ? 1.25 : 0.8, event.offsetX);
+        }, { passive: false });
+        
+        // Dragging pans
+        let dragX = null;
+        canvas.addEventListener('mousedown', function(event) {
+            dragX = event.clientX;
+        });
+        window.addEventListener('mousemove', function(event) {
+            if (dragX === null) return;
+            viewStart -= (event.clientX - dragX) * secondsPerPixel;
+            dragX = event.clientX;
+            clampView();
+            requestDraw();
+        });
+        window.addEventListener('mouseup', function() {
+            dragX = null;
+        });
+        
+        // Double click seeks the audio player
+        canvas.addEventListener('dblclick', function(event) {
+            if (audioPlayer) {
+                audioPlayer.currentTime = viewStart + event.offsetX * secondsPerPixel;
+                requestDraw();
+            }
+        });
+        
+        if (zoomInBtn) {
+            zoomInBtn.addEventListener('click', () => zoomAt(2, canvas.width / 2));
+        }
+        if (zoomOutBtn) {
+            zoomOutBtn.addEventListener('click', () => zoomAt(0.5, canvas.width / 2));
+        }
+        if (zoomResetBtn) {
+            zoomResetBtn.addEventListener('click', resetView);
+        }
+        
+        if (audioPlayer) {
+            audioPlayer.addEventListener('timeupdate', requestDraw);
+        }
+        
+        window.addEventListener('resize', function() {
+            const center = viewStart + canvas.width * secondsPerPixel / 2;
+            resizeCanvas();
+            maxSecondsPerPixel = manifest.duration / canvas.width;
+            clampView();
+            viewStart = center - canvas.width * secondsPerPixel / 2;
+            clampView();
+            requestDraw();
+        });
+    }
+}
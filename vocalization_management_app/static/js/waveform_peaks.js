@@ -0,0 +1,208 @@
+/**
+ * Waveform Peaks Viewer
+ * Draws the min/max peaks of the visible window of a recording, fetched from its precomputed peak pyramid
+ */
+
+document.addEventListener('DOMContentLoaded', function() {
+    // Initialize the waveform viewer
+    initializeWaveformPeaks();
+});
+
+function initializeWaveformPeaks() {
+    // Get DOM elements
+    const canvas = document.getElementById('waveformPeaks');
+    const status = document.getElementById('waveformPeaksStatus');
+    const audioPlayer = document.getElementById('audioPlayer');
+    
+    // Skip if the page has no waveform peaks
+    if (!canvas || !canvas.dataset.peaksUrl) {
+        return;
+    }
+    
+    const ctx = canvas.getContext('2d', { alpha: false });
+    
+    // View state: time at the left edge and seconds per screen pixel
+    let duration = 0;
+    let viewStart = 0;
+    let secondsPerPixel = 1;
+    let maxSecondsPerPixel = 1;
+    let minSecondsPerPixel = 1;
+    let peaks = null;
+    let fetchTimer = null;
+    let fetchRequest = 0;
+    let drawPending = false;
+    
+    function setStatus(text, className) {
+        if (status) {
+            status.textContent = text;
+            status.className = 'badge ' + className;
+        }
+    }
+    
+    function resizeCanvas() {
+        canvas.width = canvas.offsetWidth || 800;
+        canvas.height = canvas.offsetHeight || 120;
+    }
+    
+    // Fetch the peaks of a window: uint32 header length, JSON header, then int16 (min, max) pairs
+    function fetchPeaks(start, end) {
+        const request = ++fetchRequest;
+        const params = new URLSearchParams({ start: start.toFixed(3), end: end.toFixed(3), width: canvas.width });
+        return fetch(`${canvas.dataset.peaksUrl}?${params}`, { credentials: 'same-origin' })
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`Waveform request failed (${response.status})`);
+                }
+                return response.arrayBuffer();
+            })
+            .then(buffer => {
+                const headerLength = new DataView(buffer).getUint32(0, true);
+                const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 4, headerLength)));
+                // Copy so the int16 view is aligned whatever the header length
+                const values = new Int16Array(buffer.slice(4 + headerLength));
+                // Ignore windows that were replaced while loading
+                if (request === fetchRequest) {
+                    peaks = { header, values };
+                    requestDraw();
+                }
+                return header;
+            });
+    }
+    
+    // Load the whole recording first, then refetch the visible window as the view changes
+    resizeCanvas();
+    fetchPeaks(0, 1e9)
+        .then(header => {
+            duration = header.length / header.sample_rate;
+            maxSecondsPerPixel = duration / canvas.width;
+            minSecondsPerPixel = header.levels[0] / header.sample_rate / 4;
+            secondsPerPixel = maxSecondsPerPixel;
+            setupEventListeners();
+            setStatus('Ready', 'bg-success');
+        })
+        .catch(e => {
+            console.error('Error loading waveform peaks:', e);
+            setStatus('Waveform unavailable', 'bg-danger');
+        });
+    
+    function clampView() {
+        secondsPerPixel = Math.min(maxSecondsPerPixel, Math.max(minSecondsPerPixel, secondsPerPixel));
+        const visible = secondsPerPixel * canvas.width;
+        viewStart = Math.min(Math.max(0, viewStart), Math.max(0, duration - visible));
+    }
+    
+    function viewChanged() {
+        clampView();
+        requestDraw();
+        // Fetch the new window once the user pauses
+        clearTimeout(fetchTimer);
+        fetchTimer = setTimeout(() => {
+            fetchPeaks(viewStart, viewStart + secondsPerPixel * canvas.width).catch(e => console.error('Error loading waveform peaks:', e));
+        }, 150);
+    }
+    
+    // Zoom by a factor, keeping the time under screen position x in place
+    function zoomAt(factor, x) {
+        const anchor = viewStart + x * secondsPerPixel;
+        secondsPerPixel /= factor;
+        clampView();
+        viewStart = anchor - x * secondsPerPixel;
+        viewChanged();
+    }
+    
+    function requestDraw() {
+        if (!drawPending) {
+            drawPending = true;
+            requestAnimationFrame(draw);
+        }
+    }
+    
+    function draw() {
+        drawPending = false;
+        ctx.fillStyle = '#1e1e1e';
+        ctx.fillRect(0, 0, canvas.width, canvas.height);
+        if (!peaks) return;
+        
+        const middle = canvas.height / 2;
+        const scale = middle / 32768;
+        const header = peaks.header;
+        const secondsPerBucket = header.samples_per_bucket / header.sample_rate;
+        
+        // One vertical line per pixel column spanning the peaks of the buckets under it
+        // (the last fetched window is drawn where it lies, so panning shows it until the new one arrives)
+        ctx.fillStyle = '#4fc3f7';
+        for (let x = 0; x < canvas.width; x++) {
+            const columnStart = viewStart + x * secondsPerPixel;
+            const columnEnd = columnStart + secondsPerPixel;
+            const first = Math.max(0, Math.floor(columnStart / secondsPerBucket) - header.first_bucket);
+            const last = Math.min(header.buckets, Math.ceil(columnEnd / secondsPerBucket) - header.first_bucket);
+            if (first >= last) continue;
+            
+            let min = 32767;
+            let max = -32768;
+            for (let bucket = first; bucket < last; bucket++) {
+                min = Math.min(min, peaks.values[2 * bucket]);
+                max = Math.max(max, peaks.values[2 * bucket + 1]);
+            }
+            const top = middle - max * scale;
+            ctx.fillRect(x, top, 1, Math.max(1, (max - min) * scale));
+        }
+        
+        drawPlayhead();
+    }
+    
+    function drawPlayhead() {
+        if (!audioPlayer || !audioPlayer.currentTime) return;
+        
+        const x = (audioPlayer.currentTime - viewStart) / secondsPerPixel;
+        if (x >= 0 && x <= canvas.width) {
+            ctx.strokeStyle = 'red';
+            ctx.beginPath();
+            ctx.moveTo(x, 0);
+            ctx.lineTo(x, canvas.height);
+            ctx.stroke();
+        }
+    }
+    
+    // Set up event listeners
+    function setupEventListeners() {
+        // Mouse wheel zooms around the cursor
+        canvas.addEventListener('wheel', function(event) {
+            event.preventDefault();
+            zoomAt(event.deltaY < 0 ? 1.25 : 0.8, event.offsetX);
+        }, { passive: false });
+        
+        // Dragging pans
+        let dragX = null;
+        canvas.addEventListener('mousedown', function(event) {
+            dragX = event.clientX;
+        });
+        window.addEventListener('mousemove', function(event) {
+            if (dragX === null) return;
+            viewStart -= (event.clientX - dragX) * secondsPerPixel;
+            dragX = event.clientX;
+            viewChanged();
+        });
+        window.addEventListener('mouseup', function() {
+            dragX = null;
+        });
+        
+        // Double click seeks the audio player
+        canvas.addEventListener('dblclick', function(event) {
+            if (audioPlayer) {
+                audioPlayer.currentTime = viewStart + event.offsetX * secondsPerPixel;
+                requestDraw();
+            }
+        });
+        
+        if (audioPlayer) {
+            audioPlayer.addEventListener('timeupdate', requestDraw);
+        }
+        
+        window.addEventListener('resize', function() {
+            resizeCanvas();
+            maxSecondsPerPixel = duration / canvas.width;
+            viewChanged();
+        });
+    }
+}
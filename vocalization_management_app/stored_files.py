@@ -0,0 +1,81 @@
+"""
+Moving stored files within their storage backend without copying them through the app.
+
+Recordings are only ever renamed once stored (organize_audio_file_by_date moves them into
+their date-based directory), so a move never needs a second copy of the data:
+
+- File system storage: os.rename when source and destination are on the same device,
+  falling back to a streaming copy only across devices (django.core.files.move.file_move_safe).
+- Azure Blob Storage (django-storages AzureStorage): a server-side copy within the
+  container followed by deleting the source, so the blob is never downloaded.
+- Any other backend: the file is streamed from the old name to the new one.
+"""
+import os
+import time
+from django.core.files.move import file_move_safe
+
+# Seconds between checks of a pending server-side blob copy, and the longest wait
+BLOB_COPY_POLL_INTERVAL = 0.5
+BLOB_COPY_TIMEOUT = 600
+
+
+def move_stored_file(storage, old_name, new_name):
+    """
+    Move a stored file to a new name in the same storage
+    
+    Parameters:
+    - storage: Storage the file is in (e.g. audio_file.storage)
+    - old_name: Current name of the file in the storage
+    - new_name: Name to move it to (an existing file there is not overwritten unless the
+      storage overwrites files on save)
+    
+    Returns:
+    - str: Name the file was stored under
+    
+    Raises:
+    - OSError: If the file could not be moved
+    """
+    new_name = storage.get_available_name(new_name)
+    
+    try:
+        old_path, new_path = storage.path(old_name), storage.path(new_name)
+    except NotImplementedError:
+        # Remote storage without local paths
+        old_path = new_path = None
+    
+    if old_path is not None:
+        os.makedirs(os.path.dirname(new_path), exist_ok=True)
+        file_move_safe(old_path, new_path)
+    elif _is_blob_storage(storage):
+        _copy_blob(storage, old_name, new_name)
+        storage.delete(old_name)
+    else:
+        with storage.open(old_name, 'rb') as old_file:
+            new_name = storage.save(new_name, old_file)
+        storage.delete(old_name)
+    return new_name
+
+
+def _is_blob_storage(storage):
+    """Whether storage is an Azure container (django-storages AzureStorage or alike)"""
+    client = getattr(storage, 'client', None)
+    return client is not None and hasattr(client, 'get_blob_client') and hasattr(storage, '_get_valid_path')
+
+
+def _copy_blob(storage, old_name, new_name):
+    """Copy a blob within its container server-side and wait for the copy to finish"""
+    source = storage.client.get_blob_client(storage._get_valid_path(old_name))
+    destination = storage.client.get_blob_client(storage._get_valid_path(new_name))
+    # Copies within a storage account are authorized by the account's own credentials
+    copy = destination.start_copy_from_url(source.url)
+    
+    status = copy.get('copy_status')
+    deadline = time.monotonic() + BLOB_COPY_TIMEOUT
+    while status == 'pending':
+        if time.monotonic() > deadline:
+            destination.abort_copy(copy['copy_id'])
+            raise OSError(f"Copying {old_name} to {new_name} timed out")
+        time.sleep(BLOB_COPY_POLL_INTERVAL)
+        status = destination.get_blob_properties().copy.status
+    if status != 'success':
+        raise OSError(f"Copying {old_name} to {new_name} failed ({status})")
@@ -2,11 +2,16 @@ import time
 import threading
 import logging
 import os
+import queue
+import multiprocessing
+from django.conf import settings
 from django.utils import timezone
-from django.db import transaction
+from django.db import connection, transaction
 from .models import Database, ProcessingLog, OriginalAudioFile, DetectedNoiseAudioFile
-from .audio_processing import process_audio
+from .audio_processing import process_audio, update_audio_metadata
 from .excel_generator import generate_excel_report_for_processed_file
+from .processing_wakeup import get_wakeup, notify_pending_files
+from .processing_log import log_processing, buffered_processing_logs
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -14,7 +19,40 @@ logger = logging.getLogger(__name__)
 # Global variables to control the background processor
 processor_running = False
 processor_thread = None
-processing_interval = 10  # seconds between checking for new files
+processor_stopped = False  # Stopped on purpose, so new uploads do not restart it
+processing_interval = 10  # seconds to back off after an error
+idle_wait_timeout = 300  # seconds an idle worker waits for a wake-up before checking for new files anyway
+
+# Status of each worker (the processor thread, or each process of the worker pool), keyed by worker id
+worker_status = {}
+worker_status_lock = threading.Lock()
+
+
+def get_processor_mode():
+    """
+    Get the configured background processor mode
+    'thread' processes one file at a time in a daemon thread,
+    'pool' runs AUDIO_PROCESSOR_WORKERS worker processes that claim pending files independently
+    """
+    return getattr(settings, 'AUDIO_PROCESSOR_MODE', 'thread')
+
+
+def update_worker_status(worker_id, **fields):
+    """
+    Record the latest state of a worker for get_worker_status
+    """
+    with worker_status_lock:
+        status = worker_status.setdefault(worker_id, {
+            'worker_id': worker_id,
+            'pid': os.getpid(),
+            'state': 'Starting',
+            'file_id': None,
+            'file_name': None,
+            'processed': 0,
+            'failed': 0,
+        })
+        status.update(fields)
+        status['updated_at'] = timezone.now().isoformat()
 
 
 def get_pending_audio_files():
@@ -68,7 +106,7 @@ def mark_file_as_processing(audio_file):
         db_entry.save()
         
         # Log the start of processing
-        ProcessingLog.objects.create(
+        log_processing(
             audio_file=audio_file,
             message=f"Started processing file: {audio_file.audio_file_name}",
             level="INFO"
@@ -94,9 +132,10 @@ def mark_file_for_retry(audio_file):
             db_entry.processing_start_time = None  # Clear the previous processing start time
             db_entry.processing_end_time = None   # Clear the previous processing end time
             db_entry.save()
+            transaction.on_commit(notify_pending_files)
             
             # Log the retry attempt
-            ProcessingLog.objects.create(
+            log_processing(
                 audio_file=audio_file,
                 message=f"Marked for retry after previous processing failure: {audio_file.audio_file_name}",
                 level="INFO"
@@ -113,9 +152,151 @@ def mark_file_for_retry(audio_file):
             return False
 
 
-def process_single_file(audio_file):
+def claim_pending_files(limit=1):
+    """
+    Atomically claim up to `limit` pending files for the calling worker
+    Files are taken in priority order (highest first), then oldest upload first, and moved
+    from Pending to Processing so that no other worker or manual batch can take them.
+    Rows locked by another worker's claim are skipped rather than waited for, so any number
+    of workers can claim concurrently without lock errors.
+    Returns a list of the claimed OriginalAudioFile objects (empty if nothing is pending)
+    """
+    claim_order = ('-priority', 'uploaded_at', 'id')
+    started = timezone.now()
+    
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            claimed_ids = list(
+                Database.objects.select_for_update(skip_locked=True)
+                .filter(status='Pending')
+                .order_by(*claim_order)
+                .values_list('id', flat=True)[:limit]
+            )
+            Database.objects.filter(id__in=claimed_ids).update(status='Processing', processing_start_time=started)
+    else:
+        # Backends without row locks (SQLite): claim row by row with a conditional update,
+        # which only succeeds for the worker that still sees the row as Pending
+        claimed_ids = []
+        candidates = Database.objects.filter(status='Pending').order_by(*claim_order).values_list('id', flat=True)
+        for entry_id in candidates[:limit * 2]:
+            if Database.objects.filter(id=entry_id, status='Pending').update(status='Processing', processing_start_time=started):
+                claimed_ids.append(entry_id)
+                if len(claimed_ids) == limit:
+                    break
+    
+    if not claimed_ids:
+        return []
+    
+    # Keep the claim order in the returned list
+    entries = Database.objects.select_related('audio_file').in_bulk(claimed_ids)
+    audio_files = [entries[entry_id].audio_file for entry_id in claimed_ids]
+    # One insert for the whole claim, or part of the caller's buffer
+    with buffered_processing_logs():
+        for audio_file in audio_files:
+            log_processing(
+                audio_file=audio_file,
+                message=f"Started processing file: {audio_file.audio_file_name}",
+                level="INFO"
+            )
+    return audio_files
+
+
+def claim_uploaded_file():
+    """
+    Claim the next stored upload waiting for metadata extraction (Uploaded -> Ingesting)
+    Returns the claimed OriginalAudioFile, or None if there is none
+    """
+    candidates = Database.objects.filter(status='Uploaded').order_by('-priority', 'uploaded_at', 'id').values_list('id', flat=True)
+    for entry_id in candidates[:5]:
+        # Conditional update, so only one worker claims each upload; the claim time lets
+        # reset_stale_claims return it if the worker dies
+        if Database.objects.filter(id=entry_id, status='Uploaded').update(status='Ingesting',
+                                                                          processing_start_time=timezone.now()):
+            return Database.objects.select_related('audio_file').get(id=entry_id).audio_file
+    return None
+
+
+@buffered_processing_logs()
+def ingest_uploaded_file(audio_file):
+    """
+    Read the metadata of a claimed upload, move it to its date-based directory and mark
+    it pending for processing (update_audio_metadata); the upload fails if that does
+    Returns True if the file is now pending
+    """
+    try:
+        success = update_audio_metadata(audio_file.audio_file.path, audio_file)
+    except Exception as e:
+        logger.error(f"Error ingesting file {audio_file.audio_file_name}: {str(e)}")
+        success = False
+    
+    if not success:
+        Database.objects.filter(audio_file=audio_file, status__in=['Uploaded', 'Ingesting']).update(
+            status='Failed', processing_end_time=timezone.now()
+        )
+    return success
+
+
+def ingest_uploaded_files(limit=None):
+    """
+    Ingest stored uploads (see queue_uploaded_file) until none is left, or up to limit
+    Returns the number of uploads ingested
+    """
+    count = 0
+    while limit is None or count < limit:
+        audio_file = claim_uploaded_file()
+        if audio_file is None:
+            break
+        ingest_uploaded_file(audio_file)
+        count += 1
+    return count
+
+
+def reset_stale_claims():
+    """
+    Return files claimed by a worker that died to the queue: uploads Ingesting for longer
+    than AUDIO_INGEST_CLAIM_TIMEOUT seconds go back to Uploaded, and files Processing for
+    longer than AUDIO_PROCESSING_CLAIM_TIMEOUT seconds go back to Pending
+    Returns the number of files reset
+    """
+    reset = 0
+    for status, queued_status, setting, default in (
+        ('Ingesting', 'Uploaded', 'AUDIO_INGEST_CLAIM_TIMEOUT', 600),
+        ('Processing', 'Pending', 'AUDIO_PROCESSING_CLAIM_TIMEOUT', 86400),
+    ):
+        claimed_before = timezone.now() - timezone.timedelta(seconds=getattr(settings, setting, default))
+        stale = Database.objects.filter(status=status, processing_start_time__lt=claimed_before).select_related('audio_file')
+        for entry in stale:
+            # Conditional update, in case the worker finished meanwhile
+            if Database.objects.filter(id=entry.id, status=status, processing_start_time=entry.processing_start_time).update(
+                status=queued_status, processing_start_time=None
+            ):
+                reset += 1
+                log_processing(
+                    audio_file=entry.audio_file,
+                    message=f"{status} claim expired, returned to {queued_status}: {entry.audio_file.audio_file_name}",
+                    level="WARNING"
+                )
+    return reset
+
+
+def claim_next_pending_file():
+    """
+    Claim the next pending file for this worker
+    Stored uploads are ingested first, which is quick and makes them pending, so a
+    batch's metadata is read before any of its files is processed
+    Returns the claimed OriginalAudioFile, or None if nothing is pending
+    """
+    reset_stale_claims()
+    ingest_uploaded_files()
+    claimed = claim_pending_files(1)
+    return claimed[0] if claimed else None
+
+
+@buffered_processing_logs()
+def process_single_file(audio_file, claimed=False):
     """
     Process a single audio file and update its status
+    Pass claimed=True if the file was already moved to Processing by claim_next_pending_file
     Returns True if processing was successful, False otherwise
     """
     max_retries = 3
@@ -124,8 +305,9 @@ def process_single_file(audio_file):
     for attempt in range(max_retries):
         try:
             # Mark the file as processing
-            if not mark_file_as_processing(audio_file):
+            if not claimed and not mark_file_as_processing(audio_file):
                 return False  # File was already being processed or is not pending
+            claimed = True
             
             # Process the audio file
             file_path = audio_file.audio_file.path
@@ -138,13 +320,13 @@ def process_single_file(audio_file):
                     excel_path = generate_excel_report_for_processed_file(audio_file.file_id)
                     
                     if excel_path:
-                        ProcessingLog.objects.create(
+                        log_processing(
                             audio_file=audio_file,
                             message=f"Excel report generated after processing: {os.path.basename(excel_path)}",
                             level="SUCCESS"
                         )
                     else:
-                        ProcessingLog.objects.create(
+                        log_processing(
                             audio_file=audio_file,
                             message="Failed to generate Excel report after processing",
                             level="WARNING"
@@ -162,7 +344,7 @@ def process_single_file(audio_file):
             # Log the error
             try:
                 with transaction.atomic():
-                    ProcessingLog.objects.create(
+                    log_processing(
                         audio_file=audio_file,
                         message=f"Unexpected error during processing: {str(e)}",
                         level="ERROR"
@@ -179,6 +361,37 @@ def process_single_file(audio_file):
             return False
 
 
+def retry_failed_files(max_files):
+    """
+    Mark up to max_files files that failed in the last 7 days as pending again
+    Returns True if there were failed files to retry
+    """
+    # Get failed files from the last 7 days (604800 seconds)
+    retry_age = timezone.now() - timezone.timedelta(seconds=604800)
+    failed_files = get_failed_audio_files(max_retry_age=retry_age)
+    
+    if not failed_files.exists():
+        logger.info("No failed files to retry")
+        return False
+    
+    retry_count = 0
+    logger.info(f"Found {failed_files.count()} failed files to retry")
+    
+    # Retry up to max_files failed files
+    for failed_file in failed_files[:max_files]:
+        logger.info(f"Attempting to retry failed file: {failed_file.audio_file_name}")
+        
+        if mark_file_for_retry(failed_file):
+            retry_count += 1
+            logger.info(f"Marked failed file for retry: {failed_file.audio_file_name}")
+        
+        # Small delay between marking files for retry
+        time.sleep(0.5)
+    
+    logger.info(f"Marked {retry_count} failed files for retry")
+    return True
+
+
 def process_pending_files_continuously():
     """
     Continuously process pending audio files one by one
@@ -187,6 +400,11 @@ def process_pending_files_continuously():
     global processor_running
     
     logger.info("Background audio processor started")
+    update_worker_status(0, state='Idle')
+    
+    # Uploads signal this channel when a file becomes pending
+    wakeup = get_wakeup()
+    wakeup.listen()
     
     # Track when we last retried failed files to avoid too frequent retries
     last_failed_retry_time = None
@@ -199,21 +417,24 @@ def process_pending_files_continuously():
     
     while processor_running:
         try:
-            # Get the next pending file
-            pending_files = get_pending_audio_files()
+            # Claim the next pending file
+            audio_file = claim_next_pending_file()
             
-            if pending_files.exists():
+            if audio_file is not None:
                 # Process one file at a time
-                audio_file = pending_files.first()
                 logger.info(f"Processing file: {audio_file.audio_file_name}")
+                update_worker_status(0, state='Processing', file_id=audio_file.file_id, file_name=audio_file.audio_file_name)
                 
                 # Process the file
-                success = process_single_file(audio_file)
+                success = process_single_file(audio_file, claimed=True)
                 
                 if success:
                     logger.info(f"Successfully processed file: {audio_file.audio_file_name}")
+                    update_worker_status(0, processed=worker_status[0]['processed'] + 1)
                 else:
                     logger.warning(f"Failed to process file: {audio_file.audio_file_name}")
+                    update_worker_status(0, failed=worker_status[0]['failed'] + 1)
+                update_worker_status(0, state='Idle', file_id=None, file_name=None)
                 
                 # Reset idle cycles counter since we processed a file
                 idle_cycles = 0
@@ -231,56 +452,177 @@ def process_pending_files_continuously():
                 )
                 
                 if should_retry_failed:
-                    # Get failed files from the last 7 days (604800 seconds)
-                    retry_age = timezone.now() - timezone.timedelta(seconds=604800)
-                    failed_files = get_failed_audio_files(max_retry_age=retry_age)
-                    
-                    if failed_files.exists():
-                        retry_count = 0
-                        logger.info(f"Found {failed_files.count()} failed files to retry")
-                        
-                        # Retry up to max_retries_per_cycle failed files
-                        for failed_file in failed_files[:max_retries_per_cycle]:
-                            logger.info(f"Attempting to retry failed file: {failed_file.audio_file_name}")
-                            
-                            if mark_file_for_retry(failed_file):
-                                retry_count += 1
-                                logger.info(f"Marked failed file for retry: {failed_file.audio_file_name}")
-                            
-                            # Small delay between marking files for retry
-                            time.sleep(0.5)
-                        
-                        logger.info(f"Marked {retry_count} failed files for retry")
-                        last_failed_retry_time = current_time
-                        
+                    if retry_failed_files(max_retries_per_cycle):
                         # Reset idle cycles after retrying failed files
                         idle_cycles = 0
-                    else:
-                        logger.info("No failed files to retry")
-                        last_failed_retry_time = current_time
+                    last_failed_retry_time = current_time
             
-            # Sleep for a while before checking again
-            time.sleep(processing_interval)
+            if audio_file is None and processor_running:
+                # Block until a file becomes pending (re-check after idle_wait_timeout at the latest)
+                wakeup.wait(idle_wait_timeout)
             
         except Exception as e:
             logger.error(f"Error in background processor: {str(e)}")
             time.sleep(processing_interval)  # Sleep and try again
     
+    update_worker_status(0, state='Stopped', file_id=None, file_name=None)
     logger.info("Background audio processor stopped")
 
 
+def run_pool_worker(worker_id, stop_event, status_queue, work_available=None):
+    """
+    Main loop of one worker process in the worker pool
+    Claims pending files one at a time and processes them until stop_event is set,
+    reporting its state to the supervisor through status_queue
+    While idle the worker blocks on work_available, which the supervisor sets when a file
+    becomes pending (or on stop)
+    """
+    if work_available is None:
+        work_available = stop_event
+    processed = 0
+    failed = 0
+    
+    def report(state, audio_file=None):
+        status_queue.put((worker_id, {
+            'pid': os.getpid(),
+            'state': state,
+            'file_id': audio_file.file_id if audio_file else None,
+            'file_name': audio_file.audio_file_name if audio_file else None,
+            'processed': processed,
+            'failed': failed,
+        }))
+    
+    logger.info(f"Audio processing worker {worker_id} started (pid {os.getpid()})")
+    report('Idle')
+    
+    while not stop_event.is_set():
+        try:
+            # Clear before claiming so a wake-up that arrives meanwhile is not lost
+            if work_available is not stop_event:
+                work_available.clear()
+            audio_file = claim_next_pending_file()
+            if audio_file is None:
+                # Nothing to do, block until woken (re-check after idle_wait_timeout at the latest)
+                work_available.wait(idle_wait_timeout)
+                continue
+            
+            logger.info(f"Worker {worker_id} processing file: {audio_file.audio_file_name}")
+            report('Processing', audio_file)
+            
+            if process_single_file(audio_file, claimed=True):
+                processed += 1
+            else:
+                failed += 1
+            report('Idle')
+            
+        except Exception as e:
+            logger.error(f"Error in audio processing worker {worker_id}: {str(e)}")
+            stop_event.wait(processing_interval)
+    
+    report('Stopped')
+    logger.info(f"Audio processing worker {worker_id} stopped")
+
+
+def supervise_worker_pool(worker_count):
+    """
+    Run the worker pool: start worker_count processes, collect their status reports
+    and retry failed files while the processor is running
+    This function runs in a separate thread of the web process
+    """
+    global processor_running
+    
+    # Spawn fresh interpreters so workers don't inherit the web process's database connections
+    context = multiprocessing.get_context('spawn')
+    stop_event = context.Event()
+    work_available = context.Event()
+    status_queue = context.Queue()
+    
+    # Relay wake-ups from uploads to the idle workers until this pool is torn down
+    wakeup = get_wakeup()
+    wakeup.listen()
+    relay_stop = threading.Event()
+    
+    def relay_wakeups():
+        while not relay_stop.is_set():
+            if wakeup.wait(1.0):
+                work_available.set()
+    
+    relay_thread = threading.Thread(target=relay_wakeups, name='audio-wakeup-relay', daemon=True)
+    relay_thread.start()
+    
+    from .processing_worker import worker_main
+    workers = {}
+    for worker_id in range(worker_count):
+        process = context.Process(target=worker_main, args=(worker_id, stop_event, status_queue, work_available),
+                                  name=f'audio-worker-{worker_id}', daemon=True)
+        process.start()
+        workers[worker_id] = process
+        update_worker_status(worker_id, pid=process.pid, state='Starting')
+    logger.info(f"Started audio processing worker pool with {worker_count} processes")
+    
+    last_failed_retry_time = time.time()
+    retry_interval = 3600  # Retry failed files once per hour (in seconds)
+    max_retries_per_cycle = 5  # Maximum number of failed files to retry in one cycle
+    
+    while processor_running:
+        # Relay the workers' status reports, waiting up to a second for the first
+        try:
+            worker_id, fields = status_queue.get(timeout=1.0)
+            while True:
+                update_worker_status(worker_id, **fields)
+                worker_id, fields = status_queue.get_nowait()
+        except queue.Empty:
+            pass
+        
+        try:
+            # Report workers that died without saying goodbye
+            for worker_id, process in workers.items():
+                if not process.is_alive() and worker_status[worker_id]['state'] != 'Exited':
+                    logger.error(f"Audio processing worker {worker_id} exited with code {process.exitcode}")
+                    update_worker_status(worker_id, state='Exited')
+            
+            # Retry failed files once an hour while every worker is idle
+            idle = all(worker_status[worker_id]['state'] == 'Idle' for worker_id in workers)
+            if idle and time.time() - last_failed_retry_time >= retry_interval:
+                retry_failed_files(max_retries_per_cycle)
+                last_failed_retry_time = time.time()
+        except Exception as e:
+            logger.error(f"Error in worker pool supervisor: {str(e)}")
+    
+    # Stop relaying wake-ups, so a restarted pool's relay is the only one waiting
+    relay_stop.set()
+    relay_thread.join()
+    
+    # Let the workers finish their current file, then stop them
+    stop_event.set()
+    work_available.set()
+    for worker_id, process in workers.items():
+        process.join(timeout=60)
+        if process.is_alive():
+            process.terminate()
+        update_worker_status(worker_id, state='Stopped', file_id=None, file_name=None)
+    logger.info("Stopped audio processing worker pool")
+
+
 def start_background_processor():
     """
     Start the background processing thread if it's not already running
     """
-    global processor_running, processor_thread
+    global processor_running, processor_thread, processor_stopped
     
     if processor_running and processor_thread and processor_thread.is_alive():
         logger.info("Background processor is already running")
         return False
     
     processor_running = True
-    processor_thread = threading.Thread(target=process_pending_files_continuously)
+    processor_stopped = False
+    with worker_status_lock:
+        worker_status.clear()
+    if get_processor_mode() == 'pool':
+        worker_count = getattr(settings, 'AUDIO_PROCESSOR_WORKERS', os.cpu_count() or 1)
+        processor_thread = threading.Thread(target=supervise_worker_pool, args=(worker_count,))
+    else:
+        processor_thread = threading.Thread(target=process_pending_files_continuously)
     processor_thread.daemon = True  # Thread will exit when main program exits
     processor_thread.start()
     
@@ -292,13 +634,15 @@ def stop_background_processor():
     """
     Stop the background processing thread
     """
-    global processor_running, processor_thread
+    global processor_running, processor_thread, processor_stopped
     
     if not processor_running or not processor_thread:
         logger.info("Background processor is not running")
         return False
     
     processor_running = False
+    processor_stopped = True
+    notify_pending_files()  # Wake the processor if it is idle so it sees the stop
     processor_thread.join(timeout=5.0)  # Wait for thread to finish
     processor_thread = None
     
@@ -306,6 +650,19 @@ def stop_background_processor():
     return True
 
 
+def ensure_background_processor():
+    """
+    Start the background processor for new uploads if AUDIO_PROCESSOR_AUTOSTART is set,
+    unless it is running or was stopped on purpose
+    Returns True if it was started
+    """
+    if processor_stopped or get_processor_status() == "Running":
+        return False
+    if not getattr(settings, 'AUDIO_PROCESSOR_AUTOSTART', True):
+        return False
+    return start_background_processor()
+
+
 def get_processor_status():
     """
     Get the current status of the background processor
@@ -318,41 +675,61 @@ def get_processor_status():
         return "Stopped"
 
 
+def get_worker_status():
+    """
+    Get the state of each background worker (id, pid, state, current file and counts)
+    """
+    with worker_status_lock:
+        return [dict(status) for _, status in sorted(worker_status.items())]
+
+
+def get_batch_progress(batch):
+    """
+    Get the ingestion and processing progress of an upload batch
+    Returns a dict with the number of the batch's files in each state
+    """
+    from django.db.models import Count
+    
+    counts = dict(Database.objects.filter(batch=batch).values_list('status').annotate(count=Count('id')).order_by())
+    stored = sum(counts.values())
+    waiting = counts.get('Uploaded', 0) + counts.get('Ingesting', 0)
+    return {
+        'batch_id': str(batch.batch_id),
+        'files': stored + batch.duplicate_count + batch.failed_count,
+        'ingesting': waiting,
+        'ingested': stored - waiting,
+        'pending': counts.get('Pending', 0),
+        'processing': counts.get('Processing', 0),
+        'processed': counts.get('Processed', 0),
+        'failed': counts.get('Failed', 0) + batch.failed_count,
+        'duplicates': batch.duplicate_count,
+        'complete': waiting + counts.get('Pending', 0) + counts.get('Processing', 0) == 0,
+    }
+
+
 def process_pending_audio_files_batch():
     """
     Process all pending audio files in a batch (one by one)
     This is for manual triggering of processing
+    Files are claimed one at a time, so the batch shares the backlog with the background
+    workers and with other batches instead of locking them out
     Returns a tuple of (processed_count, failed_count)
     """
-    # Get pending files with a transaction to ensure consistency
-    with transaction.atomic():
-        # Use select_for_update with nowait to avoid blocking if another process is already working
-        try:
-            # Get IDs of audio files that have pending status in the Database model
-            pending_audio_file_ids = Database.objects.filter(status='Pending').select_for_update(nowait=True).values_list('audio_file_id', flat=True)
-            # Get the actual audio files
-            pending_files = list(OriginalAudioFile.objects.filter(file_id__in=pending_audio_file_ids))
-        except Exception as e:
-            if "database is locked" in str(e).lower() or "could not obtain lock" in str(e).lower():
-                logger.warning("Another process is already handling pending files. Skipping this batch.")
-                return 0, 0
-            raise
-    
     processed_count = 0
     failed_count = 0
     
-    for audio_file in pending_files:
+    while True:
+        audio_file = claim_next_pending_file()
+        if audio_file is None:
+            break
+        
         try:
-            # Process the file with a small delay between files to reduce database contention
-            success = process_single_file(audio_file)
+            success = process_single_file(audio_file, claimed=True)
             
             if success:
                 processed_count += 1
             else:
                 failed_count += 1
-                
-            # Small delay to prevent database contention
-            time.sleep(0.5)
             
         except Exception as e:
             logger.error(f"Error processing file {audio_file.audio_file_name}: {str(e)}")
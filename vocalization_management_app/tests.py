@@ -1,24 +1,28 @@
-from django.test import TestCase, Client
+from django.test import TestCase, TransactionTestCase, Client, override_settings
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.contrib.auth import get_user_model
+from django.contrib.messages import get_messages
 from django.utils import timezone
 from django.utils.timezone import now
 import os
+import json
 import numpy as np
 from scipy.io import wavfile
 import tempfile
 import shutil
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, call
 
 from .models import (
     CustomUser, OriginalAudioFile, Database, DetectedNoiseAudioFile,
-    ProcessingLog, Zoo, AnimalTable, AnimalDetectionParameters
+    ProcessingLog, Zoo, AnimalTable, AnimalDetectionParameters, Spectrogram, Waveform, ChunkedUpload
 )
 from .audio_processing import (
     update_audio_metadata, process_audio, detect_saw_calls,
-    parse_audio_filename, seconds_to_timestamp, handle_duplicate_file
+    parse_audio_filename, seconds_to_timestamp, handle_duplicate_file,
+    merge_saw_call_events, detect_saw_calls_in_file, SpectrogramAccumulator
 )
+from .audio_access import AudioSource, probe_wav_header
 
 User = get_user_model()
 
@@ -95,6 +99,7 @@ class ModelTests(TestCase):
         self.assertEqual(self.detection_params.min_impulse_count, 3)
         self.assertTrue(self.detection_params.is_default)
 
+@override_settings(CLIP_SPECTROGRAM_RENDERING='inline', SPECTROGRAM_GENERATION='eager')
 class AudioProcessingTests(TestCase):
     """Tests for the audio processing functionality"""
     
@@ -181,6 +186,7 @@ class AudioProcessingTests(TestCase):
         # Skip timestamp tests since the actual implementation may differ
         # This would require checking the actual implementation of seconds_to_timestamp
     
+    @override_settings(DETECTED_CLIP_STORAGE='files')
     @patch('vocalization_management_app.audio_processing.detect_saw_calls')
     def test_process_audio(self, mock_detect_saw_calls):
         """Test the audio processing pipeline"""
@@ -220,6 +226,119 @@ class AudioProcessingTests(TestCase):
         detected_noise = DetectedNoiseAudioFile.objects.first()
         self.assertEqual(detected_noise.original_file, self.original_audio)
         self.assertEqual(detected_noise.saw_count, 3)  # From the mocked impulse_count
+        
+        # The segment is written once, straight to its permanent file
+        from django.conf import settings
+        from .audio_processing import spectrogram_directory
+        _, samples = wavfile.read(self.test_wav_path)
+        self.assertTrue(os.path.basename(str(detected_noise.detected_noise_file_path)).startswith(f'{self.original_audio.pk}_'))
+        _, segment = wavfile.read(os.path.join(settings.MEDIA_ROOT, str(detected_noise.detected_noise_file_path)))
+        np.testing.assert_array_equal(segment, samples[int(0.5 * self.sample_rate):int(1.0 * self.sample_rate)])
+        self.assertFalse(os.path.exists(os.path.join(settings.MEDIA_ROOT, 'temp', 'temp_segment_0.wav')))
+        
+        # The clip's spectrogram image is separate from the full recording's
+        spectrogram_dir = os.path.join(settings.MEDIA_ROOT, spectrogram_directory(self.original_audio))
+        base_name = os.path.splitext(os.path.basename(self.original_audio.audio_file.name))[0]
+        self.assertTrue(os.path.exists(os.path.join(spectrogram_dir, f'{base_name}_mel_spectrogram.png')))
+        self.assertTrue(os.path.exists(os.path.join(spectrogram_dir, f'{base_name}_segment_1_mel_spectrogram.png')))
+        full_spectrograms = Spectrogram.objects.filter(audio_file=self.original_audio, is_full_audio=True)
+        self.assertEqual(sorted(os.path.basename(str(s.image_path)) for s in full_spectrograms),
+                         [f'{base_name}_linear_spectrogram.png', f'{base_name}_mel_spectrogram.png'])
+        
+        # The waveform peaks were computed in the same run
+        waveform = Waveform.objects.get(audio_file=self.original_audio)
+        self.assertTrue(os.path.exists(os.path.join(settings.MEDIA_ROOT, waveform.peaks_path)))
+    
+    @override_settings(DETECTED_CLIP_STORAGE='virtual')
+    @patch('vocalization_management_app.audio_processing.detect_saw_calls')
+    def test_process_audio_virtual_clips(self, mock_detect_saw_calls):
+        """Test that virtual clips store only their sample range and play cut from the recording"""
+        import io
+        mock_detect_saw_calls.return_value = [
+            {
+                'start': '00:00:00.50',
+                'end': '00:00:01.00',
+                'start_seconds': 0.5,
+                'end_seconds': 1.0,
+                'magnitude': 5000.0,
+                'frequency': 100.0,
+                'impulse_count': 3
+            }
+        ]
+        Database.objects.create(audio_file=self.original_audio, status='Pending')
+        self.assertTrue(process_audio(self.original_audio.audio_file.path, self.original_audio))
+        
+        detected_noise = DetectedNoiseAudioFile.objects.get(original_file=self.original_audio)
+        self.assertEqual(detected_noise.detected_noise_file_path, '')
+        self.assertEqual(detected_noise.file_size_mb, 0.0)
+        self.assertEqual((detected_noise.start_sample, detected_noise.end_sample),
+                         (int(0.5 * self.sample_rate), int(1.0 * self.sample_rate)))
+        
+        staff_user = User.objects.create_user(username='staff@test.com', email='staff@test.com', password='staffpassword', user_type='2')
+        self.client.force_login(staff_user)
+        response = self.client.get(reverse('api_stream_clip', args=[detected_noise.pk]))
+        self.assertEqual(response.status_code, 200)
+        _, samples = wavfile.read(self.test_wav_path)
+        np.testing.assert_array_equal(wavfile.read(io.BytesIO(b''.join(response.streaming_content)))[1],
+                                      samples[int(0.5 * self.sample_rate):int(1.0 * self.sample_rate)])
+    
+    @override_settings(SPECTROGRAM_GENERATION='lazy', SPECTROGRAM_TILE_PYRAMID=True)
+    @patch('vocalization_management_app.audio_processing.detect_saw_calls')
+    def test_process_audio_lazy_spectrograms(self, mock_detect_saw_calls):
+        """Test that no spectrogram images or tiles are rendered while processing in lazy mode"""
+        from django.conf import settings
+        from .audio_processing import spectrogram_directory
+        mock_detect_saw_calls.return_value = [
+            {
+                'start': '00:00:00.50',
+                'end': '00:00:01.00',
+                'start_seconds': 0.5,
+                'end_seconds': 1.0,
+                'magnitude': 5000.0,
+                'frequency': 100.0,
+                'impulse_count': 3
+            }
+        ]
+        Database.objects.create(audio_file=self.original_audio, status='Pending')
+        spectrogram_dir = os.path.join(settings.MEDIA_ROOT, spectrogram_directory(self.original_audio))
+        existing = set(os.listdir(spectrogram_dir)) if os.path.exists(spectrogram_dir) else set()
+        
+        self.assertTrue(process_audio(self.original_audio.audio_file.path, self.original_audio))
+        
+        self.assertEqual(DetectedNoiseAudioFile.objects.filter(original_file=self.original_audio).count(), 1)
+        self.assertEqual(set(os.listdir(spectrogram_dir)) if os.path.exists(spectrogram_dir) else set(), existing)
+        self.assertFalse(Spectrogram.objects.filter(audio_file=self.original_audio).exists())
+    
+    @patch('vocalization_management_app.audio_processing.generate_waveform_peaks', return_value=None)
+    @patch('vocalization_management_app.audio_processing.generate_spectrogram', return_value=None)
+    @patch('vocalization_management_app.audio_processing.detect_saw_calls')
+    def test_process_audio_insert_count(self, mock_detect_saw_calls, mock_generate_spectrogram, mock_generate_waveform_peaks):
+        """Test that saving detections takes the same number of INSERTs for any number of calls"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        insert_counts = []
+        for call_count in (2, 20):
+            mock_detect_saw_calls.return_value = [
+                {
+                    'start': seconds_to_timestamp(0.05 * k),
+                    'end': seconds_to_timestamp(0.05 * k + 0.04),
+                    'start_seconds': 0.05 * k,
+                    'end_seconds': 0.05 * k + 0.04,
+                    'magnitude': 5000.0,
+                    'frequency': 100.0,
+                    'impulse_count': 3
+                }
+                for k in range(call_count)
+            ]
+            Database.objects.update_or_create(audio_file=self.original_audio, defaults={'status': 'Pending'})
+            
+            with CaptureQueriesContext(connection) as context:
+                self.assertTrue(process_audio(self.original_audio.audio_file.path, self.original_audio))
+            insert_counts.append(sum(query['sql'].startswith('INSERT') for query in context.captured_queries))
+        
+        self.assertEqual(insert_counts[0], insert_counts[1])
+        self.assertEqual(DetectedNoiseAudioFile.objects.filter(original_file=self.original_audio).count(), 22)
     
     def test_update_audio_metadata(self):
         """Test updating audio metadata"""
@@ -236,6 +355,1441 @@ class AudioProcessingTests(TestCase):
         self.assertTrue(Database.objects.filter(audio_file=self.original_audio).exists())
         db_entry = Database.objects.get(audio_file=self.original_audio)
         self.assertEqual(db_entry.status, 'Pending')
+        
+        # Check the format fields read from the WAV header
+        self.assertEqual(self.original_audio.sample_rate, self.sample_rate)
+        self.assertEqual(self.original_audio.channels, 1)
+        self.assertEqual(self.original_audio.bit_depth, 16)
+        self.assertEqual(self.original_audio.audio_format, 'PCM')
+        self.assertEqual(self.original_audio.frame_count, self.sample_rate * self.duration)
+        self.assertEqual(self.original_audio.duration_seconds, self.duration)
+
+class SawCallDetectionTests(TestCase):
+    """Tests for the vectorized saw call detector"""
+    
+    def make_pulse_train(self, sample_rate, pulse_times, duration):
+        """Low noise with short 120 Hz pulses at the given times"""
+        rng = np.random.default_rng(0)
+        audio = rng.normal(0, 50, int(duration * sample_rate)).astype(np.float32)
+        pulse_length = int(0.08 * sample_rate)
+        t = np.arange(pulse_length) / sample_rate
+        pulse = 12000 * np.sin(2 * np.pi * 120 * t) * np.hanning(pulse_length)
+        for pulse_time in pulse_times:
+            offset = int(pulse_time * sample_rate)
+            audio[offset:offset + pulse_length] += pulse
+        return audio
+    
+    def make_call_sequence(self, sample_rate, duration, seed=0):
+        """
+        Low noise with saw calls of 3 to 8 pulses every 6 to 12 seconds; pulse lengths,
+        spacing, frequencies (40-250 Hz), phases and amplitudes vary like field recordings
+        """
+        rng = np.random.default_rng(seed)
+        audio = rng.normal(0, 50, int(duration * sample_rate))
+        call_start = 1.0
+        while call_start < duration - 10:
+            pulse_time = call_start
+            for _ in range(rng.integers(3, 9)):
+                pulse_length = int(rng.uniform(0.06, 0.12) * sample_rate)
+                t = np.arange(pulse_length) / sample_rate
+                offset = int(pulse_time * sample_rate)
+                audio[offset:offset + pulse_length] += (
+                    rng.uniform(6000, 16000) * np.hanning(pulse_length)
+                    * np.sin(2 * np.pi * rng.uniform(40, 250) * t + rng.uniform(0, 2 * np.pi))
+                )
+                pulse_time += rng.uniform(0.3, 0.6)
+            call_start = pulse_time + rng.uniform(6, 12)
+        return np.clip(audio, -32768, 32767).astype(np.int16)
+    
+    def test_merge_saw_call_events(self):
+        """Test that impulse frames are merged with the time threshold rules"""
+        hit_times = np.array([1.0, 1.05, 1.5, 2.0, 2.05, 9.0, 9.5])
+        magnitudes = np.array([4000, 9000, 5000, 5000, 9500, 4000, 4500], dtype=np.float32)
+        frequencies = np.array([100, 110, 120, 130, 140, 150, 160], dtype=float)
+        
+        events = merge_saw_call_events(hit_times, magnitudes, frequencies, time_threshold=5)
+        
+        # Frames 0.05s after the previous hit are not counted as impulses
+        self.assertEqual(len(events), 2)
+        self.assertEqual(events[0]['start_seconds'], 1.0)
+        self.assertEqual(events[0]['end_seconds'], 2.0)
+        self.assertEqual(events[0]['impulse_count'], 3)
+        self.assertEqual(events[0]['magnitude'], 5000.0)
+        self.assertEqual(events[0]['frequency'], 120.0)
+        self.assertEqual(events[1]['start'], seconds_to_timestamp(9.0))
+        self.assertEqual(events[1]['impulse_count'], 2)
+        self.assertEqual(merge_saw_call_events(np.array([]), np.array([]), np.array([]), 5), [])
+    
+    def test_detect_saw_calls(self):
+        """Test detection of a synthetic pulse train"""
+        sample_rate = 8000
+        audio = self.make_pulse_train(sample_rate, [2.0, 2.4, 2.8, 3.2, 3.6], duration=10)
+        
+        saw_calls = detect_saw_calls(audio, sample_rate)
+        
+        self.assertEqual(len(saw_calls), 1)
+        self.assertAlmostEqual(saw_calls[0]['start_seconds'], 2.0, delta=0.1)
+        self.assertAlmostEqual(saw_calls[0]['end_seconds'], 3.6, delta=0.1)
+        self.assertGreaterEqual(saw_calls[0]['impulse_count'], 3)
+        self.assertTrue(15 < saw_calls[0]['frequency'] < 300)
+    
+    def test_streaming_detection_matches_in_memory(self):
+        """Test that block-wise detection from a file gives the in-memory detections"""
+        sample_rate = 8000
+        pulse_times = [1.0, 1.4, 1.8, 2.2, 9.0, 9.3, 9.6, 9.9, 10.2, 17.5, 17.9, 18.3]
+        audio = self.make_pulse_train(sample_rate, pulse_times, duration=20).astype(np.int16)
+        
+        expected = detect_saw_calls(audio, sample_rate)
+        self.assertEqual(len(expected), 3)
+        
+        # Block boundaries must not change the result, including blocks that split an event
+        for block_frames in (7, 64, 100000):
+            self.assertEqual(detect_saw_calls(audio, sample_rate, block_frames=block_frames), expected)
+        
+        test_dir = tempfile.mkdtemp()
+        try:
+            stereo_path = os.path.join(test_dir, 'stereo.wav')
+            wavfile.write(stereo_path, sample_rate, np.stack([audio, audio], axis=1))
+            self.assertEqual(detect_saw_calls_in_file(stereo_path, block_frames=50), expected)
+        finally:
+            shutil.rmtree(test_dir)
+    
+    def test_detection_stft_feeds_spectrogram(self):
+        """Test that the spectrogram collected during detection is the pooled full-file STFT"""
+        from scipy.signal import stft
+        sample_rate = 8000
+        audio = self.make_pulse_train(sample_rate, [1.0, 1.4, 1.8], duration=6).astype(np.int16)
+        
+        features = SpectrogramAccumulator(max_columns=40)
+        events = detect_saw_calls(audio, sample_rate, block_frames=7, spectrogram=features)
+        self.assertEqual(events, detect_saw_calls(audio, sample_rate))
+        
+        centered = audio.astype(np.float32) - np.float32(audio.astype(np.float32).mean(dtype=np.float64))
+        _, _, Zxx = stft(centered, fs=sample_rate, nperseg=800, noverlap=400)
+        power = np.abs(Zxx) ** 2
+        pool = features.frames_per_column
+        expected = np.stack([power[:, i:i + pool].mean(axis=1) for i in range(0, power.shape[1], pool)], axis=1)
+        
+        self.assertEqual(features.hop_length, 400 * pool)
+        self.assertLessEqual(features.power_spectrum().shape[1], 40)
+        np.testing.assert_allclose(features.power_spectrum(), expected, rtol=1e-3, atol=1e-3 * power.max())
+        self.assertEqual(features.spectrogram_db('mel').shape, (128, expected.shape[1]))
+    
+    def test_band_limited_detection_matches_full_band(self):
+        """Test that the decimating front end finds the same saw calls as full-band analysis"""
+        for sample_rate in (8000, 16000, 44100, 48000, 96000):
+            audio = self.make_call_sequence(sample_rate, duration=180)
+            
+            full_band = detect_saw_calls(audio, sample_rate, front_end='full_band')
+            band_limited = detect_saw_calls(audio, sample_rate, front_end='band_limited')
+            
+            self.assertGreaterEqual(len(full_band), 3)
+            self.assertEqual(len(band_limited), len(full_band))
+            for expected, event in zip(full_band, band_limited):
+                self.assertEqual(event['start_seconds'], expected['start_seconds'])
+                self.assertEqual(event['end_seconds'], expected['end_seconds'])
+                self.assertEqual(event['impulse_count'], expected['impulse_count'])
+                self.assertAlmostEqual(event['frequency'], expected['frequency'], delta=10)
+            
+            if sample_rate == 8000:
+                # The filter state is carried across blocks
+                self.assertEqual(detect_saw_calls(audio, sample_rate, block_frames=7, front_end='band_limited'),
+                                 band_limited)
+        
+        with self.assertRaises(ValueError):
+            detect_saw_calls(audio, sample_rate, front_end='unknown')
+
+class AudioSourceTests(TestCase):
+    """Tests for the shared memory-mapped audio access layer"""
+    
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        rng = np.random.default_rng(0)
+        self.samples = rng.integers(-20000, 20000, size=(8000, 2)).astype(np.int16)
+        self.stereo_path = os.path.join(self.test_dir, 'stereo.wav')
+        self.mono_path = os.path.join(self.test_dir, 'mono.wav')
+        wavfile.write(self.stereo_path, 4000, self.samples)
+        wavfile.write(self.mono_path, 4000, self.samples[:, 0].copy())
+    
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+    
+    def test_slices_are_views(self):
+        """Test that mono segments are views into the mapped file rather than copies"""
+        with AudioSource(self.mono_path) as audio:
+            self.assertEqual(audio.sample_rate, 4000)
+            self.assertEqual(audio.duration_seconds, 2.0)
+            start, end = audio.seconds_to_samples(0.5, 1.25)
+            segment = audio.mono(start, end)
+            self.assertTrue(np.shares_memory(segment, audio.samples))
+            np.testing.assert_array_equal(segment, self.samples[2000:5000, 0])
+    
+    def test_close_unmaps_file(self):
+        """Test that closing a source unmaps the file once no view of it is left"""
+        audio = AudioSource(self.stereo_path)
+        audio.close()
+        self.assertFalse(audio.mapped)
+        
+        audio = AudioSource(self.stereo_path)
+        segment = audio.frames(0, 10)
+        audio.close()
+        # A view still in use keeps the mapping (and stays readable)
+        self.assertTrue(audio.mapped)
+        np.testing.assert_array_equal(segment, self.samples[:10])
+        del segment
+        self.assertFalse(audio.mapped)
+    
+    def test_probe_wav_header(self):
+        """Test that the header probe reads format, INFO and GUANO metadata without the samples"""
+        import struct
+        info = b'INFO' + b'INAM' + struct.pack('<I', 6) + b'Tiger\x00' + b'ICMT' + struct.pack('<I', 3) + b'ok\x00\x00'
+        guano = b'GUANO|Version: 1.0\nTimestamp: 2023-02-01T17:15:02\nMake: Wildlife Acoustics\n'
+        with open(self.stereo_path, 'ab') as f:
+            f.write(b'LIST' + struct.pack('<I', len(info)) + info)
+            f.write(b'guan' + struct.pack('<I', len(guano)) + guano)
+        
+        header = probe_wav_header(self.stereo_path)
+        
+        self.assertEqual(header['channels'], 2)
+        self.assertEqual(header['sample_rate'], 4000)
+        self.assertEqual(header['bit_depth'], 16)
+        self.assertEqual(header['audio_format'], 'PCM')
+        self.assertEqual(header['frames'], 8000)
+        self.assertEqual(header['duration_seconds'], 2.0)
+        self.assertEqual([chunk['id'] for chunk in header['chunks']], ['fmt', 'data', 'LIST', 'guan'])
+        self.assertEqual(header['info'], {'INAM': 'Tiger', 'ICMT': 'ok'})
+        self.assertEqual(header['guano']['Timestamp'], '2023-02-01T17:15:02')
+        self.assertEqual(header['guano']['Make'], 'Wildlife Acoustics')
+        
+        with self.assertRaises(ValueError):
+            probe_wav_header(__file__)
+    
+    def test_probe_wav_header_placeholder_data_size(self):
+        """Test that a data chunk with a placeholder size of 0 is read to the end of the file"""
+        import struct
+        with open(self.stereo_path, 'r+b') as f:
+            data = f.read()
+            data_size_offset = data.index(b'data') + 4
+            f.seek(data_size_offset)
+            f.write(struct.pack('<I', 0))
+        
+        header = probe_wav_header(self.stereo_path)
+        
+        self.assertEqual(header['frames'], 8000)
+        self.assertEqual(header['data_size'], 8000 * 4)
+        self.assertEqual([chunk['id'] for chunk in header['chunks']], ['fmt', 'data'])
+    
+    def test_normalized_matches_librosa(self):
+        """Test that normalized samples are the ones librosa.load would return"""
+        import librosa
+        for path in (self.mono_path, self.stereo_path):
+            expected, sample_rate = librosa.load(path, sr=None)
+            with AudioSource(path) as audio:
+                self.assertEqual(audio.sample_rate, sample_rate)
+                np.testing.assert_allclose(audio.normalized(), expected, atol=1e-7)
+                np.testing.assert_allclose(audio.normalized(100, 200), expected[100:200], atol=1e-7)
+
+class BackgroundProcessorTests(TestCase):
+    """Tests for claiming and processing pending files in the background workers"""
+    
+    def setUp(self):
+        self.audio_files = []
+        for i in range(2):
+            audio_file = OriginalAudioFile.objects.create(
+                audio_file=f'storage/temp/amur_tiger_test_{i}.wav',
+                audio_file_name=f'test_{i}.wav',
+                animal_type='amur_tiger',
+                file_size_mb=1.0
+            )
+            Database.objects.create(audio_file=audio_file, status='Pending')
+            self.audio_files.append(audio_file)
+    
+    def test_claim_next_pending_file(self):
+        """Test that each pending file is claimed once, oldest first"""
+        from .tasks import claim_next_pending_file
+        
+        self.assertEqual(claim_next_pending_file(), self.audio_files[0])
+        self.assertEqual(claim_next_pending_file(), self.audio_files[1])
+        self.assertIsNone(claim_next_pending_file())
+        self.assertEqual(Database.objects.filter(status='Processing').count(), 2)
+    
+    def test_claim_pending_files_by_priority(self):
+        """Test that batches are claimed highest priority first and never claimed twice"""
+        from .tasks import claim_pending_files
+        
+        urgent = OriginalAudioFile.objects.create(
+            audio_file='storage/temp/amur_tiger_urgent.wav',
+            audio_file_name='urgent.wav',
+            animal_type='amur_tiger',
+            file_size_mb=1.0
+        )
+        Database.objects.create(audio_file=urgent, status='Pending', priority=10)
+        
+        self.assertEqual(claim_pending_files(2), [urgent, self.audio_files[0]])
+        self.assertEqual(claim_pending_files(5), [self.audio_files[1]])
+        self.assertEqual(claim_pending_files(5), [])
+        self.assertFalse(Database.objects.filter(status='Pending').exists())
+        self.assertEqual(ProcessingLog.objects.filter(message__startswith='Started processing').count(), 3)
+    
+    def test_wakeup_backends(self):
+        """Test that a notification wakes a waiting processor for both backends"""
+        import threading
+        from .processing_wakeup import ConditionWakeup, SocketWakeup
+        
+        condition = ConditionWakeup()
+        self.assertFalse(condition.wait(0.01))
+        threading.Timer(0.05, condition.notify).start()
+        self.assertTrue(condition.wait(5))
+        
+        listener = SocketWakeup(('127.0.0.1', 0))
+        self.assertTrue(listener.listen())
+        try:
+            self.assertFalse(listener.wait(0.01))
+            notifier = SocketWakeup(listener.sock.getsockname())
+            notifier.notify()
+            notifier.notify()
+            self.assertTrue(listener.wait(5))
+            # Both notifications are consumed by one wake-up
+            self.assertFalse(listener.wait(0.01))
+        finally:
+            listener.close()
+    
+    @patch('vocalization_management_app.audio_processing.notify_pending_files')
+    def test_pending_files_wake_processor(self, mock_notify):
+        """Test that the processor is woken once a new Pending entry is committed"""
+        new_file = OriginalAudioFile.objects.create(
+            audio_file='storage/temp/amur_tiger_new.wav',
+            audio_file_name='new.wav',
+            animal_type='amur_tiger',
+            file_size_mb=1.0
+        )
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            update_audio_metadata(os.path.join(tempfile.gettempdir(), 'missing.wav'), new_file)
+        
+        self.assertTrue(Database.objects.filter(audio_file=new_file, status='Pending').exists())
+        self.assertEqual(len(callbacks), 1)
+        mock_notify.assert_called_once_with()
+    
+    @patch('vocalization_management_app.tasks.start_background_processor', return_value=True)
+    @patch('vocalization_management_app.audio_processing.notify_pending_files')
+    def test_uploads_ingested_by_workers(self, mock_notify, mock_start):
+        """Test that uploads return once files are stored and the workers read their metadata"""
+        from .tasks import ingest_uploaded_files, claim_next_pending_file, ensure_background_processor
+        
+        admin = User.objects.create_user(username='admin@test.com', email='admin@test.com',
+                                         password='adminpassword', user_type='1')
+        self.client.force_login(admin)
+        zoo = Zoo.objects.create(zoo_name='Test Zoo', contact_email='zoo@test.com')
+        AnimalTable.objects.create(species_name='Amur Leopard', zoo=zoo)
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        
+        wav_path = os.path.join(media_root, 'source.wav')
+        wavfile.write(wav_path, 8000, np.zeros(8000, dtype=np.int16))
+        with open(wav_path, 'rb') as f:
+            content = f.read()
+        
+        with override_settings(MEDIA_ROOT=media_root):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(reverse('upload_audio'), {
+                    'audio_files': [SimpleUploadedFile('SMM07257_20230201_171502.wav', content),
+                                    SimpleUploadedFile('copy.wav', content)],
+                    'animal_type': 'amur_leopard',
+                    'zoo': zoo.pk,
+                })
+            self.assertEqual(response.status_code, 302)
+            message = str(list(get_messages(response.wsgi_request))[0])
+            self.assertIn('Successfully uploaded 2 audio file(s)', message)
+            self.assertIn('1 duplicate file(s) matched recordings already stored', message)
+            mock_notify.assert_called_once_with()
+            # The upload starts the processor outside runserver too, unless autostart is off
+            mock_start.assert_called_once_with()
+            with override_settings(AUDIO_PROCESSOR_AUTOSTART=False):
+                ensure_background_processor()
+            mock_start.assert_called_once_with()
+            
+            # Stored and queued, but its metadata is not read in the request
+            entry = Database.objects.get(status='Uploaded')
+            self.assertEqual(entry.audio_file.audio_file_name, 'SMM07257_20230201_171502.wav')
+            self.assertIsNone(entry.audio_file.header_metadata)
+            progress_url = reverse('api_upload_batch_progress', args=[entry.batch.batch_id])
+            progress = self.client.get(progress_url).json()['data']
+            self.assertEqual((progress['files'], progress['ingesting'], progress['duplicates']), (2, 1, 1))
+            self.assertFalse(progress['complete'])
+            
+            # The upload page polls the batch's progress
+            self.assertContains(self.client.get(reverse('upload_audio')), progress_url)
+            
+            self.assertEqual(ingest_uploaded_files(), 1)
+            entry.refresh_from_db()
+            self.assertEqual(entry.status, 'Pending')
+            self.assertIsNotNone(entry.audio_file.header_metadata)
+            progress = self.client.get(progress_url).json()['data']
+            self.assertEqual((progress['ingesting'], progress['ingested'], progress['pending']), (0, 1, 1))
+        
+        # Workers ingest uploads before claiming pending files
+        upload = OriginalAudioFile.objects.create(audio_file='storage/temp/amur_tiger_upload.wav',
+                                                  audio_file_name='upload.wav', animal_type='amur_tiger', file_size_mb=1.0)
+        Database.objects.create(audio_file=upload, status='Uploaded', priority=10)
+        self.assertEqual(claim_next_pending_file(), upload)
+        self.assertEqual(Database.objects.get(audio_file=upload).status, 'Processing')
+    
+    def test_reset_stale_claims(self):
+        """Test that files left Ingesting or Processing by a dead worker are queued again"""
+        from .tasks import reset_stale_claims, claim_uploaded_file
+        
+        upload = OriginalAudioFile.objects.create(audio_file='storage/temp/amur_tiger_stale.wav',
+                                                  audio_file_name='stale.wav', animal_type='amur_tiger', file_size_mb=1.0)
+        Database.objects.create(audio_file=upload, status='Uploaded')
+        self.assertEqual(claim_uploaded_file(), upload)
+        processing = Database.objects.get(audio_file=self.audio_files[0])
+        processing.status = 'Processing'
+        processing.processing_start_time = now() - timezone.timedelta(hours=2)
+        processing.save()
+        
+        # Claims younger than their timeout are left alone
+        self.assertEqual(reset_stale_claims(), 0)
+        self.assertEqual(Database.objects.get(audio_file=upload).status, 'Ingesting')
+        
+        Database.objects.filter(audio_file=upload).update(processing_start_time=now() - timezone.timedelta(minutes=11))
+        with override_settings(AUDIO_PROCESSING_CLAIM_TIMEOUT=3600):
+            self.assertEqual(reset_stale_claims(), 2)
+        self.assertEqual(Database.objects.get(audio_file=upload).status, 'Uploaded')
+        processing.refresh_from_db()
+        self.assertEqual((processing.status, processing.processing_start_time), ('Pending', None))
+        self.assertTrue(ProcessingLog.objects.filter(audio_file=upload, level='WARNING',
+                                                     message__startswith='Ingesting claim expired').exists())
+    
+    @patch('vocalization_management_app.tasks.generate_excel_report_for_processed_file', return_value=None)
+    @patch('vocalization_management_app.tasks.process_audio')
+    def test_pool_worker_processes_pending_files(self, mock_process_audio, mock_excel):
+        """Test that a pool worker processes every pending file and reports its state"""
+        import queue
+        import threading
+        from .tasks import run_pool_worker
+        
+        stop_event = threading.Event()
+        status_queue = queue.Queue()
+        
+        def process(file_path, audio_file):
+            # Stop the worker once the last pending file has been handed to it
+            if audio_file == self.audio_files[-1]:
+                stop_event.set()
+            return audio_file == self.audio_files[0]
+        mock_process_audio.side_effect = process
+        
+        run_pool_worker(3, stop_event, status_queue)
+        
+        self.assertEqual(mock_process_audio.call_count, 2)
+        reports = [status_queue.get_nowait() for _ in range(status_queue.qsize())]
+        self.assertTrue(all(worker_id == 3 for worker_id, _ in reports))
+        states = [fields['state'] for _, fields in reports]
+        self.assertEqual(states, ['Idle', 'Processing', 'Idle', 'Processing', 'Idle', 'Stopped'])
+        self.assertEqual(reports[1][1]['file_name'], 'test_0.wav')
+        self.assertEqual(reports[-1][1]['processed'], 1)
+        self.assertEqual(reports[-1][1]['failed'], 1)
+    
+    def test_pool_supervisor_detects_dead_workers(self):
+        """Test that the supervisor notices a dead worker while status reports keep arriving"""
+        import queue
+        import threading
+        from . import tasks
+        
+        context = MagicMock()
+        context.Event.side_effect = threading.Event
+        context.Process.return_value = MagicMock(pid=4321, exitcode=-9, **{'is_alive.return_value': False})
+        reports = []
+        
+        def get(timeout):
+            # Another worker reports on every call; stop the supervisor after a few
+            reports.append(timeout)
+            if len(reports) == 5:
+                tasks.processor_running = False
+            return 1, {'state': 'Idle'}
+        context.Queue.return_value.get.side_effect = get
+        context.Queue.return_value.get_nowait.side_effect = queue.Empty
+        
+        tasks.processor_running = True
+        self.addCleanup(setattr, tasks, 'processor_running', False)
+        with patch('multiprocessing.get_context', return_value=context), \
+                patch('vocalization_management_app.tasks.update_worker_status',
+                      wraps=tasks.update_worker_status) as mock_update:
+            tasks.supervise_worker_pool(1)
+        
+        self.assertIn(call(0, state='Exited'), mock_update.call_args_list)
+        # The wake-up relay of the stopped pool is gone
+        self.assertFalse(any(thread.name == 'audio-wakeup-relay' for thread in threading.enumerate()))
+
+class ProcessingLogBufferTests(TestCase):
+    """Tests for the buffered ProcessingLog writer"""
+    
+    def setUp(self):
+        self.audio_file = OriginalAudioFile.objects.create(
+            audio_file='storage/temp/amur_tiger_log.wav',
+            audio_file_name='log.wav',
+            animal_type='amur_tiger',
+            file_size_mb=1.0
+        )
+    
+    def test_buffered_logs_are_written_together(self):
+        """Test that buffered entries are written in one INSERT at the end of the block, in order"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .processing_log import log_processing, buffered_processing_logs
+        
+        with CaptureQueriesContext(connection) as context:
+            with buffered_processing_logs(max_entries=100, max_age=60):
+                for i in range(10):
+                    log_processing(audio_file=self.audio_file, message=f'step {i}', level='INFO')
+                self.assertEqual(ProcessingLog.objects.count(), 0)
+        
+        self.assertEqual(sum(query['sql'].startswith('INSERT') for query in context.captured_queries), 1)
+        messages = list(ProcessingLog.objects.order_by('timestamp', 'id').values_list('message', flat=True))
+        self.assertEqual(messages, [f'step {i}' for i in range(10)])
+    
+    def test_buffer_flushes_when_full_and_on_failure(self):
+        """Test the size threshold and that buffered entries survive an exception"""
+        from .processing_log import log_processing, buffered_processing_logs
+        
+        with self.assertRaises(RuntimeError):
+            with buffered_processing_logs(max_entries=3, max_age=60):
+                for i in range(4):
+                    log_processing(audio_file=self.audio_file, message=f'step {i}')
+                self.assertEqual(ProcessingLog.objects.count(), 3)
+                raise RuntimeError('processing failed')
+        
+        self.assertEqual(ProcessingLog.objects.count(), 4)
+    
+    def test_minimum_level(self):
+        """Test that entries below PROCESSING_LOG_MIN_LEVEL are dropped"""
+        from django.test import override_settings
+        from .processing_log import log_processing, buffered_processing_logs
+        
+        with override_settings(PROCESSING_LOG_MIN_LEVEL='WARNING'):
+            log_processing(audio_file=self.audio_file, message='routine', level='INFO')
+            with buffered_processing_logs():
+                log_processing(audio_file=self.audio_file, message='done', level='SUCCESS')
+                log_processing(audio_file=self.audio_file, message='odd', level='WARNING')
+            log_processing(audio_file=self.audio_file, message='broken', level='ERROR')
+        
+        self.assertEqual(sorted(ProcessingLog.objects.values_list('message', flat=True)), ['broken', 'odd'])
+
+class ProcessingLogTimerTests(TransactionTestCase):
+    """Tests for the timed flush of the buffered ProcessingLog writer (from another thread)"""
+    
+    def test_buffer_flushes_on_timer(self):
+        """Test that an entry is written after the flush interval while nothing else is logged"""
+        import time
+        from .processing_log import log_processing, buffered_processing_logs
+        
+        audio_file = OriginalAudioFile.objects.create(audio_file='storage/temp/amur_tiger_timer.wav',
+                                                      audio_file_name='timer.wav', animal_type='amur_tiger',
+                                                      file_size_mb=1.0)
+        with buffered_processing_logs(max_entries=100, max_age=0.2):
+            log_processing(audio_file=audio_file, message='detecting')
+            deadline = time.monotonic() + 10
+            while not ProcessingLog.objects.exists() and time.monotonic() < deadline:
+                time.sleep(0.05)
+            self.assertEqual(list(ProcessingLog.objects.values_list('message', flat=True)), ['detecting'])
+            log_processing(audio_file=audio_file, message='done')
+        
+        self.assertEqual(ProcessingLog.objects.count(), 2)
+
+class SpectrogramRenderingTests(TestCase):
+    """Tests for the colormap lookup spectrogram renderer"""
+    
+    def test_spectrogram_to_rgb(self):
+        """Test that values map through the lookup table with low frequencies at the bottom"""
+        from .spectrogram_rendering import spectrogram_to_rgb, colormap_lut
+        S = np.linspace(-100, 0, 64 * 100).reshape(64, 100)
+        
+        rgb = spectrogram_to_rgb(S, top_db=80.0)
+        
+        lut = colormap_lut('magma')
+        self.assertEqual(rgb.shape, (64, 100, 3))
+        self.assertEqual(rgb.dtype, np.uint8)
+        # Row 0 (lowest frequency, below the 80 dB range) is the bottom row, clipped to the first colour
+        np.testing.assert_array_equal(rgb[-1, 0], lut[0])
+        np.testing.assert_array_equal(rgb[0, -1], lut[255])
+    
+    def test_render_spectrogram(self):
+        """Test that PNG and WebP images are written at the requested size, with axis margins"""
+        from PIL import Image
+        from .spectrogram_rendering import render_spectrogram, AXIS_LEFT_MARGIN, AXIS_BOTTOM_MARGIN
+        S = np.random.default_rng(0).normal(-40, 10, (128, 300))
+        test_dir = tempfile.mkdtemp()
+        try:
+            for extension in ('png', 'webp'):
+                path = os.path.join(test_dir, f'spectrogram.{extension}')
+                render_spectrogram(S, path, height=200)
+                with Image.open(path) as image:
+                    self.assertEqual(image.size, (300, 200))
+                    self.assertEqual(image.format, extension.upper())
+            
+            path = os.path.join(test_dir, 'annotated.png')
+            render_spectrogram(S, path, width=500, height=200, annotate=True, duration=12.0,
+                               frequencies=np.linspace(0, 4000, 128), title='Mel Spectrogram')
+            with Image.open(path) as image:
+                self.assertEqual(image.size, (500 + AXIS_LEFT_MARGIN, 200 + AXIS_BOTTOM_MARGIN))
+        finally:
+            shutil.rmtree(test_dir)
+
+class SpectrogramTileTests(TestCase):
+    """Tests for the zoomable spectrogram tile pyramid and its endpoints"""
+    
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        # 20 s at 8 kHz with a 1 kHz tone in the second half
+        t = np.arange(20 * 8000) / 8000
+        audio_data = 0.01 * np.random.default_rng(0).standard_normal(len(t))
+        audio_data[len(t) // 2:] += 0.5 * np.sin(2 * np.pi * 1000 * t[len(t) // 2:])
+        self.test_wav_path = os.path.join(self.test_dir, 'tiles.wav')
+        wavfile.write(self.test_wav_path, 8000, (audio_data * 32767).astype(np.int16))
+    
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+    
+    def test_build_spectrogram_pyramid(self):
+        """Test the level sizes, tile layout and that the deepest level matches a whole-file mel spectrogram"""
+        import librosa
+        from PIL import Image
+        from .spectrogram_tiles import build_spectrogram_pyramid, read_pyramid_manifest, tile_path
+        from .spectrogram_rendering import spectrogram_to_rgb
+        pyramid_dir = os.path.join(self.test_dir, 'pyramid')
+        
+        with AudioSource(self.test_wav_path) as audio:
+            # Small chunks so the streaming passes cross chunk and tile boundaries
+            manifest = build_spectrogram_pyramid(audio, pyramid_dir, tile_size=32, chunk_frames=100)
+            y = audio.normalized()
+        
+        self.assertEqual(read_pyramid_manifest(pyramid_dir), manifest)
+        # 313 STFT frames and 128 mel bands: time reaches full resolution at zoom 4, frequency at zoom 2
+        self.assertEqual(manifest['max_zoom'], 4)
+        self.assertEqual([(level['width'], level['height']) for level in manifest['levels']],
+                         [(20, 32), (40, 64), (79, 128), (157, 128), (313, 128)])
+        for level in manifest['levels']:
+            for x in range(level['tiles_x']):
+                for y_tile in range(level['tiles_y']):
+                    with Image.open(tile_path(pyramid_dir, level['zoom'], x, y_tile)) as tile:
+                        self.assertEqual(tile.size, (min(32, level['width'] - 32 * x), min(32, level['height'] - 32 * y_tile)))
+            self.assertFalse(os.path.exists(tile_path(pyramid_dir, level['zoom'], level['tiles_x'], 0)))
+        
+        # Stitch the deepest level back together and compare it with librosa's spectrogram
+        deepest = manifest['levels'][-1]
+        stitched = np.zeros((deepest['height'], deepest['width'], 3), dtype=np.uint8)
+        for x in range(deepest['tiles_x']):
+            for y_tile in range(deepest['tiles_y']):
+                with Image.open(tile_path(pyramid_dir, 4, x, y_tile)) as tile:
+                    stitched[32 * y_tile:32 * y_tile + tile.height, 32 * x:32 * x + tile.width] = np.asarray(tile)
+        mel = librosa.feature.melspectrogram(y=y, sr=8000, n_fft=2048, hop_length=512, n_mels=128, fmax=4000, pad_mode='constant')
+        mel_db = librosa.power_to_db(mel, ref=1.0, top_db=None)
+        expected = spectrogram_to_rgb(mel_db, vmax=mel_db.max())
+        self.assertLess(np.abs(stitched.astype(int) - expected).mean(), 1.0)
+        
+        # Rebuilding replaces the pyramid in place
+        with AudioSource(self.test_wav_path) as audio:
+            build_spectrogram_pyramid(audio, pyramid_dir, tile_size=64)
+        self.assertEqual(read_pyramid_manifest(pyramid_dir)['tile_size'], 64)
+        self.assertEqual(sorted(os.listdir(self.test_dir)), ['pyramid', 'tiles.wav'])
+    
+    def test_tile_endpoints(self):
+        """Test that the manifest and tiles are served, and missing tiles are 404"""
+        from django.test import override_settings
+        from .audio_processing import generate_spectrogram_tiles, spectrogram_tiles_url
+        
+        staff_user = User.objects.create_user(username='staff@test.com', email='staff@test.com', password='staffpassword', user_type='2')
+        self.client.force_login(staff_user)
+        
+        with override_settings(MEDIA_ROOT=self.test_dir, SPECTROGRAM_TILE_SIZE=128, SPECTROGRAM_GENERATION='eager'):
+            audio_file = OriginalAudioFile.objects.create(
+                audio_file='tiles.wav',
+                audio_file_name='tiles.wav',
+                animal_type='amur_tiger',
+                file_size_mb=1.0
+            )
+            self.assertIsNone(spectrogram_tiles_url(audio_file))
+            manifest = generate_spectrogram_tiles(self.test_wav_path, audio_file)
+            self.assertIsNotNone(manifest)
+            
+            manifest_url = spectrogram_tiles_url(audio_file)
+            response = self.client.get(manifest_url)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()['data']
+            self.assertEqual(data['max_zoom'], manifest['max_zoom'])
+            
+            tile_url = data['tile_url'].format(z=data['max_zoom'], x=1, y=0)
+            response = self.client.get(tile_url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], 'image/png')
+            
+            self.assertEqual(self.client.get(data['tile_url'].format(z=0, x=5, y=0)).status_code, 404)
+            self.assertEqual(self.client.get(data['tile_url'].format(z=data['max_zoom'] + 1, x=0, y=0)).status_code, 404)
+            self.assertEqual(self.client.get(manifest_url.replace('/mel/', '/chroma/')).status_code, 404)
+    
+    def test_tiles_built_on_first_request(self):
+        """Test that in lazy mode the pyramid is built when its manifest or a tile is first requested"""
+        from django.test import override_settings
+        from .audio_processing import spectrogram_tile_directory, spectrogram_tiles_url
+        
+        staff_user = User.objects.create_user(username='staff@test.com', email='staff@test.com', password='staffpassword', user_type='2')
+        self.client.force_login(staff_user)
+        
+        with override_settings(MEDIA_ROOT=self.test_dir, SPECTROGRAM_TILE_SIZE=128, SPECTROGRAM_GENERATION='lazy'):
+            audio_file = OriginalAudioFile.objects.create(
+                audio_file='tiles.wav',
+                audio_file_name='tiles.wav',
+                animal_type='amur_tiger',
+                file_size_mb=1.0
+            )
+            pyramid_dir = spectrogram_tile_directory(audio_file)
+            manifest_url = spectrogram_tiles_url(audio_file)
+            self.assertIsNotNone(manifest_url)
+            self.assertFalse(os.path.exists(pyramid_dir))
+            
+            # A tile requested before the manifest builds the pyramid as well
+            tile_url = manifest_url.replace('manifest/', '0/0/0/')
+            self.assertEqual(self.client.get(tile_url).status_code, 200)
+            self.assertTrue(os.path.exists(pyramid_dir))
+            
+            response = self.client.get(manifest_url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['data']['tile_size'], 128)
+            self.assertEqual(ProcessingLog.objects.filter(audio_file=audio_file, message__contains='spectrogram tiles generated').count(), 1)
+            
+            with override_settings(SPECTROGRAM_TILE_PYRAMID=False):
+                audio_file.audio_file.name = 'other.wav'
+                self.assertIsNone(spectrogram_tiles_url(audio_file))
+
+def render_clips_in_child(file_path, audio_file_id, clips):
+    """Render clips in pool mode from a daemonic process, as a background pool worker would"""
+    from .clip_rendering import render_clip_spectrograms
+    batch = render_clip_spectrograms(file_path, OriginalAudioFile.objects.get(pk=audio_file_id), clips, mode='pool')
+    batch.wait(120)
+    if batch.rendered != len(clips):
+        raise SystemExit(1)
+
+class ClipRenderingTests(TransactionTestCase):
+    """Tests for rendering clip spectrograms in the background process pool"""
+    
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        t = np.arange(4 * 8000) / 8000
+        audio_data = (0.5 * np.sin(2 * np.pi * 1000 * t) * 32767).astype(np.int16)
+        self.test_wav_path = os.path.join(self.test_dir, 'clips.wav')
+        wavfile.write(self.test_wav_path, 8000, audio_data)
+        self.audio_file = OriginalAudioFile.objects.create(
+            audio_file='clips.wav',
+            audio_file_name='clips.wav',
+            animal_type='amur_tiger',
+            file_size_mb=1.0
+        )
+    
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+    
+    def clips(self, count):
+        return [
+            {
+                'name': f'segment {i + 1}',
+                'start_sample': i * 8000,
+                'end_sample': (i + 1) * 8000,
+                'start_seconds': float(i),
+                'end_seconds': float(i + 1),
+                'image_path': os.path.join('clips', f'segment_{i + 1}_mel_spectrogram.png')
+            }
+            for i in range(count)
+        ]
+    
+    def test_pool_rendering(self):
+        """Test that pool workers write every image and the collector records rows and progress"""
+        from .clip_rendering import render_clip_spectrograms
+        
+        with override_settings(MEDIA_ROOT=self.test_dir):
+            batch = render_clip_spectrograms(self.test_wav_path, self.audio_file, self.clips(3), mode='pool')
+            batch.wait(120)
+        
+        self.assertEqual(batch.rendered, 3)
+        for i in range(3):
+            self.assertTrue(os.path.exists(os.path.join(self.test_dir, 'clips', f'segment_{i + 1}_mel_spectrogram.png')))
+        # No temporary files are left behind
+        self.assertEqual(len(os.listdir(os.path.join(self.test_dir, 'clips'))), 3)
+        
+        spectrograms = Spectrogram.objects.filter(audio_file=self.audio_file, is_full_audio=False).order_by('clip_start_time')
+        self.assertEqual([(s.clip_start_time, s.clip_end_time) for s in spectrograms], [(0.0, 1.0), (1.0, 2.0), (2.0, 3.0)])
+        messages = list(ProcessingLog.objects.filter(audio_file=self.audio_file).values_list('message', flat=True))
+        self.assertIn('Rendering 3 clip spectrograms in the background', messages)
+        self.assertIn('Rendered 3 of 3 clip spectrograms', messages)
+    
+    def test_pool_rendering_in_daemonic_process(self):
+        """Test that a daemonic process renders its clips inline instead of starting a pool"""
+        import multiprocessing
+        from django.db import connection
+        
+        # The child opens its own connection (to its copy of the in-memory test database)
+        connection.close()
+        with override_settings(MEDIA_ROOT=self.test_dir):
+            process = multiprocessing.get_context('fork').Process(
+                target=render_clips_in_child, args=(self.test_wav_path, self.audio_file.pk, self.clips(2)), daemon=True
+            )
+            process.start()
+            process.join(120)
+        
+        self.assertEqual(process.exitcode, 0)
+        for i in range(2):
+            self.assertTrue(os.path.exists(os.path.join(self.test_dir, 'clips', f'segment_{i + 1}_mel_spectrogram.png')))
+    
+    def test_inline_rendering_errors(self):
+        """Test that a failing clip is reported without stopping the others"""
+        from .clip_rendering import render_clip_spectrograms
+        clips = self.clips(2)
+        # Pillow has no encoder for this extension
+        clips[1]['image_path'] = os.path.join('clips', 'segment_2_mel_spectrogram.unknown')
+        
+        with override_settings(MEDIA_ROOT=self.test_dir):
+            batch = render_clip_spectrograms(self.test_wav_path, self.audio_file, clips, mode='inline')
+            # Rendering again keeps one row per image
+            render_clip_spectrograms(self.test_wav_path, self.audio_file, clips[:1], mode='inline')
+        
+        self.assertEqual(batch.rendered, 1)
+        self.assertEqual(len(batch.errors), 1)
+        self.assertEqual(Spectrogram.objects.filter(audio_file=self.audio_file).count(), 1)
+        log = ProcessingLog.objects.filter(audio_file=self.audio_file, message__startswith='1 clip spectrograms failed').first()
+        self.assertIsNotNone(log)
+        self.assertIn('segment 2', log.message)
+
+class SpectrogramCacheTests(TestCase):
+    """Tests for on-demand spectrogram images and their LRU disk cache"""
+    
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.test_dir, 'recordings'))
+        t = np.arange(4 * 8000) / 8000
+        audio_data = (0.5 * np.sin(2 * np.pi * 1000 * t) * 32767).astype(np.int16)
+        wavfile.write(os.path.join(self.test_dir, 'recordings', 'cache.wav'), 8000, audio_data)
+        self.audio_file = OriginalAudioFile.objects.create(
+            audio_file='recordings/cache.wav',
+            audio_file_name='cache.wav',
+            animal_type='amur_tiger',
+            file_size_mb=1.0
+        )
+    
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+    
+    def test_cached_spectrogram_image(self):
+        """Test that images are rendered once, keyed by range and render settings, and bumped on hits"""
+        from PIL import Image
+        from .spectrogram_cache import cached_spectrogram_image
+        
+        with override_settings(MEDIA_ROOT=self.test_dir):
+            path = cached_spectrogram_image(self.audio_file, 'mel')
+            self.assertTrue(path.startswith(os.path.join(self.test_dir, 'spectrogram_cache')))
+            os.utime(path, (1000, 1000))
+            self.assertEqual(cached_spectrogram_image(self.audio_file, 'mel'), path)
+            self.assertGreater(os.path.getmtime(path), 1000)
+            
+            clip_path = cached_spectrogram_image(self.audio_file, 'mel', 1.0, 2.0)
+            self.assertNotEqual(clip_path, path)
+            self.assertNotEqual(cached_spectrogram_image(self.audio_file, 'linear', 1.0, 2.0), clip_path)
+            with override_settings(SPECTROGRAM_ANNOTATE_AXES=False):
+                plain_path = cached_spectrogram_image(self.audio_file, 'mel', 1.0, 2.0)
+            self.assertNotEqual(plain_path, clip_path)
+            
+            # Ranges longer than SPECTROGRAM_MAX_COLUMNS frames are averaged down while they are transformed
+            with override_settings(SPECTROGRAM_ANNOTATE_AXES=False, SPECTROGRAM_MAX_COLUMNS=16):
+                long_path = cached_spectrogram_image(self.audio_file, 'mel')
+            with Image.open(long_path) as image:
+                self.assertEqual(image.width, 16)
+        
+        # No temporary files are left behind
+        cache_files = os.listdir(os.path.dirname(path))
+        self.assertEqual(len(cache_files), 5)
+        self.assertFalse([name for name in cache_files if name.startswith('.')])
+    
+    def test_evict_spectrogram_cache(self):
+        """Test that the least recently used images are deleted once the cache is over budget"""
+        from .spectrogram_cache import cached_spectrogram_image, evict_spectrogram_cache
+        
+        with override_settings(MEDIA_ROOT=self.test_dir):
+            paths = [cached_spectrogram_image(self.audio_file, 'mel', k, k + 1.0) for k in range(3)]
+            for age, path in zip((300, 100, 200), paths):
+                os.utime(path, (1000 + age, 1000 + age))
+            budget = os.path.getsize(paths[0]) + os.path.getsize(paths[2])
+            
+            self.assertEqual(evict_spectrogram_cache(budget), 1)
+            self.assertEqual([os.path.exists(path) for path in paths], [True, False, True])
+            
+            # Adding an image evicts under the configured budget
+            with override_settings(SPECTROGRAM_CACHE_MAX_MB=0):
+                newest = cached_spectrogram_image(self.audio_file, 'mel', 3.0, 4.0)
+            self.assertFalse(any(os.path.exists(path) for path in paths + [newest]))
+    
+    def test_spectrogram_image_endpoint(self):
+        """Test that the endpoint serves full and clip images and rejects bad requests"""
+        from datetime import time
+        from .audio_processing import spectrogram_image_url
+        
+        staff_user = User.objects.create_user(username='staff@test.com', email='staff@test.com', password='staffpassword', user_type='2')
+        self.client.force_login(staff_user)
+        
+        with override_settings(MEDIA_ROOT=self.test_dir):
+            response = self.client.get(spectrogram_image_url(self.audio_file))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], 'image/png')
+            
+            clip_url = spectrogram_image_url(self.audio_file, 'linear', time(0, 0, 1, 500000), 2.5)
+            self.assertIn('start=1.500000', clip_url)
+            self.assertEqual(self.client.get(clip_url).status_code, 200)
+            
+            url = spectrogram_image_url(self.audio_file)
+            self.assertEqual(self.client.get(url + '?start=2&end=1').status_code, 400)
+            self.assertEqual(self.client.get(url + '?start=abc').status_code, 400)
+            self.assertEqual(self.client.get(url.replace('/mel/', '/waveform/')).status_code, 404)
+            
+            os.remove(os.path.join(self.test_dir, 'recordings', 'cache.wav'))
+            self.assertEqual(self.client.get(url + '?start=0&end=1').status_code, 404)
+
+class SpectrogramDataTests(TestCase):
+    """Tests for the binary spectrogram data of the graphs page"""
+    
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        # 10 s of low noise at 8 kHz with a 20 ms 1 kHz click at 4 s
+        rng = np.random.default_rng(0)
+        audio_data = 0.001 * rng.standard_normal(10 * 8000)
+        t = np.arange(160) / 8000
+        audio_data[32000:32160] += 0.5 * np.sin(2 * np.pi * 1000 * t)
+        self.test_wav_path = os.path.join(self.test_dir, 'data.wav')
+        wavfile.write(self.test_wav_path, 8000, (audio_data * 32767).astype(np.int16))
+        self.audio_file = OriginalAudioFile.objects.create(
+            audio_file='data.wav',
+            audio_file_name='data.wav',
+            animal_type='amur_tiger',
+            file_size_mb=1.0
+        )
+    
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+    
+    def test_spectrogram_matrix(self):
+        """Test the pooled matrix layout, that max pooling keeps a short click, and the binary format"""
+        from .spectrogram_data import spectrogram_matrix, encode_spectrogram_matrix, decode_spectrogram_matrix
+        
+        contrast = {}
+        with AudioSource(self.test_wav_path) as audio:
+            for pooling in ('max', 'mean'):
+                values, header = spectrogram_matrix(audio, 0, len(audio), 20, min_frequency=500, max_frequency=1500,
+                                                    height=8, pooling=pooling)
+                self.assertEqual(values.shape, (8, 20))
+                self.assertEqual((header['rows'], header['columns']), (8, 20))
+                self.assertAlmostEqual(header['seconds_per_column'], 0.5)
+                self.assertTrue(500 <= header['frequencies'][0] < header['frequencies'][-1] <= 1500)
+                
+                # The click is in column 8 (4.0-4.5 s), in the row around 1 kHz
+                row = int(np.argmin(np.abs(np.array(header['frequencies']) - 1000)))
+                scale = (header['db_max'] - header['db_min']) / 255
+                contrast[pooling] = (int(values[row, 8]) - int(np.median(values[row]))) * scale
+            
+            data = encode_spectrogram_matrix(values, header)
+            self.assertEqual(len(data), 4 + len(json.dumps(header)) + 8 * 20)
+            decoded_values, decoded_header = decode_spectrogram_matrix(data)
+            np.testing.assert_array_equal(decoded_values, values)
+            self.assertEqual(decoded_header, header)
+            
+            with self.assertRaises(ValueError):
+                spectrogram_matrix(audio, 0, len(audio), 20, min_frequency=5000)
+        
+        self.assertGreater(contrast['max'], 20)
+        self.assertGreater(contrast['max'], contrast['mean'])
+    
+    def test_spectrogram_data_endpoint(self):
+        """Test that the endpoint serves and caches windows, and that get_graph_data links to it"""
+        from django.urls import reverse
+        from .spectrogram_cache import spectrogram_cache_directory
+        from .spectrogram_data import decode_spectrogram_matrix
+        
+        staff_user = User.objects.create_user(username='staff@test.com', email='staff@test.com', password='staffpassword', user_type='2')
+        self.client.force_login(staff_user)
+        url = reverse('api_spectrogram_data', args=[self.audio_file.file_id])
+        
+        with override_settings(MEDIA_ROOT=self.test_dir):
+            response = self.client.get(url, {'start': 2, 'end': 6, 'width': 40, 'height': 32, 'fmax': 2000})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], 'application/octet-stream')
+            values, header = decode_spectrogram_matrix(b''.join(response.streaming_content))
+            self.assertEqual(values.shape, (32, 40))
+            self.assertEqual((header['start_seconds'], header['end_seconds']), (2.0, 6.0))
+            
+            # The same window again comes from the cache
+            self.assertEqual(self.client.get(url, {'start': 2, 'end': 6, 'width': 40, 'height': 32, 'fmax': 2000}).status_code, 200)
+            self.assertEqual(len(os.listdir(os.path.join(spectrogram_cache_directory(), str(self.audio_file.pk)))), 1)
+            
+            self.assertEqual(self.client.get(url, {'width': 0}).status_code, 400)
+            self.assertEqual(self.client.get(url, {'pool': 'median'}).status_code, 400)
+            self.assertEqual(self.client.get(url, {'fmin': 5000}).status_code, 400)
+            
+            response = self.client.get(reverse('get_graph_data'), {
+                'date': timezone.localdate().strftime('%Y-%m-%d'), 'spectrograph': 'true', 'fourier': 'true'
+            })
+            data = response.json()
+            self.assertEqual(data['file_id'], self.audio_file.file_id)
+            self.assertEqual(data['spectrograph']['data_url'], url)
+            self.assertEqual(len(data['fourier']['frequencies']), len(data['fourier']['magnitudes']))
+            # The click is the loudest part of the spectrum
+            peak = data['fourier']['frequencies'][int(np.argmax(data['fourier']['magnitudes']))]
+            self.assertAlmostEqual(peak, 1000, delta=50)
+
+class WaveformPeaksTests(TestCase):
+    """Tests for the waveform peak pyramid and its endpoint"""
+    
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        # 1000 samples at 8 kHz of a ramp with a spike, so every bucket has distinct peaks
+        self.samples = (np.arange(1000) % 100 - 50).astype(np.int16) * 100
+        self.samples[503] = 32000
+        self.test_wav_path = os.path.join(self.test_dir, 'peaks.wav')
+        wavfile.write(self.test_wav_path, 8000, self.samples)
+        self.audio_file = OriginalAudioFile.objects.create(
+            audio_file='peaks.wav',
+            audio_file_name='peaks.wav',
+            animal_type='amur_tiger',
+            file_size_mb=1.0
+        )
+    
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+    
+    def test_build_peak_pyramid(self):
+        """Test that every level holds the exact min/max of its buckets, including partial ones"""
+        from .waveform_peaks import build_peak_pyramid, read_peaks, read_peak_header, choose_peak_level
+        
+        peaks_path = os.path.join(self.test_dir, 'peaks.bin')
+        with AudioSource(self.test_wav_path) as audio:
+            # Small blocks so buckets of several blocks are combined
+            header = build_peak_pyramid(audio, peaks_path, levels=(16, 4, 64), block_buckets=2)
+        self.assertEqual([level['samples_per_bucket'] for level in header['levels']], [4, 16, 64])
+        self.assertEqual([level['buckets'] for level in header['levels']], [250, 63, 16])
+        self.assertEqual(read_peak_header(peaks_path)[0], header)
+        
+        for samples_per_bucket in (4, 16, 64):
+            peaks = read_peaks(peaks_path, samples_per_bucket)
+            for bucket in range(len(peaks)):
+                values = self.samples[bucket * samples_per_bucket:(bucket + 1) * samples_per_bucket]
+                # Samples are scaled by 32767/32768 and rounded on the way to int16
+                self.assertAlmostEqual(int(peaks[bucket, 0]), int(values.min()), delta=1)
+                self.assertAlmostEqual(int(peaks[bucket, 1]), int(values.max()), delta=1)
+        self.assertAlmostEqual(int(read_peaks(peaks_path, 16)[31, 1]), 32000, delta=1)
+        
+        np.testing.assert_array_equal(read_peaks(peaks_path, 16, 10, 12), read_peaks(peaks_path, 16)[10:12])
+        self.assertEqual(len(read_peaks(peaks_path, 16, 60, 1000)), 3)
+        with self.assertRaises(ValueError):
+            read_peaks(peaks_path, 8)
+        with self.assertRaises(ValueError):
+            build_peak_pyramid(audio, peaks_path, levels=(4, 6))
+        
+        self.assertEqual(choose_peak_level(header, 1000, 60)['samples_per_bucket'], 16)
+        self.assertEqual(choose_peak_level(header, 1000, 10)['samples_per_bucket'], 64)
+        self.assertEqual(choose_peak_level(header, 100, 500)['samples_per_bucket'], 4)
+    
+    @override_settings(WAVEFORM_PEAK_LEVELS=(4, 16, 64))
+    def test_waveform_peaks_endpoint(self):
+        """Test that generate_waveform_peaks records the pyramid and the endpoint serves windows of it"""
+        import struct
+        from django.urls import reverse
+        from .audio_processing import generate_waveform_peaks, waveform_peaks_url
+        
+        staff_user = User.objects.create_user(username='staff@test.com', email='staff@test.com', password='staffpassword', user_type='2')
+        self.client.force_login(staff_user)
+        url = reverse('api_waveform_peaks', args=[self.audio_file.file_id])
+        
+        def get_peaks(params):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            header_length = struct.unpack_from('<I', response.content)[0]
+            header = json.loads(response.content[4:4 + header_length])
+            values = np.frombuffer(response.content, dtype='<i2', offset=4 + header_length).reshape(-1, 2)
+            self.assertEqual(len(values), header['buckets'])
+            return header, values
+        
+        with override_settings(MEDIA_ROOT=self.test_dir):
+            self.assertIsNone(waveform_peaks_url(self.audio_file))
+            self.assertEqual(self.client.get(url).status_code, 404)
+            
+            waveform = generate_waveform_peaks(self.test_wav_path, self.audio_file)
+            self.assertIsNotNone(waveform)
+            self.assertTrue(os.path.exists(os.path.join(self.test_dir, waveform.peaks_path)))
+            self.assertEqual(waveform_peaks_url(self.audio_file), url)
+            
+            # The whole file 20 pixels wide reads the 16-sample level
+            header, values = get_peaks({'width': 20})
+            self.assertEqual((header['samples_per_bucket'], header['first_bucket'], header['buckets']), (16, 0, 63))
+            self.assertEqual(header['levels'], [4, 16, 64])
+            self.assertEqual((header['sample_rate'], header['length']), (8000, 1000))
+            
+            # 100 samples from 0.06 s at 20 pixels read the 4-sample level
+            header, values = get_peaks({'start': 0.06, 'end': 0.0725, 'width': 20})
+            self.assertEqual((header['samples_per_bucket'], header['first_bucket'], header['buckets']), (4, 120, 25))
+            self.assertAlmostEqual(int(values[:, 1].max()), 32000, delta=1)
+            
+            header, values = get_peaks({'samples_per_bucket': 64})
+            self.assertEqual(header['buckets'], 16)
+            
+            self.assertEqual(self.client.get(url, {'width': 0}).status_code, 400)
+            self.assertEqual(self.client.get(url, {'start': 'x'}).status_code, 400)
+            self.assertEqual(self.client.get(url, {'samples_per_bucket': 8}).status_code, 400)
+
+
+class AudioStreamingTests(TestCase):
+    """Tests for streaming recordings and clip windows with Range requests"""
+    
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        rng = np.random.default_rng(0)
+        self.samples = (rng.standard_normal((8000, 2)) * 3000).astype(np.int16)
+        self.test_wav_path = os.path.join(self.test_dir, 'stream.wav')
+        wavfile.write(self.test_wav_path, 8000, self.samples)
+        self.audio_file = OriginalAudioFile.objects.create(
+            audio_file='stream.wav',
+            audio_file_name='stream.wav',
+            animal_type='amur_tiger',
+            file_size_mb=1.0
+        )
+    
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+    
+    def window_bytes(self, file_path, parts):
+        data = b''
+        with open(file_path, 'rb') as f:
+            for part in parts:
+                if isinstance(part, bytes):
+                    data += part
+                else:
+                    f.seek(part[0])
+                    data += f.read(part[1])
+        return data
+    
+    def test_wav_window_parts(self):
+        """Test that a synthesized window decodes to exactly the frames of the clip"""
+        import io
+        from .audio_access import wav_window_parts
+        from .audio_streaming import parse_range_header, RangeNotSatisfiable
+        
+        parts, size = wav_window_parts(self.test_wav_path, 1000, 3000)
+        data = self.window_bytes(self.test_wav_path, parts)
+        self.assertEqual(len(data), size)
+        sample_rate, window = wavfile.read(io.BytesIO(data))
+        self.assertEqual(sample_rate, 8000)
+        np.testing.assert_array_equal(window, self.samples[1000:3000])
+        
+        # Odd-sized data is padded, and ranges are clamped to the recording
+        odd_path = os.path.join(self.test_dir, 'odd.wav')
+        odd_samples = np.arange(101, dtype=np.uint8)
+        wavfile.write(odd_path, 8000, odd_samples)
+        parts, size = wav_window_parts(odd_path, 50, 1000)
+        data = self.window_bytes(odd_path, parts)
+        self.assertEqual(size % 2, 0)
+        np.testing.assert_array_equal(wavfile.read(io.BytesIO(data))[1], odd_samples[50:])
+        
+        self.assertEqual(parse_range_header(None, 100), None)
+        self.assertEqual(parse_range_header('bytes=10-19', 100), (10, 19))
+        self.assertEqual(parse_range_header('bytes=90-', 100), (90, 99))
+        self.assertEqual(parse_range_header('bytes=-10', 100), (90, 99))
+        self.assertEqual(parse_range_header('bytes=0-1000', 100), (0, 99))
+        self.assertEqual(parse_range_header('bytes=0-1,5-9', 100), None)
+        with self.assertRaises(RangeNotSatisfiable):
+            parse_range_header('bytes=100-', 100)
+    
+    def test_stream_audio_endpoint(self):
+        """Test whole-file and window streaming with and without Range headers"""
+        import io
+        from django.urls import reverse
+        from .audio_processing import audio_stream_url
+        
+        staff_user = User.objects.create_user(username='staff@test.com', email='staff@test.com', password='staffpassword', user_type='2')
+        self.client.force_login(staff_user)
+        url = reverse('api_stream_audio', args=[self.audio_file.file_id])
+        with open(self.test_wav_path, 'rb') as f:
+            original = f.read()
+        
+        with override_settings(MEDIA_ROOT=self.test_dir):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Accept-Ranges'], 'bytes')
+            self.assertEqual(b''.join(response.streaming_content), original)
+            
+            response = self.client.get(url, HTTP_RANGE='bytes=100-199')
+            self.assertEqual(response.status_code, 206)
+            self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(original)}')
+            self.assertEqual(response['Content-Length'], '100')
+            self.assertEqual(b''.join(response.streaming_content), original[100:200])
+            
+            self.assertEqual(self.client.get(url, HTTP_RANGE=f'bytes={len(original)}-').status_code, 416)
+            
+            # A clip window, read whole and in two ranges across the header
+            clip_url = audio_stream_url(self.audio_file, 0.25, 0.5)
+            self.assertTrue(clip_url.startswith(url))
+            response = self.client.get(clip_url)
+            self.assertEqual(response['Content-Type'], 'audio/wav')
+            window = b''.join(response.streaming_content)
+            np.testing.assert_array_equal(wavfile.read(io.BytesIO(window))[1], self.samples[2000:4000])
+            head = b''.join(self.client.get(clip_url, HTTP_RANGE='bytes=0-29').streaming_content)
+            tail = b''.join(self.client.get(clip_url, HTTP_RANGE='bytes=30-').streaming_content)
+            self.assertEqual(head + tail, window)
+            
+            self.assertEqual(self.client.get(url, {'start': 2, 'end': 1}).status_code, 400)
+            self.assertEqual(self.client.get(url, {'start': 'x'}).status_code, 400)
+            
+            os.remove(self.test_wav_path)
+            self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class VirtualClipTests(TestCase):
+    """Tests for playing detected saw calls without segment files and reclaiming those files"""
+    
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        rng = np.random.default_rng(0)
+        self.samples = (rng.standard_normal(16000) * 3000).astype(np.int16)
+        wavfile.write(os.path.join(self.test_dir, 'clips.wav'), 8000, self.samples)
+        self.audio_file = OriginalAudioFile.objects.create(
+            audio_file='clips.wav',
+            audio_file_name='clips.wav',
+            animal_type='amur_tiger',
+            file_size_mb=1.0
+        )
+        # A clip saved as a segment file before sample ranges were recorded
+        os.makedirs(os.path.join(self.test_dir, 'detected_noises'))
+        wavfile.write(os.path.join(self.test_dir, 'detected_noises', 'clips_segment_1.wav'), 8000, self.samples[4000:8000])
+        self.segment_clip = DetectedNoiseAudioFile.objects.create(
+            original_file=self.audio_file,
+            detected_noise_file_path='detected_noises/clips_segment_1.wav',
+            start_time='00:00:00.5',
+            end_time='00:00:01',
+            saw_count=3,
+            saw_call_count=1,
+            file_size_mb=0.01
+        )
+        self.virtual_clip = DetectedNoiseAudioFile.objects.create(
+            original_file=self.audio_file,
+            detected_noise_file_path='',
+            start_time='00:00:01',
+            end_time='00:00:01.5',
+            start_sample=8000,
+            end_sample=12000,
+            saw_count=2,
+            saw_call_count=1,
+            file_size_mb=0.0
+        )
+        staff_user = User.objects.create_user(username='staff@test.com', email='staff@test.com', password='staffpassword', user_type='2')
+        self.client.force_login(staff_user)
+    
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+    
+    def get_clip(self, clip, **headers):
+        import io
+        response = self.client.get(reverse('api_stream_clip', args=[clip.pk]), **headers)
+        self.assertIn(response.status_code, (200, 206))
+        data = b''.join(response.streaming_content)
+        return response, (wavfile.read(io.BytesIO(data))[1] if response.status_code == 200 else data)
+    
+    def test_stream_clips(self):
+        """Test that segment files and virtual clips are served, and virtual clips are cached"""
+        from . import audio_access
+        
+        with override_settings(MEDIA_ROOT=self.test_dir):
+            np.testing.assert_array_equal(self.get_clip(self.segment_clip)[1], self.samples[4000:8000])
+            np.testing.assert_array_equal(self.get_clip(self.virtual_clip)[1], self.samples[8000:12000])
+            
+            # Played again from the cache, also by range
+            with patch.object(audio_access, 'wav_window_parts', wraps=audio_access.wav_window_parts) as cut:
+                response, data = self.get_clip(self.virtual_clip, HTTP_RANGE='bytes=44-45')
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(data, self.samples[8000:8001].tobytes())
+                self.assertFalse(cut.called)
+            
+            # Without the cache the clip is streamed from the recording
+            with override_settings(DETECTED_CLIP_CACHE_MB=0):
+                other = DetectedNoiseAudioFile.objects.get(pk=self.virtual_clip.pk)
+                other.end_sample = 11000
+                other.save()
+                np.testing.assert_array_equal(self.get_clip(other)[1], self.samples[8000:11000])
+            
+            self.assertEqual(self.client.get(reverse('api_stream_clip', args=[999])).status_code, 404)
+    
+    def test_reclaim_segment_files(self):
+        """Test that the command turns segment files into virtual clips that play the same audio"""
+        from io import StringIO
+        from django.core.management import call_command
+        
+        segment_path = os.path.join(self.test_dir, 'detected_noises', 'clips_segment_1.wav')
+        with override_settings(MEDIA_ROOT=self.test_dir):
+            output = StringIO()
+            call_command('reclaim_segment_files', '--dry-run', stdout=output)
+            self.assertIn('Would reclaim 1 segment files', output.getvalue())
+            self.assertTrue(os.path.exists(segment_path))
+            
+            call_command('reclaim_segment_files', stdout=StringIO())
+            self.assertFalse(os.path.exists(segment_path))
+            self.segment_clip.refresh_from_db()
+            self.assertEqual(self.segment_clip.detected_noise_file_path, '')
+            self.assertEqual(self.segment_clip.file_size_mb, 0.0)
+            self.assertEqual((self.segment_clip.start_sample, self.segment_clip.end_sample), (4000, 8000))
+            np.testing.assert_array_equal(self.get_clip(self.segment_clip)[1], self.samples[4000:8000])
+            
+            # Clips whose recording is gone keep their file
+            other = OriginalAudioFile.objects.create(audio_file='missing.wav', audio_file_name='missing.wav',
+                                                     animal_type='amur_tiger', file_size_mb=1.0)
+            DetectedNoiseAudioFile.objects.create(original_file=other, detected_noise_file_path='detected_noises/missing.wav',
+                                                  start_time='00:00:00', end_time='00:00:01', saw_count=1, saw_call_count=1)
+            output = StringIO()
+            call_command('reclaim_segment_files', stdout=output)
+            self.assertIn('Kept 1 segment files', output.getvalue())
+
+
+class ChunkedUploadTests(TestCase):
+    """Tests for resumable chunked uploads"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='staff@test.com', email='staff@test.com',
+                                             password='staffpassword', user_type='2')
+        self.client.force_login(self.user)
+        self.zoo = Zoo.objects.create(zoo_name='Test Zoo', contact_email='zoo@test.com')
+        AnimalTable.objects.create(species_name='Amur Leopard', zoo=self.zoo)
+        
+        self.test_dir = tempfile.mkdtemp()
+        self.media_override = override_settings(MEDIA_ROOT=self.test_dir)
+        self.media_override.enable()
+        
+        sample_rate = 8000
+        t = np.linspace(0, 2, 2 * sample_rate, endpoint=False)
+        wav_path = os.path.join(self.test_dir, 'source.wav')
+        wavfile.write(wav_path, sample_rate, (10000 * np.sin(2 * np.pi * 440 * t)).astype(np.int16))
+        with open(wav_path, 'rb') as f:
+            self.content = f.read()
+        os.remove(wav_path)
+    
+    def tearDown(self):
+        self.media_override.disable()
+        shutil.rmtree(self.test_dir)
+    
+    def init_upload(self, **extra):
+        import hashlib
+        data = {'file_name': 'SMM07257_20230201_171502.wav', 'total_size': len(self.content),
+                'animal_type': 'amur_leopard', 'zoo': self.zoo.pk,
+                'sha256': hashlib.sha256(self.content).hexdigest()}
+        data.update(extra)
+        return self.client.post(reverse('api_init_chunked_upload'), data)
+    
+    def send_chunk(self, upload_id, offset, data, checksum=None):
+        import hashlib
+        return self.client.post(
+            reverse('api_upload_chunk', args=[upload_id]) + f'?offset={offset}', data,
+            content_type='application/octet-stream',
+            HTTP_X_CHUNK_SHA256=checksum or hashlib.sha256(data).hexdigest(),
+        )
+    
+    def test_resumable_upload(self):
+        """Test that chunks are verified, resumed from received_bytes and finalized into the upload flow"""
+        import hashlib
+        from .chunked_uploads import upload_part_path
+        
+        response = self.init_upload()
+        self.assertEqual(response.status_code, 200)
+        upload_id = response.json()['upload_id']
+        part_path = upload_part_path(ChunkedUpload.objects.get(upload_id=upload_id))
+        chunk = 10000
+        
+        self.assertEqual(self.send_chunk(upload_id, 0, self.content[:chunk]).json()['received_bytes'], chunk)
+        
+        # A corrupted chunk is rejected and leaves the upload where it was
+        corrupted = b'\x00' + self.content[chunk + 1:2 * chunk]
+        response = self.send_chunk(upload_id, chunk, corrupted,
+                                   checksum=hashlib.sha256(self.content[chunk:2 * chunk]).hexdigest())
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['received_bytes'], chunk)
+        self.assertEqual(os.path.getsize(part_path), chunk)
+        
+        # So is a chunk that does not continue the upload
+        response = self.send_chunk(upload_id, 2 * chunk, self.content[2 * chunk:3 * chunk])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['received_bytes'], chunk)
+        
+        # Finalizing an incomplete upload fails
+        self.assertEqual(self.client.post(reverse('api_finalize_chunked_upload', args=[upload_id])).status_code, 400)
+        
+        # The client resumes from what the server reports
+        status = self.client.get(reverse('api_get_chunked_upload', args=[upload_id])).json()
+        offset = status['received_bytes']
+        while offset < len(self.content):
+            response = self.send_chunk(upload_id, offset, self.content[offset:offset + chunk])
+            self.assertEqual(response.status_code, 200)
+            offset = response.json()['received_bytes']
+        
+        response = self.client.post(reverse('api_finalize_chunked_upload', args=[upload_id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.json()['duplicate'])
+        audio_file = OriginalAudioFile.objects.get(pk=response.json()['file_id'])
+        self.assertEqual(audio_file.audio_file.name,
+                         'audio_files/amur_leopard/2023/02/01/amur_leopard_SMM07257_20230201_171502.wav')
+        self.assertEqual(audio_file.sample_rate, 8000)
+        self.assertEqual(audio_file.zoo, self.zoo)
+        with audio_file.audio_file.open('rb') as stored_file:
+            self.assertEqual(stored_file.read(), self.content)
+        self.assertFalse(os.path.exists(part_path))
+        self.assertEqual(ChunkedUpload.objects.get(upload_id=upload_id).status, 'complete')
+        
+        # The same recording uploaded again is recognized as a duplicate
+        upload_id = self.init_upload(file_name='copy.wav').json()['upload_id']
+        self.send_chunk(upload_id, 0, self.content)
+        response = self.client.post(reverse('api_finalize_chunked_upload', args=[upload_id]))
+        self.assertTrue(response.json()['duplicate'])
+        self.assertEqual(response.json()['file_id'], audio_file.pk)
+        self.assertEqual(OriginalAudioFile.objects.count(), 1)
+    
+    def test_finalize_conflicts(self):
+        """Test that a finalize retry cannot store the file twice and storage errors are not 500s"""
+        upload_id = self.init_upload().json()['upload_id']
+        self.send_chunk(upload_id, 0, self.content)
+        finalize_url = reverse('api_finalize_chunked_upload', args=[upload_id])
+        
+        # Storing failed; the part file is kept and finalizing can be retried
+        with patch('vocalization_management_app.audio_processing.handle_duplicate_file', side_effect=OSError('Disk full')):
+            response = self.client.post(finalize_url)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['status'], 'uploading')
+        
+        # Another request is storing the file
+        ChunkedUpload.objects.filter(upload_id=upload_id).update(status='finalizing')
+        self.assertEqual(self.client.post(finalize_url).status_code, 409)
+        ChunkedUpload.objects.filter(upload_id=upload_id).update(status='uploading')
+        
+        response = self.client.post(finalize_url)
+        self.assertEqual(response.status_code, 200)
+        file_id = response.json()['file_id']
+        # A retry whose first response was lost gets the stored file
+        response = self.client.post(finalize_url)
+        self.assertEqual((response.status_code, response.json()['file_id']), (200, file_id))
+        self.assertEqual(OriginalAudioFile.objects.count(), 1)
+    
+    def test_upload_checksum_and_ownership(self):
+        """Test that a file not matching its digest fails and that uploads are private to their user"""
+        upload_id = self.init_upload(sha256='0' * 64).json()['upload_id']
+        self.send_chunk(upload_id, 0, self.content)
+        response = self.client.post(reverse('api_finalize_chunked_upload', args=[upload_id]))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(ChunkedUpload.objects.get(upload_id=upload_id).status, 'failed')
+        self.assertFalse(OriginalAudioFile.objects.exists())
+        
+        self.assertEqual(self.init_upload(file_name='notes.txt').status_code, 400)
+        
+        upload_id = self.init_upload().json()['upload_id']
+        other = User.objects.create_user(username='other@test.com', email='other@test.com',
+                                         password='otherpassword', user_type='2')
+        self.client.force_login(other)
+        self.assertEqual(self.send_chunk(upload_id, 0, self.content).status_code, 404)
+
 
 class AuthenticationTests(TestCase):
     """Tests for authentication functionality"""
@@ -373,6 +1927,194 @@ class FileUploadTests(TestCase):
         # This test is now redundant since we're skipping the actual upload
         # and directly creating records. We'll just pass.
         pass
+    
+    def test_upload_handlers_hash_content(self):
+        """Test that both upload handlers attach the SHA-256 of what they stored"""
+        import hashlib
+        from .upload_handlers import HashingMemoryFileUploadHandler, HashingTemporaryFileUploadHandler, file_content_hash
+        from django.core.files.uploadhandler import StopFutureHandlers
+        
+        with open(self.test_wav_path, 'rb') as f:
+            content = f.read()
+        expected = hashlib.sha256(content).hexdigest()
+        
+        for handler_class in (HashingMemoryFileUploadHandler, HashingTemporaryFileUploadHandler):
+            handler = handler_class()
+            handler.handle_raw_input(None, {}, len(content), 'boundary')
+            try:
+                handler.new_file('audio_files', 'upload.wav', 'audio/wav', len(content))
+            except StopFutureHandlers:
+                pass
+            for start in range(0, len(content), 10000):
+                self.assertIsNone(handler.receive_data_chunk(content[start:start + 10000], start))
+            uploaded_file = handler.file_complete(len(content))
+            self.assertEqual(uploaded_file.content_hash, expected)
+            self.assertEqual(file_content_hash(uploaded_file), expected)
+        
+        # Files from elsewhere are hashed when asked
+        self.assertEqual(file_content_hash(SimpleUploadedFile('other.wav', content)), expected)
+    
+    def test_duplicate_uploads_by_content(self):
+        """Test that identical uploads reuse the existing file and same-named different ones do not replace it"""
+        with open(self.test_wav_path, 'rb') as f:
+            content = f.read()
+        
+        first, is_duplicate, existing_file_id = handle_duplicate_file(
+            SimpleUploadedFile('SMM07257_20230201_171502.wav', content), self.animal_type, zoo=self.zoo)
+        self.assertFalse(is_duplicate)
+        self.assertIsNone(existing_file_id)
+        self.assertEqual(len(first.content_hash), 64)
+        DetectedNoiseAudioFile.objects.create(original_file=first, start_time='00:00:00', end_time='00:00:01',
+                                              saw_count=3, saw_call_count=1)
+        
+        # The same bytes under another name are the same recording
+        again, is_duplicate, existing_file_id = handle_duplicate_file(
+            SimpleUploadedFile('renamed.wav', content), self.animal_type, zoo=self.zoo)
+        self.assertTrue(is_duplicate)
+        self.assertEqual((again.pk, existing_file_id), (first.pk, first.pk))
+        self.assertEqual(OriginalAudioFile.objects.count(), 1)
+        
+        # A different recording with the same name is kept next to the first
+        different = content[:-2] + b'\x01\x02'
+        second, is_duplicate, _ = handle_duplicate_file(
+            SimpleUploadedFile('SMM07257_20230201_171502.wav', different), self.animal_type, zoo=self.zoo)
+        self.assertFalse(is_duplicate)
+        self.assertNotEqual(second.pk, first.pk)
+        self.assertNotEqual(second.audio_file.name, first.audio_file.name)
+        self.assertEqual(DetectedNoiseAudioFile.objects.filter(original_file=first).count(), 1)
+        with first.audio_file.open('rb') as stored_file:
+            self.assertEqual(stored_file.read(), content)
+        
+        # Files stored before hashes were recorded are hashed on the first upload with their name
+        OriginalAudioFile.objects.filter(pk=first.pk).update(content_hash=None)
+        again, is_duplicate, _ = handle_duplicate_file(
+            SimpleUploadedFile('SMM07257_20230201_171502.wav', content), self.animal_type, zoo=self.zoo)
+        self.assertTrue(is_duplicate)
+        self.assertEqual(again.pk, first.pk)
+        first.refresh_from_db()
+        self.assertEqual(first.content_hash, again.content_hash)
+    
+    def test_media_upload_saved_to_dated_path(self):
+        """Test that large uploads stream into media storage and are saved to their dated path by a rename"""
+        from .upload_handlers import HashingMediaFileUploadHandler
+        from django.core.files.uploadhandler import StopFutureHandlers
+        
+        with open(self.test_wav_path, 'rb') as f:
+            content = f.read()
+        media_root = os.path.join(self.test_dir, 'media')
+        
+        with override_settings(MEDIA_ROOT=media_root):
+            handler = HashingMediaFileUploadHandler()
+            handler.handle_raw_input(None, {}, len(content), 'boundary')
+            try:
+                handler.new_file('audio_files', 'SMM07257_20230201_171502.wav', 'audio/wav', len(content))
+            except StopFutureHandlers:
+                pass
+            for start in range(0, len(content), 10000):
+                handler.receive_data_chunk(content[start:start + 10000], start)
+            uploaded_file = handler.file_complete(len(content))
+            
+            temp_path = uploaded_file.temporary_file_path()
+            self.assertEqual(os.path.dirname(temp_path), os.path.join(media_root, 'storage', 'temp'))
+            self.assertEqual(uploaded_file.wav_header['sample_rate'], self.sample_rate)
+            self.assertEqual(len(uploaded_file.content_hash), 64)
+            
+            original_audio, is_duplicate, _ = handle_duplicate_file(uploaded_file, self.animal_type, zoo=self.zoo)
+            uploaded_file.close()
+            self.assertFalse(is_duplicate)
+            self.assertEqual(original_audio.audio_file.name,
+                             'audio_files/amur_leopard/2023/02/01/amur_leopard_SMM07257_20230201_171502.wav')
+            self.assertEqual(original_audio.sample_rate, self.sample_rate)
+            self.assertEqual(original_audio.frame_count, self.sample_rate * self.duration)
+            # The temporary file was renamed, not copied
+            self.assertFalse(os.path.exists(temp_path))
+            with original_audio.audio_file.open('rb') as stored_file:
+                self.assertEqual(stored_file.read(), content)
+            
+            # Organizing by date leaves it where it is
+            update_audio_metadata(original_audio.audio_file.path, original_audio)
+            original_audio.refresh_from_db()
+            self.assertEqual(original_audio.audio_file.name,
+                             'audio_files/amur_leopard/2023/02/01/amur_leopard_SMM07257_20230201_171502.wav')
+            self.assertTrue(os.path.exists(original_audio.audio_file.path))
+    
+    def test_organize_renames_file(self):
+        """Test that organizing by date renames the file in place, and copies only across devices"""
+        import errno
+        from datetime import datetime
+        from django.core.files.base import ContentFile
+        from .audio_processing import organize_audio_file_by_date
+        
+        with open(self.test_wav_path, 'rb') as f:
+            content = f.read()
+        media_root = os.path.join(self.test_dir, 'media')
+        recording_date = datetime(2023, 2, 1, 17, 15, 2)
+        
+        with override_settings(MEDIA_ROOT=media_root):
+            for cross_device in (False, True):
+                audio_file = OriginalAudioFile(audio_file_name='SMM07257_20230201_171502.wav',
+                                               animal_type=self.animal_type, zoo=self.zoo)
+                audio_file.audio_file.save('SMM07257_20230201_171502.wav', ContentFile(content))
+                old_path = audio_file.audio_file.path
+                self.assertIn('storage/temp/', audio_file.audio_file.name)
+                inode = os.stat(old_path).st_ino
+                
+                if cross_device:
+                    with patch('django.core.files.move.os.rename', side_effect=OSError(errno.EXDEV, 'Cross-device link')):
+                        self.assertTrue(organize_audio_file_by_date(audio_file, recording_date))
+                else:
+                    self.assertTrue(organize_audio_file_by_date(audio_file, recording_date))
+                
+                audio_file.refresh_from_db()
+                self.assertTrue(audio_file.audio_file.name.startswith('audio_files/amur_leopard/2023/02/01/amur_leopard_SMM07257'))
+                self.assertFalse(os.path.exists(old_path))
+                with audio_file.audio_file.open('rb') as stored_file:
+                    self.assertEqual(stored_file.read(), content)
+                # Renamed, not copied, on the same device
+                self.assertEqual(os.stat(audio_file.audio_file.path).st_ino == inode, not cross_device)
+    
+    def test_move_stored_file_without_local_paths(self):
+        """Test that files are moved within storages that have no local paths"""
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import Storage
+        from .stored_files import move_stored_file
+        
+        class RemoteStorage(Storage):
+            """Storage of blobs in a dict, without local paths"""
+            def __init__(self):
+                self.blobs = {}
+            
+            def _save(self, name, content):
+                self.blobs[name] = content.read()
+                return name
+            
+            def _open(self, name, mode='rb'):
+                return ContentFile(self.blobs[name], name=name)
+            
+            def exists(self, name):
+                return name in self.blobs
+            
+            def delete(self, name):
+                self.blobs.pop(name, None)
+        
+        storage = RemoteStorage()
+        storage.save('storage/temp/a.wav', ContentFile(b'RIFF data'))
+        new_name = move_stored_file(storage, 'storage/temp/a.wav', 'audio_files/x/2023/02/01/a.wav')
+        self.assertEqual(new_name, 'audio_files/x/2023/02/01/a.wav')
+        self.assertFalse(storage.exists('storage/temp/a.wav'))
+        with storage.open(new_name, 'rb') as moved:
+            self.assertEqual(moved.read(), b'RIFF data')
+        
+        # Blob containers copy server-side instead of streaming through the app
+        from unittest.mock import MagicMock
+        storage.client = MagicMock()
+        storage._get_valid_path = lambda name: name
+        storage.client.get_blob_client.return_value.start_copy_from_url.return_value = {'copy_status': 'success'}
+        with patch.object(storage, '_open') as read_blob:
+            move_stored_file(storage, new_name, 'audio_files/x/2023/02/02/a.wav')
+            read_blob.assert_not_called()
+        storage.client.get_blob_client.return_value.start_copy_from_url.assert_called_once()
+        self.assertFalse(storage.exists(new_name))
 
 class SearchTests(TestCase):
     """Tests for search functionality"""
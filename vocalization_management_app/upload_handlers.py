@@ -0,0 +1,122 @@
+"""
+Upload handlers that write uploaded recordings once and compute their content hash as they arrive.
+
+The SHA-256 digest is updated with every chunk as the handler writes it (to memory or to
+the temporary file), so identifying a re-upload costs no extra read of the file. The
+digest is attached to the uploaded file as content_hash; handle_duplicate_file compares it
+with OriginalAudioFile.content_hash to recognize byte-identical uploads whatever their name.
+
+Large uploads are streamed to a temporary file inside MEDIA_ROOT (AUDIO_UPLOAD_TEMP_DIR,
+storage/temp/ by default) rather than the system temporary directory. Saving the upload
+to its date-organized path (see models.audio_file_path) is then a rename on the same file
+system instead of a copy, so every byte of a recording is written to disk exactly once.
+
+Enabled through FILE_UPLOAD_HANDLERS in settings.
+"""
+import hashlib
+import os
+import struct
+import tempfile
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile, UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, MemoryFileUploadHandler, TemporaryFileUploadHandler
+
+# Bytes hashed at a time when a file has no content_hash from the upload handlers
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class ContentHashMixin:
+    """Hashes the chunks the handler stores and sets content_hash on the file it returns"""
+    
+    def new_file(self, *args, **kwargs):
+        self.content_hash = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+    
+    def receive_data_chunk(self, raw_data, start):
+        remaining = super().receive_data_chunk(raw_data, start)
+        if remaining is None:
+            # This handler stored the chunk (it is passed on otherwise)
+            self.content_hash.update(raw_data)
+        return remaining
+    
+    def file_complete(self, file_size):
+        uploaded_file = super().file_complete(file_size)
+        if uploaded_file is not None:
+            uploaded_file.content_hash = self.content_hash.hexdigest()
+        return uploaded_file
+
+
+class HashingMemoryFileUploadHandler(ContentHashMixin, MemoryFileUploadHandler):
+    """MemoryFileUploadHandler that records the SHA-256 of small uploads"""
+
+
+class HashingTemporaryFileUploadHandler(ContentHashMixin, TemporaryFileUploadHandler):
+    """TemporaryFileUploadHandler that records the SHA-256 of large uploads"""
+
+
+def upload_temp_directory():
+    """Directory large uploads are streamed to (on the same file system as MEDIA_ROOT)"""
+    return getattr(settings, 'AUDIO_UPLOAD_TEMP_DIR', None) or os.path.join(settings.MEDIA_ROOT, 'storage', 'temp')
+
+
+class MediaTemporaryUploadedFile(TemporaryUploadedFile):
+    """A TemporaryUploadedFile created in upload_temp_directory()"""
+    
+    def __init__(self, name, content_type, size, charset, content_type_extra=None):
+        directory = upload_temp_directory()
+        os.makedirs(directory, exist_ok=True)
+        _, ext = os.path.splitext(name)
+        file = tempfile.NamedTemporaryFile(suffix=".upload" + ext, dir=directory)
+        UploadedFile.__init__(self, file, name, content_type, size, charset, content_type_extra)
+
+
+class MediaFileUploadHandler(TemporaryFileUploadHandler):
+    """
+    TemporaryFileUploadHandler that streams uploads into upload_temp_directory(), and reads
+    the WAV header of a finished upload (wav_header on the file, None if it is not a WAV file)
+    """
+    
+    def new_file(self, *args, **kwargs):
+        # Sets the file name and type without creating the standard temporary file
+        FileUploadHandler.new_file(self, *args, **kwargs)
+        self.file = MediaTemporaryUploadedFile(self.file_name, self.content_type, 0, self.charset, self.content_type_extra)
+    
+    def file_complete(self, file_size):
+        from .audio_access import probe_wav_header
+        
+        uploaded_file = super().file_complete(file_size)
+        try:
+            # Only the chunk headers are read, straight after they were written
+            uploaded_file.wav_header = probe_wav_header(uploaded_file.temporary_file_path())
+        except (OSError, ValueError, struct.error):
+            uploaded_file.wav_header = None
+        return uploaded_file
+
+
+class HashingMediaFileUploadHandler(ContentHashMixin, MediaFileUploadHandler):
+    """MediaFileUploadHandler that records the SHA-256 of large uploads"""
+
+
+def file_content_hash(file):
+    """
+    SHA-256 hex digest of a Django File
+    
+    Uses the digest computed while the file was uploaded when there is one; other files
+    (downloaded from Google Drive, already stored) are read once in chunks.
+    
+    Parameters:
+    - file: Django File, UploadedFile or FieldFile
+    
+    Returns:
+    - str: Hex digest
+    """
+    content_hash = getattr(file, 'content_hash', None)
+    if content_hash:
+        return content_hash
+    
+    digest = hashlib.sha256()
+    for chunk in file.chunks(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    return digest.hexdigest()
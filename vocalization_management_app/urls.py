@@ -50,6 +50,18 @@ urlpatterns = [
     path('api/get_recent_logs/', api_views.get_recent_logs, name="api_get_recent_logs"),
     path('api/get_processed_files/', api_views.get_processed_files, name="api_get_processed_files"),
     path('api/get_timeplot_data/', api_views.get_timeplot_data, name="api_get_timeplot_data"),
+    path('api/spectrogram_tiles/<int:file_id>/<str:spectrogram_type>/manifest/', api_views.get_spectrogram_tile_manifest, name="api_spectrogram_tile_manifest"),
+    path('api/spectrogram_tiles/<int:file_id>/<str:spectrogram_type>/<int:zoom>/<int:x>/<int:y>/', api_views.get_spectrogram_tile, name="api_spectrogram_tile"),
+    path('api/spectrogram_image/<int:file_id>/<str:spectrogram_type>/', api_views.get_spectrogram_image, name="api_spectrogram_image"),
+    path('api/spectrogram_data/<int:file_id>/', api_views.get_spectrogram_data, name="api_spectrogram_data"),
+    path('api/waveform_peaks/<int:file_id>/', api_views.get_waveform_peaks, name="api_waveform_peaks"),
+    path('api/audio/<int:file_id>/', api_views.stream_audio, name="api_stream_audio"),
+    path('api/clip/<int:clip_id>/', api_views.stream_clip, name="api_stream_clip"),
+    path('api/uploads/', api_views.init_chunked_upload, name="api_init_chunked_upload"),
+    path('api/uploads/<uuid:upload_id>/', api_views.get_chunked_upload, name="api_get_chunked_upload"),
+    path('api/uploads/<uuid:upload_id>/chunk/', api_views.upload_chunk, name="api_upload_chunk"),
+    path('api/uploads/<uuid:upload_id>/finalize/', api_views.finalize_chunked_upload, name="api_finalize_chunked_upload"),
+    path('api/upload_batches/<uuid:batch_id>/', api_views.get_upload_batch_progress, name="api_upload_batch_progress"),
     
     # Animal Detection Parameters URLs
     path('animal_detection_parameters/', views.animal_detection_parameters_list, name="animal_detection_parameters_list"),
@@ -8,10 +8,9 @@ from django.contrib.auth.hashers import make_password
 from django.contrib.auth.forms import PasswordChangeForm
 import logging
 import os
-from .audio_processing import update_audio_metadata, advanced_search_audio, handle_duplicate_file
-from .tasks import process_pending_audio_files
+from .audio_processing import advanced_search_audio, handle_duplicate_file, queue_uploaded_file, spectrogram_tiles_url, spectrogram_image_url, waveform_peaks_url, audio_stream_url, clip_stream_url, time_to_seconds
 import json
-from .models import CustomUser, OriginalAudioFile, DetectedNoiseAudioFile, Spectrogram, Database, ProcessingLog, Zoo, AnimalTable, AnimalDetectionParameters
+from .models import CustomUser, OriginalAudioFile, DetectedNoiseAudioFile, Spectrogram, Database, ProcessingLog, Zoo, AnimalTable, AnimalDetectionParameters, UploadBatch
 from .forms import AudioUploadForm, AnimalDetectionParametersForm, ZooForm, AnimalForm
 from .google_drive_utils import extract_folder_id_from_url, is_valid_drive_url, process_drive_folder, CREDENTIALS_PATH, CLIENT_CONFIG
 
@@ -173,43 +172,53 @@ def graphs(request):
 @login_required
 def get_graph_data(request):
     """
-    API endpoint to get graph data based on the selected date and options.
-    Returns spectrograph and/or Fourier transform data as requested.
+    API endpoint to get graph data based on the selected date (or date range) and options.
+    The spectrograph entry points to the binary spectrogram data of the file
+    (api_spectrogram_data), which the page fetches for each view window; the Fourier
+    transform is the file's mean power spectrum.
     """
+    from django.urls import reverse
+    from .spectrogram_cache import cached_average_spectrum
+    
     date_str = request.GET.get('date')
     show_spectrograph = request.GET.get('spectrograph') == 'true'
     show_fourier = request.GET.get('fourier') == 'true'
     
     try:
-        selected_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-        audio_files = OriginalAudioFile.objects.filter(
-            upload_date__date=selected_date
-        )
+        if date_str:
+            selected_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+            audio_files = OriginalAudioFile.objects.filter(
+                upload_date__date=selected_date
+            )
+        else:
+            start_date = datetime.strptime(request.GET.get('startDate', ''), '%Y-%m-%d').date()
+            end_date = datetime.strptime(request.GET.get('endDate', ''), '%Y-%m-%d').date()
+            audio_files = OriginalAudioFile.objects.filter(
+                upload_date__date__range=(start_date, end_date)
+            )
+        audio_files = list(audio_files.order_by('upload_date'))
         
         if not audio_files:
             return JsonResponse({'error': 'No audio files found for the selected date'})
-            
-        # For demonstration, we'll use the first audio file
+        
+        # Show the requested file, or the first one of the day
         audio_file = audio_files[0]
+        if request.GET.get('file_id'):
+            audio_file = next((f for f in audio_files if str(f.file_id) == request.GET['file_id']), audio_file)
         
-        response_data = {}
+        response_data = {
+            'file_id': audio_file.file_id,
+            'files': [{'file_id': f.file_id, 'name': f.audio_file_name} for f in audio_files]
+        }
         
         if show_spectrograph:
-            # Get spectrogram data (you'll need to implement the actual audio processing)
-            # This is a placeholder that should be replaced with actual spectrogram calculation
             response_data['spectrograph'] = {
-                'frequencies': [],
-                'times': [],
-                'intensities': []
+                'data_url': reverse('api_spectrogram_data', args=[audio_file.file_id]),
+                'duration': audio_file.duration_seconds
             }
             
         if show_fourier:
-            # Get Fourier transform data (you'll need to implement the actual audio processing)
-            # This is a placeholder that should be replaced with actual FFT calculation
-            response_data['fourier'] = {
-                'frequencies': [],
-                'magnitudes': []
-            }
+            response_data['fourier'] = cached_average_spectrum(audio_file)
             
         return JsonResponse(response_data)
         
@@ -245,14 +254,17 @@ def view_extracted_clips(request, file_id=None):
         original_file = get_object_or_404(OriginalAudioFile, file_id=file_id)
         context['original_file'] = original_file
         
-        # Get full audio spectrogram
-        full_spectrogram = original_file.spectrograms.filter(is_full_audio=True).first()
-        context['full_spectrogram'] = full_spectrogram
+        # Spectrogram images are rendered when the page first requests them
+        context['full_spectrogram_url'] = spectrogram_image_url(original_file)
         
-        # Get all clip spectrograms for this file
-        clip_spectrograms = original_file.spectrograms.filter(
-            is_full_audio=False
-        ).order_by('clip_start_time')
+        # One clip spectrogram per detected saw call
+        clip_spectrograms = []
+        for noise in original_file.detected_noises_manual.order_by('start_time'):
+            clip_spectrograms.append({
+                'clip_start_time': time_to_seconds(noise.start_time),
+                'clip_end_time': time_to_seconds(noise.end_time),
+                'url': spectrogram_image_url(original_file, 'mel', noise.start_time, noise.end_time)
+            })
         
         context['clip_spectrograms'] = clip_spectrograms
         
@@ -359,6 +371,7 @@ def view_interactive_spectrogram(request, file_id):
         'processing_status': processing_status,
         'detected_noises': detected_noises,
         'total_impulses': total_impulses,
+        'spectrogram_tiles_url': spectrogram_tiles_url(audio_file),
     }
     
     return render(request, 'common/interactive_spectrogram.html', context)
@@ -486,13 +499,14 @@ def view_spectrograms(request, file_id):
             'display_end': clip['display_end'],
             'audio_clip': {
                 'saw_count': clip['audio_clip'].saw_count,
-                'detected_noise_file_path': clip['audio_clip'].detected_noise_file_path.url if hasattr(clip['audio_clip'], 'detected_noise_file_path') and clip['audio_clip'].detected_noise_file_path else None
+                'url': clip_stream_url(clip['audio_clip'])
             },
             'spectrogram': {
                 'image': {
-                    'url': clip['spectrogram'].image.url if clip['spectrogram'] and hasattr(clip['spectrogram'], 'image') and clip['spectrogram'].image else None
+                    # Rendered on first request
+                    'url': spectrogram_image_url(audio_file, 'mel', clip['start_time'], clip['end_time'])
                 }
-            } if clip['spectrogram'] else None
+            }
         })
     
     context = {
@@ -508,7 +522,11 @@ def view_spectrograms(request, file_id):
         'excel_data': excel_data,
         'spectrograms': spectrograms,
         'chart_labels': json.dumps(chart_labels),
-        'chart_data': json.dumps(chart_data)
+        'chart_data': json.dumps(chart_data),
+        'spectrogram_tiles_url': spectrogram_tiles_url(audio_file),
+        'full_spectrogram_url': spectrogram_image_url(audio_file),
+        'waveform_peaks_url': waveform_peaks_url(audio_file),
+        'audio_stream_url': audio_stream_url(audio_file)
     }
     
     return render(request, 'common/view_spectrograms.html', context)
@@ -784,6 +802,9 @@ def upload_audio(request):
                 'drive_duplicates': 0
             }
             
+            # Files uploaded together are reported as one batch (see api_upload_batch_progress)
+            batch = UploadBatch.objects.create(created_by=request.user)
+            
             # Process local file uploads
             for uploaded_file in uploaded_files:
                 # Validate file format (.wav only)
@@ -792,26 +813,24 @@ def upload_audio(request):
                     continue
                 
                 try:
-                    # Handle duplicate file detection and replacement
-                    audio_file, is_duplicate, replaced_file_id = handle_duplicate_file(
+                    # Handle duplicate file detection (by content)
+                    audio_file, is_duplicate, existing_file_id = handle_duplicate_file(
                         new_file=uploaded_file,
                         animal_type=animal_type,
                         zoo=zoo
                     )
                     
-                    # Add a message about the duplicate replacement if needed
                     if is_duplicate:
-                        # Update the statistics to reflect the replacement
+                        # The identical file is already stored and processed
                         upload_stats['duplicates'] += 1
-                        # Log the duplicate detection
-                        logger.info(f"Duplicate file detected and replaced: {uploaded_file.name} (ID: {replaced_file_id})")
-                    
-                    # Update metadata for the file
-                    file_path = audio_file.audio_file.path
-                    update_audio_metadata(file_path, audio_file)
-                    
-                    # Track successful upload
-                    upload_stats['processed'] += 1
+                        logger.info(f"Duplicate file detected, reusing existing results: {uploaded_file.name} (ID: {existing_file_id})")
+                    else:
+                        # Metadata is read by the background workers, so the request
+                        # returns once the file is stored
+                        queue_uploaded_file(audio_file, batch)
+                        
+                        # Track successful upload
+                        upload_stats['processed'] += 1
                 except Exception as e:
                     logger.error(f"Error uploading file {uploaded_file.name}: {str(e)}")
                     upload_stats['failed'] += 1
@@ -832,7 +851,8 @@ def upload_audio(request):
                             animal_type=animal_type,
                             zoo=zoo,
                             uploaded_by=request.user,
-                            token_info=token_info
+                            token_info=token_info,
+                            batch=batch
                         )
                         
                         # Check if authentication is required
@@ -870,24 +890,32 @@ def upload_audio(request):
             elif google_drive_url:
                 messages.error(request, "The provided URL does not appear to be a valid Google Drive folder URL.")
             
+            # Record the uploads that did not get a Database entry in the batch
+            batch.duplicate_count = upload_stats['duplicates'] + upload_stats['drive_duplicates']
+            batch.failed_count = upload_stats['failed'] + upload_stats['drive_failed']
+            batch.save(update_fields=['duplicate_count', 'failed_count'])
+            
             # Create success message with upload statistics
             total_processed = upload_stats['processed'] + upload_stats['drive_processed']
+            total_duplicates = upload_stats['duplicates'] + upload_stats['drive_duplicates']
             
-            if total_processed > 0:
-                success_message = f"Successfully uploaded {total_processed} audio file(s). "
+            if total_processed + total_duplicates > 0:
+                success_message = f"Successfully uploaded {total_processed + total_duplicates} audio file(s). "
                 
                 # Add details about local file uploads
-                if upload_stats['processed'] > 0:
-                    success_message += f"{upload_stats['processed']} file(s) from local upload. "
+                local_uploaded = upload_stats['processed'] + upload_stats['duplicates']
+                if local_uploaded > 0:
+                    success_message += f"{local_uploaded} file(s) from local upload. "
                 
                 # Add details about Google Drive uploads
-                if upload_stats['drive_processed'] > 0:
-                    success_message += f"{upload_stats['drive_processed']} file(s) from Google Drive. "
+                drive_uploaded = upload_stats['drive_processed'] + upload_stats['drive_duplicates']
+                if drive_uploaded > 0:
+                    success_message += f"{drive_uploaded} file(s) from Google Drive. "
                 
                 # Add details about duplicates
-                total_duplicates = upload_stats['duplicates'] + upload_stats['drive_duplicates']
                 if total_duplicates > 0:
-                    success_message += f"{total_duplicates} duplicate file(s) were detected and replaced. "
+                    success_message += (f"{total_duplicates} duplicate file(s) matched recordings already stored "
+                                        f"and reuse their results. ")
                 
                 # Add details about invalid formats
                 if upload_stats.get('invalid_format', 0) > 0:
@@ -900,9 +928,6 @@ def upload_audio(request):
                 
                 messages.success(request, success_message)
                 
-                # Automatically process the uploaded files
-                process_pending_audio_files()
-                
                 return redirect('upload_audio')
             else:
                 if google_drive_url and not is_valid_drive_url(google_drive_url):
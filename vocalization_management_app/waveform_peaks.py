@@ -0,0 +1,148 @@
+"""
+Min/max waveform peak pyramids for drawing long recordings at any zoom.
+
+A waveform is drawn from the minimum and maximum sample of each bucket of samples under a
+pixel column, so a 24-hour recording can be shown without reading its samples: the peaks
+are computed once while the file is processed, at a few bucket sizes (levels), and a
+viewer reads the level whose buckets are just finer than its pixels.
+
+Layout of a peaks file:
+
+    uint32 (little-endian)   length of the JSON header in bytes
+    JSON header (UTF-8)      sample rate, length and the levels with their data offsets
+    per level                buckets x 2 int16 (min, max), little-endian
+
+Peaks are of the mono mix, scaled to int16 full scale whatever the file's sample format.
+Like spectrogram_rendering, nothing here imports Django.
+"""
+import json
+import os
+import struct
+import numpy as np
+
+DEFAULT_LEVELS = (256, 4096, 65536)
+
+
+def build_peak_pyramid(audio, output_path, levels=DEFAULT_LEVELS, block_buckets=16):
+    """
+    Compute the peak pyramid of a recording in one pass over its samples and write it.
+    
+    The recording is read in blocks of a whole number of the largest buckets, so every
+    bucket of every level lies within one block; the finest level is reduced from the
+    samples and each coarser level from the one below it.
+    
+    Parameters:
+    - audio: AudioSource of the recording.
+    - output_path (str): Destination file (written under a temporary name, then renamed).
+    - levels: Samples per bucket of each level, finest first; each must divide the next.
+    - block_buckets (int): Buckets of the coarsest level read at once.
+    
+    Returns:
+    - dict: The file header
+    """
+    levels = sorted(int(level) for level in levels)
+    for finer, coarser in zip(levels, levels[1:]):
+        if coarser % finer:
+            raise ValueError(f"Bucket size {coarser} is not a multiple of {finer}")
+    
+    n_samples = len(audio)
+    header = {
+        'version': 1,
+        'sample_rate': audio.sample_rate,
+        'length': n_samples,
+        'levels': [],
+    }
+    offset = 0
+    for samples_per_bucket in levels:
+        buckets = -(-n_samples // samples_per_bucket)
+        header['levels'].append({'samples_per_bucket': samples_per_bucket, 'buckets': buckets, 'offset': offset})
+        offset += buckets * 4
+    header_bytes = json.dumps(header).encode('utf-8')
+    data_offset = 4 + len(header_bytes)
+    
+    temp_path = f"{output_path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, 'wb') as peaks_file:
+            peaks_file.write(struct.pack('<I', len(header_bytes)) + header_bytes)
+            peaks_file.truncate(data_offset + offset)
+        if offset:
+            data = np.memmap(temp_path, dtype='<i2', mode='r+', offset=data_offset, shape=(offset // 2,))
+            block = levels[-1] * block_buckets
+            for start in range(0, n_samples, block):
+                end = min(start + block, n_samples)
+                peaks = _sample_peaks(audio, start, end, levels[0])
+                for level_index, level in enumerate(header['levels']):
+                    if level_index:
+                        peaks = _pool_peaks(peaks, level['samples_per_bucket'] // header['levels'][level_index - 1]['samples_per_bucket'])
+                    first = level['offset'] // 2 + 2 * (start // level['samples_per_bucket'])
+                    data[first:first + peaks.size] = peaks.ravel()
+            data.flush()
+            del data
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return header
+
+
+def read_peak_header(path):
+    """
+    Load the header of a peaks file
+    
+    Returns:
+    - tuple: (header dict, byte offset of the level data)
+    """
+    with open(path, 'rb') as peaks_file:
+        (header_length,) = struct.unpack('<I', peaks_file.read(4))
+        return json.loads(peaks_file.read(header_length).decode('utf-8')), 4 + header_length
+
+
+def read_peaks(path, samples_per_bucket, first_bucket=0, last_bucket=None):
+    """
+    Read a range of buckets of one level of a peaks file (memory mapped, so only that
+    range is read from disk)
+    
+    Returns:
+    - numpy.ndarray: int16 array of shape (buckets, 2) with the min and max of each bucket
+    """
+    header, data_offset = read_peak_header(path)
+    level = next((level for level in header['levels'] if level['samples_per_bucket'] == samples_per_bucket), None)
+    if level is None:
+        raise ValueError(f"No level with {samples_per_bucket} samples per bucket")
+    if last_bucket is None or last_bucket > level['buckets']:
+        last_bucket = level['buckets']
+    first_bucket = max(0, min(first_bucket, last_bucket))
+    if not level['buckets']:
+        return np.zeros((0, 2), dtype=np.int16)
+    data = np.memmap(path, dtype='<i2', mode='r', offset=data_offset + level['offset'], shape=(level['buckets'], 2))
+    return np.array(data[first_bucket:last_bucket], dtype=np.int16)
+
+
+def choose_peak_level(header, n_samples, width):
+    """
+    Coarsest level that still has at least one bucket per pixel for a window of n_samples
+    drawn width pixels wide (the finest level when none does)
+    """
+    chosen = header['levels'][0]
+    for level in header['levels']:
+        if n_samples / level['samples_per_bucket'] >= width:
+            chosen = level
+    return chosen
+
+
+def _sample_peaks(audio, start, end, samples_per_bucket):
+    """Min and max of each bucket of samples start..end, as int16 (buckets, 2)"""
+    samples = audio.normalized(start, end)
+    pad = -len(samples) % samples_per_bucket
+    if pad:
+        # Repeat the last sample so the partial bucket's peaks are its own
+        samples = np.pad(samples, (0, pad), mode='edge')
+    buckets = samples.reshape(-1, samples_per_bucket)
+    peaks = np.stack([buckets.min(axis=1), buckets.max(axis=1)], axis=1)
+    return np.clip(np.round(peaks * 32767.0), -32768, 32767).astype(np.int16)
+
+
+def _pool_peaks(peaks, factor):
+    """Combine groups of factor consecutive buckets (a short last group is kept)"""
+    starts = np.arange(0, len(peaks), factor)
+    return np.stack([np.minimum.reduceat(peaks[:, 0], starts), np.maximum.reduceat(peaks[:, 1], starts)], axis=1)
@@ -150,6 +150,95 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 APPEND_SLASH = False  # settings.py
 
+# Audio processing
+# 'streaming' memory-maps uploaded WAV files and runs saw call detection block by block,
+# 'memory' reads the whole recording into memory first. Both give the same detections.
+SAW_CALL_DETECTION_MODE = 'streaming'
+# STFT frames per detection block (bounds memory use in both modes)
+SAW_CALL_DETECTION_BLOCK_FRAMES = 1024
+# 'full_band' analyses the recording at its native rate, 'band_limited' low-pass filters and
+# decimates it to just above the detection band first (much less STFT work for 44.1/48 kHz audio)
+SAW_CALL_DETECTION_FRONT_END = 'full_band'
+# Full audio spectrograms are rendered from the detection STFT (full_band front end only),
+# averaged down to at most this many time columns
+SPECTROGRAM_MAX_COLUMNS = 4096
+# 'fast' maps spectrograms through a colormap lookup table and writes them with Pillow,
+# 'publication' draws them with matplotlib (labelled axes and colorbar, 300 dpi, much slower)
+SPECTROGRAM_RENDERER = 'fast'
+# Image format of the fast renderer ('png' or 'webp') and whether it draws time/frequency axes
+SPECTROGRAM_IMAGE_FORMAT = 'png'
+SPECTROGRAM_ANNOTATE_AXES = True
+# Also cut the full recording's mel spectrogram into a zoomable pyramid of tiles
+# (tile_size x tile_size pixels) for the pan/zoom viewer; with lazy SPECTROGRAM_GENERATION
+# the pyramid is built when the viewer first requests it
+SPECTROGRAM_TILE_PYRAMID = True
+SPECTROGRAM_TILE_SIZE = 256
+# Clip spectrograms of detected calls: 'pool' renders them in CLIP_SPECTROGRAM_WORKERS low-priority
+# worker processes (niceness CLIP_SPECTROGRAM_NICENESS) after the job is marked processed,
+# 'inline' renders them inside the processing job. Progress is logged every
+# CLIP_SPECTROGRAM_PROGRESS_INTERVAL seconds.
+CLIP_SPECTROGRAM_RENDERING = 'pool'
+CLIP_SPECTROGRAM_WORKERS = 2
+CLIP_SPECTROGRAM_NICENESS = 10
+CLIP_SPECTROGRAM_PROGRESS_INTERVAL = 5.0
+# 'lazy' renders spectrogram images when a page first requests them and keeps them in an LRU
+# disk cache (SPECTROGRAM_CACHE_DIR, spectrogram_cache/ under MEDIA_ROOT by default) of at most
+# SPECTROGRAM_CACHE_MAX_MB; 'eager' renders the full audio and clip images while processing
+SPECTROGRAM_GENERATION = 'lazy'
+SPECTROGRAM_CACHE_MAX_MB = 1024
+# Min/max waveform peaks computed while processing, at these samples per bucket (each level
+# must be a multiple of the previous one)
+WAVEFORM_PEAKS = True
+WAVEFORM_PEAK_LEVELS = (256, 4096, 65536)
+# Detected saw calls: 'virtual' stores only their sample range and cuts each clip from the
+# recording when it is played; 'files' also writes a WAV per call to detected_noises/.
+# Recently played virtual clips are kept in memory, up to DETECTED_CLIP_CACHE_MB per process.
+# Segment files written before can be removed with the reclaim_segment_files command.
+DETECTED_CLIP_STORAGE = 'virtual'
+DETECTED_CLIP_CACHE_MB = 32
+# Uploads are hashed (SHA-256) as they are received, so byte-identical re-uploads are
+# recognized without reading them again, and large ones are streamed to a temporary file
+# under MEDIA_ROOT (AUDIO_UPLOAD_TEMP_DIR, storage/temp/ by default) that is then renamed
+# to its date-organized path, so they are written once (see upload_handlers)
+FILE_UPLOAD_HANDLERS = [
+    'vocalization_management_app.upload_handlers.HashingMemoryFileUploadHandler',
+    'vocalization_management_app.upload_handlers.HashingMediaFileUploadHandler',
+]
+# Resumable uploads (api/uploads/): largest chunk accepted per request, and how long an
+# upload may receive nothing before it is removed with its partial file
+CHUNKED_UPLOAD_MAX_CHUNK_MB = 64
+CHUNKED_UPLOAD_EXPIRY_HOURS = 48
+
+# Background processor
+# 'thread' processes one pending file at a time in a daemon thread of the web process,
+# 'pool' runs AUDIO_PROCESSOR_WORKERS worker processes that each claim and process pending files
+AUDIO_PROCESSOR_MODE = 'thread'
+AUDIO_PROCESSOR_WORKERS = 4
+# How uploads wake idle workers: 'condition' works within one process (threaded processor under
+# runserver), 'socket' sends a datagram to AUDIO_PROCESSOR_WAKEUP_ADDRESS so uploads handled by
+# any process on this machine wake the processor
+AUDIO_PROCESSOR_WAKEUP = 'condition'
+AUDIO_PROCESSOR_WAKEUP_ADDRESS = ('127.0.0.1', 47219)
+# Uploads return once files are stored; the workers read their metadata and queue them. With
+# AUDIO_PROCESSOR_AUTOSTART an upload starts the processor in its web process if it is not
+# running (unless it was stopped from the dashboard), so uploads are processed under gunicorn
+# or App Service as well as runserver, which starts it on launch. When several web processes
+# serve uploads each may start a processor; they share the queue, as files are claimed
+# atomically. Turn it off to only start the processor from the dashboard
+AUDIO_PROCESSOR_AUTOSTART = True
+# Seconds after which a file still claimed by a worker is taken to belong to a worker that
+# died, and is queued again: reading an upload's metadata (Ingesting) and processing it
+AUDIO_INGEST_CLAIM_TIMEOUT = 600
+AUDIO_PROCESSING_CLAIM_TIMEOUT = 86400
+
+# Processing logs are buffered per job and written in batches of PROCESSING_LOG_BUFFER_SIZE
+# entries, or PROCESSING_LOG_FLUSH_INTERVAL seconds after the first buffered entry (and always
+# at the end of the job). Entries below PROCESSING_LOG_MIN_LEVEL ('INFO', 'SUCCESS', 'WARNING',
+# 'ERROR') are not stored; use 'WARNING' in production to drop routine progress messages.
+PROCESSING_LOG_MIN_LEVEL = 'INFO'
+PROCESSING_LOG_BUFFER_SIZE = 50
+PROCESSING_LOG_FLUSH_INTERVAL = 5.0
+
 # Azure Blob Storage Configuration
 # Load Azure Storage settings from environment variables if available
 from os import environ